@@ -1,13 +1,28 @@
 #!/bin/sh
 set -e
 
-echo "Entrypoint: aguardando banco e aplicando migrations..."
+# Só o serviço da API aplica migrations; os workers sobem com RUN_MIGRATIONS=0
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+  echo "Entrypoint: aguardando banco e conferindo migrations..."
 
-until python manage.py migrate --noinput; do
-  echo "Banco não pronto ou migrate falhou — tentarei novamente em 5s..."
-  sleep 5
-done
+  # `migrate --check` sai com 0 quando não há nada a aplicar: nas partidas
+  # seguintes o container não roda o migrate inteiro de novo
+  until python manage.py migrate --check >/dev/null 2>&1 || python manage.py migrate --noinput; do
+    echo "Banco não pronto ou migrate falhou — tentarei novamente em 5s..."
+    sleep 5
+  done
 
-echo "Migrations aplicadas. Iniciando comando principal..."
+  python manage.py createcachetable
+
+  echo "Migrations em dia."
+else
+  # Espera a API aplicar as migrations antes de usar as tabelas
+  until python manage.py migrate --check >/dev/null 2>&1; do
+    echo "Aguardando as migrations da API — nova verificação em 5s..."
+    sleep 5
+  done
+fi
+
+echo "Iniciando comando principal..."
 
 exec "$@"
@@ -47,7 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'weather.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'weather.middleware.JsonCompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,6 +93,27 @@ DATABASES = {
     }
 }
 
+# Cache compartilhado entre os workers do uvicorn (Redis se configurado,
+# senão a tabela criada por `manage.py createcachetable`)
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'weather_cache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -136,3 +159,112 @@ DATA_DIR = BASE_DIR / "data" / "reports"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+# Aponte para o servidor falso (manage.py fake_openweather) em testes de carga
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5")
+
+# Cache das chamadas ao OpenWeather por célula de grade (graus de lat/lon)
+WEATHER_GRID_SIZE = float(os.getenv("WEATHER_GRID_SIZE", "0.01"))
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+AIR_CACHE_TTL = int(os.getenv("AIR_CACHE_TTL", "300"))
+FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", "1800"))
+WEATHER_LOCAL_CACHE_SIZE = int(os.getenv("WEATHER_LOCAL_CACHE_SIZE", "2048"))
+
+# Cliente HTTP do OpenWeather: um pool keep-alive por worker
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "10"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "200"))
+UPSTREAM_SYNC_POOL_SIZE = int(os.getenv("UPSTREAM_SYNC_POOL_SIZE", "20"))
+
+# Fila de relatórios PDF (ReportJob + `manage.py run_report_worker`). Jobs em
+# execução há mais de REPORT_JOB_TIMEOUT segundos voltam à fila; os workers
+# procuram por eles a cada REPORT_REQUEUE_INTERVAL segundos
+REPORT_WORKER_CONCURRENCY = int(os.getenv("REPORT_WORKER_CONCURRENCY", "2"))
+REPORT_WORKER_POLL_INTERVAL = float(os.getenv("REPORT_WORKER_POLL_INTERVAL", "1"))
+REPORT_QUEUE_MAX_PENDING = int(os.getenv("REPORT_QUEUE_MAX_PENDING", "100"))
+REPORT_QUEUE_RETRY_AFTER = int(os.getenv("REPORT_QUEUE_RETRY_AFTER", "5"))
+REPORT_JOB_TIMEOUT = int(os.getenv("REPORT_JOB_TIMEOUT", "300"))
+REPORT_REQUEUE_INTERVAL = int(os.getenv("REPORT_REQUEUE_INTERVAL", "60"))
+
+# Relatórios com o mesmo conteúdo nesta janela (segundos) reaproveitam o PDF
+REPORT_DEDUP_WINDOW = int(os.getenv("REPORT_DEDUP_WINDOW", "600"))
+
+# Download de relatórios: com REPORT_SENDFILE_HEADER (ex.: "X-Accel-Redirect"
+# no nginx ou "X-Sendfile" no Apache) o proxy envia o arquivo no lugar do worker.
+# No nginx, REPORT_SENDFILE_PREFIX é a location `internal` que aponta para DATA_DIR.
+REPORT_SENDFILE_HEADER = os.getenv("REPORT_SENDFILE_HEADER", "")
+REPORT_SENDFILE_PREFIX = os.getenv("REPORT_SENDFILE_PREFIX", "/protected/reports/")
+
+# Listagem de relatórios por cidade (paginação por cursor)
+REPORTS_PAGE_SIZE = int(os.getenv("REPORTS_PAGE_SIZE", "50"))
+REPORTS_MAX_PAGE_SIZE = int(os.getenv("REPORTS_MAX_PAGE_SIZE", "200"))
+
+# Relatórios próximos de um ponto (/api/report/nearby), raio em km, e quantos
+# candidatos (os mais recentes) entram no cálculo de distância
+REPORTS_NEARBY_RADIUS = float(os.getenv("REPORTS_NEARBY_RADIUS", "2"))
+REPORTS_NEARBY_MAX_RADIUS = float(os.getenv("REPORTS_NEARBY_MAX_RADIUS", "50"))
+REPORTS_NEARBY_MAX_CANDIDATES = int(os.getenv("REPORTS_NEARBY_MAX_CANDIDATES", "5000"))
+
+# Refresh antecipado das células mais acessadas (`manage.py refresh_hot_cells`)
+HOT_CELLS_FLUSH_INTERVAL = float(os.getenv("HOT_CELLS_FLUSH_INTERVAL", "30"))
+REFRESH_AHEAD_INTERVAL = float(os.getenv("REFRESH_AHEAD_INTERVAL", "20"))
+REFRESH_AHEAD_MARGIN = int(os.getenv("REFRESH_AHEAD_MARGIN", "60"))
+REFRESH_AHEAD_QUOTA_PER_MINUTE = int(os.getenv("REFRESH_AHEAD_QUOTA_PER_MINUTE", "30"))
+REFRESH_AHEAD_MAX_CELLS = int(os.getenv("REFRESH_AHEAD_MAX_CELLS", "100"))
+REFRESH_AHEAD_DECAY = float(os.getenv("REFRESH_AHEAD_DECAY", "0.9"))
+
+# Proteção do OpenWeather: cota compartilhada entre workers (token bucket no
+# banco), disjuntor por endpoint com orçamento de latência e quanto tempo a
+# última leitura de uma célula continua disponível para ser servida vencida
+UPSTREAM_RATE_PER_MINUTE = int(os.getenv("UPSTREAM_RATE_PER_MINUTE", "60"))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "20"))
+UPSTREAM_LATENCY_BUDGET = float(os.getenv("UPSTREAM_LATENCY_BUDGET", "3"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = int(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", "86400"))
+
+# Histórico de poluição: intervalos longos são buscados em janelas de
+# HISTORY_WINDOW segundos (até HISTORY_WINDOW_CONCURRENCY em paralelo) e
+# enviados em streaming à medida que ficam prontos
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "604800"))
+HISTORY_WINDOW_CONCURRENCY = int(os.getenv("HISTORY_WINDOW_CONCURRENCY", "4"))
+
+# Horas já consultadas no OpenWeather e que vieram sem ponto só voltam a
+# ser buscadas depois de HISTORY_COVERAGE_TTL segundos
+HISTORY_COVERAGE_TTL = int(os.getenv("HISTORY_COVERAGE_TTL", "86400"))
+
+# Consulta em lote (/api/batch): limite de pontos por requisição e de
+# células buscadas no OpenWeather ao mesmo tempo
+BATCH_MAX_POINTS = int(os.getenv("BATCH_MAX_POINTS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Atualizações ao vivo por célula (/api/live, Server-Sent Events): intervalo
+# de leitura do cache, comentário de keep-alive, fila por assinante e limite
+# de assinantes por worker
+LIVE_POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "10"))
+LIVE_KEEPALIVE = float(os.getenv("LIVE_KEEPALIVE", "15"))
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "16"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "1000"))
+
+# Métricas no formato do Prometheus (/api/metrics): cada processo grava seus
+# totais em METRICS_DIR a cada METRICS_FLUSH_INTERVAL segundos
+METRICS_DIR = os.getenv("METRICS_DIR", str(BASE_DIR / "data" / "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+
+# Cache dos gráficos dos relatórios (PNG por hash dos dados): LRU em memória
+# por processo e, se CHART_CACHE_DIR não for vazio, em disco, compartilhado
+# pelos processos do worker e limitado a CHART_CACHE_DISK_MAX_MB
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "128"))
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", str(BASE_DIR / "data" / "charts"))
+CHART_CACHE_DISK_MAX_MB = int(os.getenv("CHART_CACHE_DISK_MAX_MB", "64"))
+
+# Retenção dos PDFs (manage.py cleanup_reports): idade máxima em dias e
+# quantos relatórios manter por cidade (0 desliga cada critério). Arquivos
+# sem registro só são apagados depois de REPORT_ORPHAN_GRACE segundos
+REPORT_RETENTION_DAYS = int(os.getenv("REPORT_RETENTION_DAYS", "30"))
+REPORT_RETENTION_PER_CITY = int(os.getenv("REPORT_RETENTION_PER_CITY", "200"))
+REPORT_ORPHAN_GRACE = int(os.getenv("REPORT_ORPHAN_GRACE", "3600"))
+
+# Registros sem PDF só são apagados com --delete-missing, e a limpeza aborta
+# se faltar mais que esta fração dos arquivos (disco não montado, DATA_DIR
+# errado). Jobs concluídos ou falhos saem da fila depois de N dias (0 desliga)
+REPORT_RECONCILE_MAX_MISSING = float(os.getenv("REPORT_RECONCILE_MAX_MISSING", "0.5"))
+REPORT_JOB_RETENTION_DAYS = int(os.getenv("REPORT_JOB_RETENTION_DAYS", "7"))
@@ -0,0 +1,254 @@
+import asyncio
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .grid import cell_center, cell_key
+from .resilience import UpstreamError
+
+
+class LRUCache:
+    """Cache em memória do processo, com expiração por entrada e despejo LRU."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at: float):
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _Flight:
+    """Busca de uma célula em andamento, compartilhada pelas threads que a pediram."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class GridCache:
+    """
+    Cache em duas camadas para respostas do OpenWeather, indexado pela célula
+    da grade: LRU local em cada worker e, atrás dele, o cache compartilhado
+    do Django (banco ou Redis), visível para todos os workers do uvicorn.
+    """
+
+    def __init__(self, alias: str = "default"):
+        self.alias = alias
+        self._local = None
+        # Buscas em andamento por chave: uma falta concorrente na mesma célula
+        # espera a busca que já saiu em vez de chamar o OpenWeather de novo
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._aflights = {}
+
+    @property
+    def local(self):
+        if self._local is None:
+            self._local = LRUCache(settings.WEATHER_LOCAL_CACHE_SIZE)
+        return self._local
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def key(self, endpoint: str, lat: float, lon: float):
+        return f"weather:{endpoint}:{cell_key(lat, lon)}"
+
+    def get(self, endpoint: str, lat: float, lon: float):
+        """Retorna o envelope (expira_em, valor) válido da célula ou None."""
+        key = self.key(endpoint, lat, lon)
+
+        entry = self.local.get(key)
+        result = "local"
+        if entry is None:
+            entry = self._promote(key, self.shared.get(key))
+            result = "shared" if entry is not None else "miss"
+        metrics.inc("weather_cache_requests_total", {"endpoint": endpoint, "result": result})
+        return entry
+
+    async def aget(self, endpoint: str, lat: float, lon: float):
+        """Versão assíncrona de ``get``."""
+        key = self.key(endpoint, lat, lon)
+
+        entry = self.local.get(key)
+        result = "local"
+        if entry is None:
+            entry = self._promote(key, await self.shared.aget(key))
+            result = "shared" if entry is not None else "miss"
+        metrics.inc("weather_cache_requests_total", {"endpoint": endpoint, "result": result})
+        return entry
+
+    async def aprefetch(self, endpoint: str, points):
+        """
+        Traz para o LRU local, em uma única consulta ao cache compartilhado,
+        as entradas válidas das células de ``points`` que ainda não estão nele.
+        """
+        keys = {self.key(endpoint, lat, lon) for lat, lon in points}
+        missing = [key for key in keys if self.local.get(key) is None]
+        if not missing:
+            return
+        for key, entry in (await self.shared.aget_many(missing)).items():
+            self._promote(key, entry)
+
+    def _promote(self, key: str, entry):
+        """Copia para o LRU local uma entrada ainda válida do cache compartilhado."""
+        if entry is None or entry[0] <= time.time():
+            return None
+        self.local.set(key, entry[1], entry[0])
+        return entry
+
+    def set(self, endpoint: str, lat: float, lon: float, value, ttl: int):
+        key = self.key(endpoint, lat, lon)
+        expires_at = time.time() + ttl
+        self.local.set(key, value, expires_at)
+        # A entrada sobrevive WEATHER_STALE_TTL além da validade para servir de reserva
+        self.shared.set(key, (expires_at, value), timeout=ttl + settings.WEATHER_STALE_TTL)
+
+    async def aset(self, endpoint: str, lat: float, lon: float, value, ttl: int):
+        key = self.key(endpoint, lat, lon)
+        expires_at = time.time() + ttl
+        self.local.set(key, value, expires_at)
+        await self.shared.aset(key, (expires_at, value), timeout=ttl + settings.WEATHER_STALE_TTL)
+
+    def get_or_fetch(self, endpoint: str, lat: float, lon: float, fetch, ttl: int):
+        """
+        Busca o valor da célula no cache; em caso de falta chama
+        ``fetch(lat, lon)`` com o centro da célula e guarda o resultado.
+        Respostas vazias (None) não são armazenadas. Se o OpenWeather estiver
+        indisponível, devolve o último valor conhecido marcado com ``stale``.
+        Faltas simultâneas na mesma célula fazem uma única chamada a ``fetch``.
+        """
+        entry = self.get(endpoint, lat, lon)
+        if entry is not None:
+            return copy.deepcopy(entry[1])
+
+        key = self.key(endpoint, lat, lon)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            flight.value = self._fetch(endpoint, lat, lon, fetch, ttl)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+        return copy.deepcopy(flight.value)
+
+    def _fetch(self, endpoint: str, lat: float, lon: float, fetch, ttl: int):
+        key = self.key(endpoint, lat, lon)
+        # A busca anterior pode ter terminado entre a falta e a reserva da chave
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry[1]
+        try:
+            value = fetch(*cell_center(lat, lon))
+        except UpstreamError as e:
+            return self._stale(self.shared.get(key), e)
+        if value is not None:
+            self.set(endpoint, lat, lon, value, ttl)
+        return value
+
+    async def aget_or_fetch(self, endpoint: str, lat: float, lon: float, afetch, ttl: int):
+        """
+        Versão assíncrona de ``get_or_fetch``; ``afetch`` é uma corrotina. As
+        faltas simultâneas no mesmo event loop aguardam uma única tarefa.
+        """
+        entry = await self.aget(endpoint, lat, lon)
+        if entry is not None:
+            return copy.deepcopy(entry[1])
+
+        loop = asyncio.get_running_loop()
+        flight = (loop, self.key(endpoint, lat, lon))
+        task = self._aflights.get(flight)
+        if task is None:
+            task = loop.create_task(self._afetch(endpoint, lat, lon, afetch, ttl))
+            self._aflights[flight] = task
+            task.add_done_callback(lambda t: self._land(flight, t))
+        # shield: quem desiste (cliente desconectado) não cancela a busca dos demais
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _afetch(self, endpoint: str, lat: float, lon: float, afetch, ttl: int):
+        key = self.key(endpoint, lat, lon)
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry[1]
+        try:
+            value = await afetch(*cell_center(lat, lon))
+        except UpstreamError as e:
+            return self._stale(await self.shared.aget(key), e)
+        if value is not None:
+            await self.aset(endpoint, lat, lon, value, ttl)
+        return value
+
+    def _land(self, flight, task):
+        self._aflights.pop(flight, None)
+        # Marca a exceção como lida mesmo se todos os interessados desistiram
+        if not task.cancelled():
+            task.exception()
+
+    def _stale(self, entry, error: UpstreamError):
+        """Cópia do último valor conhecido marcada como vencida; sem ele, repassa o erro."""
+        if entry is None:
+            raise error
+        value = copy.deepcopy(entry[1])
+        value["stale"] = True
+        return value
+
+    def remaining(self, endpoint: str, lat: float, lon: float):
+        """Segundos de validade que restam à entrada da célula no LRU local (0 se vencida)."""
+        entry = self.local.get(self.key(endpoint, lat, lon))
+        return max(entry[0] - time.time(), 0) if entry is not None else 0
+
+    def expires_at(self, endpoint: str, lat: float, lon: float):
+        """Instante em que a entrada compartilhada da célula expira (ou None)."""
+        entry = self.shared.get(self.key(endpoint, lat, lon))
+        return entry[0] if entry is not None else None
+
+    def refresh(self, endpoint: str, lat: float, lon: float, fetch, ttl: int):
+        """Busca de novo o valor da célula, ignorando o cache, e regrava as duas camadas."""
+        value = fetch(*cell_center(lat, lon))
+        if value is not None:
+            self.set(endpoint, lat, lon, value, ttl)
+        return value
+
+
+grid_cache = GridCache()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+
+from . import metrics
+from .cache import LRUCache
+
+# Entradas em memória não expiram: saem só pelo LRU
+NEVER = float("inf")
+
+# Quantas gravações em disco entre duas varreduras de limpeza
+DISK_SWEEP_EVERY = 50
+
+
+def chart_key(kind: str, *parts, **options):
+    """
+    Hash do que é desenhado: tipo do gráfico, pontos (já como rótulos e
+    valores) e opções. Dados iguais dão o mesmo PNG, em qualquer processo.
+    """
+    payload = json.dumps([kind, parts, options], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ChartCache:
+    """
+    PNGs dos gráficos dos relatórios, por ``chart_key``. Primeiro a memória
+    do processo (LRU de CHART_CACHE_SIZE entradas); com CHART_CACHE_DIR, um
+    diretório compartilhado pelos processos do worker, limitado a
+    CHART_CACHE_DISK_MAX_MB e despejado pelos arquivos lidos há mais tempo.
+    """
+
+    def __init__(self):
+        self._local = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def local(self):
+        if self._local is None:
+            self._local = LRUCache(settings.CHART_CACHE_SIZE)
+        return self._local
+
+    def _path(self, key: str):
+        return os.path.join(settings.CHART_CACHE_DIR, key[:2], f"{key}.png")
+
+    def get_or_render(self, key: str, render):
+        """PNG do cache; sem ele, ``render()`` gera os bytes e eles são guardados."""
+        entry = self.local.get(key)
+        if entry is not None:
+            metrics.inc("chart_cache_requests_total", {"result": "memory"})
+            return entry[1]
+
+        png = self._read(key)
+        if png is not None:
+            metrics.inc("chart_cache_requests_total", {"result": "disk"})
+            self.local.set(key, png, NEVER)
+            return png
+
+        metrics.inc("chart_cache_requests_total", {"result": "miss"})
+        png = render()
+        self.local.set(key, png, NEVER)
+        self._write(key, png)
+        return png
+
+    def _read(self, key: str):
+        if not settings.CHART_CACHE_DIR:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            # Leitura conta como uso: o despejo olha o mtime
+            os.utime(path)
+            return png
+        except OSError:
+            return None
+
+    def _write(self, key: str, png: bytes):
+        if not settings.CHART_CACHE_DIR:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(png)
+            os.replace(tmp, path)
+        except OSError:
+            return
+
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % DISK_SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """Apaga os PNGs usados há mais tempo até caber em CHART_CACHE_DISK_MAX_MB."""
+        root = settings.CHART_CACHE_DIR
+        if not root or not os.path.isdir(root):
+            return 0
+
+        files, total = [], 0
+        for shard in os.scandir(root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        limit = settings.CHART_CACHE_DISK_MAX_MB * 1024 * 1024
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        self.local.clear()
+
+
+chart_cache = ChartCache()
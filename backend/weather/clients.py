@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+from .resilience import UpstreamError, UpstreamUnavailable, acquire_token, get_breaker
+
+_session = None
+_session_lock = threading.Lock()
+
+# Um cliente por event loop: sob o uvicorn há um loop por worker, então cada
+# worker mantém um único pool de conexões keep-alive com o OpenWeather.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_session():
+    """Sessão ``requests`` compartilhada pelo processo, com pool de conexões."""
+    global _session
+
+    # Importado só aqui: os workers do uvicorn usam o httpx e nunca pagam o
+    # import do requests; o caminho síncrono é o dos comandos de manutenção
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=settings.UPSTREAM_SYNC_POOL_SIZE,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _async_state():
+    loop = asyncio.get_running_loop()
+    state = _async_clients.get(loop)
+    if state is None:
+        limit = settings.UPSTREAM_MAX_CONNECTIONS
+        client = httpx.AsyncClient(
+            timeout=settings.UPSTREAM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=limit,
+                max_keepalive_connections=limit,
+            ),
+        )
+        state = (client, asyncio.Semaphore(limit))
+        _async_clients[loop] = state
+    return state
+
+
+def get_async_client():
+    """Cliente ``httpx`` assíncrono do event loop atual."""
+    return _async_state()[0]
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", settings.BREAKER_RESET_TIMEOUT))
+    except ValueError:
+        return float(settings.BREAKER_RESET_TIMEOUT)
+
+
+def _record(endpoint: str, status, elapsed: float = None):
+    metrics.inc("upstream_requests_total", {"endpoint": endpoint, "status": status})
+    if elapsed is not None:
+        metrics.observe("upstream_request_duration_seconds", elapsed, {"endpoint": endpoint})
+
+
+def _check(breaker, response, elapsed: float):
+    """Registra o resultado no disjuntor; 429 e 5xx viram UpstreamError."""
+    _record(breaker.name, response.status_code, elapsed)
+    if response.status_code == 429:
+        breaker.record_failure(retry_after=_retry_after(response))
+        raise UpstreamError(f"OpenWeather limitou as chamadas (429) em {breaker.name}")
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise UpstreamError(f"OpenWeather respondeu {response.status_code} em {breaker.name}")
+    breaker.record_success(elapsed)
+    return response
+
+
+async def aget(endpoint: str, url: str, params: dict = None):
+    """
+    GET assíncrono no pool do worker, limitado a UPSTREAM_MAX_CONNECTIONS,
+    passando pelo disjuntor do endpoint e pela cota compartilhada.
+    """
+    breaker = get_breaker(endpoint)
+    if not breaker.allow():
+        _record(endpoint, "circuit_open")
+        raise UpstreamUnavailable(f"Circuito aberto para {endpoint}")
+
+    try:
+        if not await sync_to_async(acquire_token)():
+            _record(endpoint, "quota_exhausted")
+            raise UpstreamUnavailable("Cota do OpenWeather esgotada")
+
+        client, semaphore = _async_state()
+        started = time.monotonic()
+        try:
+            async with semaphore:
+                response = await client.get(
+                    url, params=params, timeout=settings.UPSTREAM_LATENCY_BUDGET
+                )
+        except httpx.HTTPError as e:
+            _record(endpoint, "error", time.monotonic() - started)
+            breaker.record_failure()
+            raise UpstreamError(f"Falha ao consultar {endpoint}: {e}") from e
+    except BaseException:
+        # Inclui CancelledError: nenhum caminho pode segurar a chamada de teste
+        breaker.release()
+        raise
+    return _check(breaker, response, time.monotonic() - started)
+
+
+def get(endpoint: str, url: str, params: dict = None):
+    """Versão síncrona de ``aget``, reaproveitando a sessão keep-alive do processo."""
+    breaker = get_breaker(endpoint)
+    if not breaker.allow():
+        _record(endpoint, "circuit_open")
+        raise UpstreamUnavailable(f"Circuito aberto para {endpoint}")
+
+    import requests
+
+    try:
+        if not acquire_token():
+            _record(endpoint, "quota_exhausted")
+            raise UpstreamUnavailable("Cota do OpenWeather esgotada")
+
+        started = time.monotonic()
+        try:
+            response = get_session().get(
+                url, params=params, timeout=settings.UPSTREAM_LATENCY_BUDGET
+            )
+        except requests.RequestException as e:
+            _record(endpoint, "error", time.monotonic() - started)
+            breaker.record_failure()
+            raise UpstreamError(f"Falha ao consultar {endpoint}: {e}") from e
+    except BaseException:
+        breaker.release()
+        raise
+    return _check(breaker, response, time.monotonic() - started)
@@ -0,0 +1,115 @@
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(report, stat):
+    """
+    ETag forte a partir de metadados, sem ler o arquivo: a impressão digital
+    do conteúdo (quando houver) mais tamanho e mtime do PDF. Um arquivo
+    regravado muda o mtime e, com ele, o ETag.
+    """
+    version = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    if report.content_hash:
+        return f'"{report.content_hash[:16]}-{version}"'
+    return f'"{version}"'
+
+
+def parse_range(header: str, size: int):
+    """
+    Interpreta um cabeçalho ``Range`` de intervalo único.
+
+    Retorna (início, fim) inclusivos, ``None`` quando o cabeçalho deve ser
+    ignorado (ausente, malformado, com fim antes do início ou com vários
+    intervalos) ou ``False`` quando o intervalo começa depois do fim do
+    arquivo (416).
+    """
+    if not header:
+        return None
+
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # bytes=-N: os últimos N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        # Sintaticamente inválido (RFC 9110, 14.1.1): responde o arquivo inteiro
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+async def _read_chunks(path: str, start: int, length: int):
+    """Lê o arquivo em blocos fora do event loop, sem carregar tudo na memória."""
+    handle = await sync_to_async(open, thread_sensitive=False)(path, "rb")
+    try:
+        await sync_to_async(handle.seek, thread_sensitive=False)(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await sync_to_async(handle.read, thread_sensitive=False)(
+                min(CHUNK_SIZE, remaining)
+            )
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(handle.close, thread_sensitive=False)()
+
+
+def file_response(path: str, size: int, byte_range=None):
+    """Resposta em streaming do arquivo inteiro (200) ou de um intervalo (206)."""
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+
+    response = StreamingHttpResponse(
+        _read_chunks(path, start, length),
+        status=206 if byte_range else 200,
+        content_type="application/pdf",
+    )
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def sendfile_response(path: str):
+    """
+    Delega a transferência ao proxy da frente (nginx ``X-Accel-Redirect`` ou
+    Apache/lighttpd ``X-Sendfile``); o worker Python não envia nenhum byte.
+    """
+    header = settings.REPORT_SENDFILE_HEADER
+    response = HttpResponse(content_type="application/pdf")
+
+    if header.lower() == "x-accel-redirect":
+        relative = os.path.relpath(path, settings.DATA_DIR).replace(os.sep, "/")
+        response[header] = settings.REPORT_SENDFILE_PREFIX.rstrip("/") + "/" + relative
+    else:
+        response[header] = path
+    return response
+
+
+def unsatisfiable_response(size: int):
+    response = HttpResponse(status=416)
+    response["Content-Range"] = f"bytes */{size}"
+    return response
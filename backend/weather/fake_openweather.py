@@ -0,0 +1,174 @@
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HOUR = 3600
+
+
+class FakeOpenWeather:
+    """
+    Imitação local da API 2.5 do OpenWeather (weather, forecast,
+    air_pollution e air_pollution/history) para testes de carga offline.
+
+    Os valores são determinísticos por coordenada; ``latency`` (segundos, com
+    ``jitter`` aleatório) simula a rede, ``error_rate`` devolve 500 e
+    ``throttle_rate`` devolve 429 com Retry-After na fração pedida de chamadas.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, jitter=0.02,
+                 error_rate=0.0, throttle_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/data/2.5"
+
+    def start(self):
+        """Atende em uma thread de fundo; use ``base_url`` como OPENWEATHER_BASE_URL."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, request):
+        url = urlparse(request.path)
+        endpoint = url.path.removeprefix("/data/2.5/")
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return self._send(request, 429, {"cod": 429, "message": "limite"}, {"Retry-After": "1"})
+        if roll < self.throttle_rate + self.error_rate:
+            return self._send(request, 500, {"cod": 500, "message": "falha simulada"})
+
+        builder = ROUTES.get(endpoint)
+        if builder is None:
+            return self._send(request, 404, {"cod": 404, "message": "not found"})
+        try:
+            lat, lon = float(params["lat"]), float(params["lon"])
+        except (KeyError, ValueError):
+            return self._send(request, 400, {"cod": 400, "message": "lat/lon"})
+        return self._send(request, 200, builder(lat, lon, params))
+
+    def _send(self, request, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def _rng(lat, lon, salt=0):
+    return random.Random(zlib.crc32(f"{lat:.3f}:{lon:.3f}:{salt}".encode()))
+
+
+def _weather(lat, lon, params):
+    rng = _rng(lat, lon, int(time.time()) // HOUR)
+    now = int(time.time())
+    temp = round(rng.uniform(12, 34), 2)
+    return {
+        "name": f"Bairro {abs(int(lat * 100)) % 97}",
+        "dt": now,
+        "main": {
+            "temp": temp,
+            "feels_like": round(temp + rng.uniform(-2, 3), 2),
+            "humidity": rng.randint(35, 98),
+            "pressure": rng.randint(998, 1024),
+        },
+        "weather": [
+            {"description": rng.choice(["céu limpo", "nublado", "chuva leve"]), "icon": "01d"}
+        ],
+        "wind": {"speed": round(rng.uniform(0, 9), 2)},
+        "sys": {"sunrise": now - now % 86400 + 9 * HOUR, "sunset": now - now % 86400 + 21 * HOUR},
+    }
+
+
+def _forecast(lat, lon, params):
+    rng = _rng(lat, lon, "forecast")
+    start = int(time.time()) // (3 * HOUR) * 3 * HOUR
+    steps = []
+    for i in range(40):
+        step = {
+            "dt": start + i * 3 * HOUR,
+            "main": {"humidity": rng.randint(40, 99), "pressure": rng.randint(996, 1022)},
+            "clouds": {"all": rng.randint(0, 100)},
+        }
+        if rng.random() < 0.4:
+            step["rain"] = {"3h": round(rng.uniform(0.1, 12), 2)}
+        steps.append(step)
+    return {"cod": "200", "cnt": len(steps), "list": steps}
+
+
+def _pollution_point(rng, dt):
+    return {
+        "dt": dt,
+        "main": {"aqi": rng.randint(1, 5)},
+        "components": {
+            "co": round(rng.uniform(150, 900), 2),
+            "no2": round(rng.uniform(1, 80), 2),
+            "o3": round(rng.uniform(5, 150), 2),
+            "so2": round(rng.uniform(0.5, 30), 2),
+            "pm2_5": round(rng.uniform(1, 75), 2),
+            "pm10": round(rng.uniform(2, 120), 2),
+        },
+    }
+
+
+def _air_pollution(lat, lon, params):
+    now = int(time.time())
+    point = _pollution_point(_rng(lat, lon, now // HOUR), now)
+    return {"coord": {"lat": lat, "lon": lon}, "list": [point]}
+
+
+def _air_pollution_history(lat, lon, params):
+    start = -(-int(params.get("start", 0)) // HOUR) * HOUR
+    end = min(int(params.get("end", time.time())), int(time.time()))
+    return {
+        "coord": {"lat": lat, "lon": lon},
+        "list": [_pollution_point(_rng(lat, lon, dt), dt) for dt in range(start, end + 1, HOUR)],
+    }
+
+
+ROUTES = {
+    "weather": _weather,
+    "forecast": _forecast,
+    "air_pollution": _air_pollution,
+    "air_pollution/history": _air_pollution_history,
+}
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+
+from .grid import cell_key
+
+# Casas decimais usadas ao comparar leituras; diferenças menores que isso
+# não mudam o relatório de forma perceptível.
+WEATHER_ROUNDING = {
+    "temperatura": 0,
+    "sensacao": 0,
+    "umidade": 0,
+    "pressao": 0,
+    "vento": 1,
+}
+POLLUTION_ROUNDING = {
+    "aqi": 0,
+    "pm2_5": 0,
+    "pm10": 0,
+    "o3": 0,
+    "no2": 0,
+    "so2": 0,
+    "co": 0,
+}
+
+
+def _rounded(values: dict, rounding: dict):
+    result = {}
+    for field, digits in rounding.items():
+        value = values.get(field)
+        result[field] = round(float(value), digits) if value is not None else None
+    return result
+
+
+def report_fingerprint(data: dict, now: float = None):
+    """
+    Hash SHA-256 dos dados normalizados de um relatório: cidade, célula da
+    grade, leituras arredondadas, bloco de poluição e janela de tempo
+    (REPORT_DEDUP_WINDOW). Pedidos com o mesmo hash podem reaproveitar o PDF.
+    """
+    now = time.time() if now is None else now
+    pollution = data.get("pollution")
+
+    normalized = {
+        "city": (data.get("city") or "").strip().lower(),
+        "cell": cell_key(data["latitude"], data["longitude"]),
+        "weather": _rounded(data, WEATHER_ROUNDING),
+        "descricao": data.get("descricao"),
+        "pollution": _rounded(pollution, POLLUTION_ROUNDING) if pollution else None,
+        "bucket": int(now // settings.REPORT_DEDUP_WINDOW),
+    }
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
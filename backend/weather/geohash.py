@@ -0,0 +1,86 @@
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9  # ~4,8 m x 4,8 m no equador
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(lat: float, lon: float, precision: int = PRECISION):
+    """Geohash do ponto: prefixos comuns indicam pontos próximos."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int):
+    """(altura, largura) em graus de uma célula com ``precision`` caracteres."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def precision_for(radius_km: float, lat: float):
+    """
+    Maior precisão cuja célula cobre ``radius_km`` nas duas direções, de modo
+    que a célula do ponto e suas 8 vizinhas contenham todo o círculo.
+    """
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height * km_per_degree >= radius_km and width * km_per_degree * cos_lat >= radius_km:
+            return precision
+    return 1
+
+
+def neighbours(lat: float, lon: float, precision: int):
+    """Geohash da célula do ponto e das 8 vizinhas (sem repetição)."""
+    height, width = cell_size(precision)
+    cells = set()
+    for dlat in (-height, 0, height):
+        for dlon in (-width, 0, width):
+            cells.add(encode(
+                max(-90.0, min(90.0, lat + dlat)),
+                (lon + dlon + 180) % 360 - 180,
+                precision,
+            ))
+    return sorted(cells)
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float):
+    """Distância de haversine entre dois pontos, em km."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """
+    (lat mínima, lat máxima, lon mínima, lon máxima) do quadrado que contém
+    o círculo de ``radius_km``. A longitude não dá a volta no antimeridiano:
+    perto dele a caixa só fica maior que o necessário.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    # Maior afastamento em longitude de um ponto do círculo (na esfera)
+    ratio = math.sin(angle) / max(math.cos(math.radians(lat)), 1e-9)
+    dlon = math.degrees(math.asin(ratio)) if ratio < 1 else 360.0
+    if lon - dlon < -180 or lon + dlon > 180:
+        dlon = 360.0
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
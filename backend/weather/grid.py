@@ -0,0 +1,23 @@
+import math
+
+from django.conf import settings
+
+
+def grid_cell(lat: float, lon: float, size: float = None):
+    """Retorna os índices (linha, coluna) da célula da grade que contém o ponto."""
+    size = size or settings.WEATHER_GRID_SIZE
+    return math.floor(lat / size), math.floor(lon / size)
+
+
+def cell_key(lat: float, lon: float, size: float = None):
+    """Chave textual estável da célula, incluindo o tamanho da grade."""
+    size = size or settings.WEATHER_GRID_SIZE
+    row, col = grid_cell(lat, lon, size)
+    return f"{size:g}:{row}:{col}"
+
+
+def cell_center(lat: float, lon: float, size: float = None):
+    """Coordenadas do centro da célula, usadas nas consultas ao OpenWeather."""
+    size = size or settings.WEATHER_GRID_SIZE
+    row, col = grid_cell(lat, lon, size)
+    return round((row + 0.5) * size, 6), round((col + 0.5) * size, 6)
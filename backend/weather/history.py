@@ -0,0 +1,326 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import HistoryCoverage, PollutionObservation, WeatherObservation
+
+HOUR = 3600
+FIELDS = ("aqi", "pm2_5", "pm10", "o3", "no2", "so2", "co")
+
+# Acima disso as lacunas mais próximas entre si são unidas, até sobrar
+# esse número de consultas ao OpenWeather
+MAX_GAP_FETCHES = 6
+
+# Horas mais recentes que isso podem ainda não ter sido publicadas pelo
+# OpenWeather: ficam fora da cobertura e são consultadas de novo
+PUBLISH_DELAY = 3 * HOUR
+
+# Largura dos baldes de agregação, em segundos. Semanas começam na segunda:
+# 01/01/1970 foi uma quinta, daí o deslocamento de 4 dias.
+RESOLUTIONS = {"hour": HOUR, "day": 24 * HOUR, "week": 7 * 24 * HOUR}
+WEEK_OFFSET = 4 * 24 * HOUR
+STATS = ("mean", "min", "max")
+
+
+def _query(cell: str, start: int, end: int):
+    return (
+        PollutionObservation.objects
+        .filter(cell=cell, dt__gte=start, dt__lte=end)
+        .order_by("dt")
+        .values_list("dt", *FIELDS)
+    )
+
+
+def _as_dict(row):
+    return dict(zip(("dt",) + FIELDS, row))
+
+
+def load(cell: str, start: int, end: int):
+    """Pontos já armazenados da célula em [start, end], ordenados por dt."""
+    return [_as_dict(row) for row in _query(cell, start, end)]
+
+
+async def aload(cell: str, start: int, end: int):
+    return [_as_dict(row) async for row in _query(cell, start, end)]
+
+
+def _observations(cell: str, points):
+    return [
+        PollutionObservation(cell=cell, dt=p["dt"], **{f: p[f] for f in FIELDS})
+        for p in points
+        if p.get("dt") is not None
+    ]
+
+
+def save(cell: str, points):
+    """Grava pontos novos; os que já existem para (cell, dt) são ignorados."""
+    PollutionObservation.objects.bulk_create(_observations(cell, points), ignore_conflicts=True)
+
+
+async def asave(cell: str, points):
+    await PollutionObservation.objects.abulk_create(
+        _observations(cell, points), ignore_conflicts=True
+    )
+
+
+def _coverage_query(cell: str, start: int, end: int):
+    fresh = timezone.now() - timedelta(seconds=settings.HISTORY_COVERAGE_TTL)
+    return (
+        HistoryCoverage.objects
+        .filter(cell=cell, start__lte=end, end__gte=start, fetched_at__gte=fresh)
+        .values_list("start", "end")
+    )
+
+
+def coverage(cell: str, start: int, end: int):
+    """Intervalos da célula já consultados no OpenWeather que tocam [start, end]."""
+    return list(_coverage_query(cell, start, end))
+
+
+async def acoverage(cell: str, start: int, end: int):
+    return [row async for row in _coverage_query(cell, start, end)]
+
+
+def _coverage_rows(cell: str, ranges):
+    now = timezone.now()
+    published = int(time.time()) - PUBLISH_DELAY
+    return [
+        HistoryCoverage(cell=cell, start=range_start, end=min(range_end, published), fetched_at=now)
+        for range_start, range_end in ranges
+        if range_start <= published
+    ]
+
+
+def _expired_coverage(cell: str):
+    expired = timezone.now() - timedelta(seconds=settings.HISTORY_COVERAGE_TTL)
+    return HistoryCoverage.objects.filter(cell=cell, fetched_at__lt=expired)
+
+
+def record_coverage(cell: str, ranges):
+    """
+    Marca os intervalos como consultados: as horas que o OpenWeather não
+    devolveu deixam de ser lacunas até HISTORY_COVERAGE_TTL vencer.
+    """
+    _expired_coverage(cell).delete()
+    HistoryCoverage.objects.bulk_create(_coverage_rows(cell, ranges))
+
+
+async def arecord_coverage(cell: str, ranges):
+    await _expired_coverage(cell).adelete()
+    await HistoryCoverage.objects.abulk_create(_coverage_rows(cell, ranges))
+
+
+def missing_ranges(stored, start: int, end: int, covered=()):
+    """
+    Intervalos [início, fim] de horas cheias dentro de [start, end] que ainda
+    não têm ponto armazenado nem estão em ``covered`` (intervalos já
+    consultados, ver ``coverage``). Horas futuras nunca são lacunas.
+    """
+    end = min(end, int(time.time()))
+    first = -(-start // HOUR) * HOUR
+    known = {p["dt"] for p in stored}
+    for covered_start, covered_end in covered:
+        aligned = -(-max(covered_start, first) // HOUR) * HOUR
+        known.update(range(aligned, min(covered_end, end) + 1, HOUR))
+
+    ranges = []
+    for slot in range(first, end + 1, HOUR):
+        if slot in known:
+            continue
+        if ranges and ranges[-1][1] == slot - HOUR:
+            ranges[-1][1] = slot
+        else:
+            ranges.append([slot, slot])
+
+    if len(ranges) > MAX_GAP_FETCHES:
+        # Mantém os cortes nos maiores trechos conhecidos entre lacunas: o
+        # que é buscado de novo sem necessidade fica o menor possível
+        separations = sorted(
+            range(1, len(ranges)),
+            key=lambda i: ranges[i][0] - ranges[i - 1][1],
+            reverse=True,
+        )
+        cuts = sorted(separations[:MAX_GAP_FETCHES - 1]) + [len(ranges)]
+        merged, previous = [], 0
+        for cut in cuts:
+            merged.append([ranges[previous][0], ranges[cut - 1][1]])
+            previous = cut
+        ranges = merged
+    return [(gap_start, gap_end) for gap_start, gap_end in ranges]
+
+
+def merge(stored, fetched, start: int, end: int):
+    """Une pontos armazenados e recém-buscados, sem repetir dt, em ordem."""
+    points = {p["dt"]: p for p in fetched if p.get("dt") is not None and start <= p["dt"] <= end}
+    points.update((p["dt"], p) for p in stored)
+    return [points[dt] for dt in sorted(points)]
+
+
+def windows(start: int, end: int, width: int, resolution: str = "raw"):
+    """
+    Divide [start, end] em janelas consecutivas de até ``width`` segundos,
+    alinhadas aos baldes de ``resolution``: nenhum balde fica repartido
+    entre duas janelas, então agregar janela a janela dá o mesmo resultado.
+    """
+    step = RESOLUTIONS.get(resolution, HOUR)
+    offset = WEEK_OFFSET if resolution == "week" else 0
+    width = max(width // step, 1) * step
+
+    result = []
+    window_start = start
+    while window_start <= end:
+        boundary = (window_start - offset) // width * width + offset + width
+        window_end = min(boundary - 1, end)
+        result.append((window_start, window_end))
+        window_start = window_end + 1
+    return result
+
+
+def parse_stat(name: str):
+    """Valida uma estatística: mean, min, max ou pNN (percentil 0–100)."""
+    if name in STATS:
+        return name
+    if name.startswith("p") and name[1:].isdigit() and 0 <= int(name[1:]) <= 100:
+        return name
+    raise ValueError(f"Estatística inválida: {name}")
+
+
+def aggregate(points, resolution: str = "raw", fields=FIELDS, stats=("mean",)):
+    """
+    Reduz uma série de pontos ordenados por dt a um ponto por balde
+    (hour, day ou week, em UTC). Cada ponto resultante traz ``dt`` (início
+    do balde), ``count`` e, por campo, a média em ``campo`` e as demais
+    estatísticas em ``campo_min``, ``campo_max``, ``campo_p95``...
+
+    Tudo é calculado em NumPy sobre a matriz (pontos × campos), sem laço
+    por ponto. Com ``resolution="raw"`` só os campos pedidos são mantidos.
+    """
+    if resolution == "raw":
+        return [{"dt": p["dt"], **{f: p.get(f) for f in fields}} for p in points]
+    if not points:
+        return []
+
+    width = RESOLUTIONS[resolution]
+    offset = WEEK_OFFSET if resolution == "week" else 0
+
+    dts = np.fromiter((p["dt"] for p in points), dtype=np.int64, count=len(points))
+    values = np.array([[p.get(f) for f in fields] for p in points], dtype=float)
+
+    buckets = (dts - offset) // width * width + offset
+    starts, inverse, counts = np.unique(buckets, return_inverse=True, return_counts=True)
+
+    columns = {}
+    if "mean" in stats:
+        sums = np.stack([np.bincount(inverse, weights=col) for col in values.T], axis=1)
+        columns["mean"] = sums / counts[:, None]
+
+    ordered = [stat for stat in stats if stat != "mean"]
+    if ordered:
+        # Ordena os valores de cada campo dentro do balde; com isso mínimo,
+        # máximo e percentis viram leituras em posições calculadas
+        order = np.lexsort((values, np.repeat(inverse[:, None], len(fields), axis=1)), axis=0)
+        ranked = np.take_along_axis(values, order, axis=0)
+        first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        for stat in ordered:
+            q = {"min": 0.0, "max": 100.0}.get(stat)
+            q = float(stat[1:]) if q is None else q
+            # Posição relativa ao início do balde: o peso não depende de
+            # onde o balde cai na matriz (mesmo resultado janela a janela)
+            position = q / 100 * (counts - 1)
+            low = first + np.floor(position).astype(np.int64)
+            high = first + np.ceil(position).astype(np.int64)
+            weight = (position - np.floor(position))[:, None]
+            columns[stat] = ranked[low] * (1 - weight) + ranked[high] * weight
+
+    result = []
+    for i, start in enumerate(starts.tolist()):
+        point = {"dt": start, "count": int(counts[i])}
+        for stat, matrix in columns.items():
+            for j, field in enumerate(fields):
+                key = field if stat == "mean" else f"{field}_{stat}"
+                point[key] = round(float(matrix[i, j]), 3)
+        result.append(point)
+    return result
+
+
+def columnar(points):
+    """Transpõe a lista de pontos em {campo: [valores]}, na ordem dos pontos."""
+    if not points:
+        return {}
+    return {key: [p.get(key) for p in points] for key in points[0]}
+
+
+def _weather_observation(cell: str, raw: dict):
+    main = raw.get("main", {})
+    return WeatherObservation(
+        cell=cell,
+        dt=raw.get("dt") or int(time.time()),
+        temperature=main.get("temp"),
+        feels_like=main.get("feels_like"),
+        humidity=main.get("humidity"),
+        pressure=main.get("pressure"),
+        wind_speed=raw.get("wind", {}).get("speed"),
+    )
+
+
+def record_weather(cell: str, raw: dict):
+    """Grava a leitura bruta do OpenWeather (/weather) como observação da célula."""
+    WeatherObservation.objects.bulk_create([_weather_observation(cell, raw)], ignore_conflicts=True)
+
+
+async def arecord_weather(cell: str, raw: dict):
+    await WeatherObservation.objects.abulk_create(
+        [_weather_observation(cell, raw)], ignore_conflicts=True
+    )
+
+
+def _series_start(hours: int, now: float):
+    """
+    Início da janela dos gráficos: ``hours`` horas cheias terminando na hora
+    atual. Com uma hora a mais, a primeira e a última teriam o mesmo rótulo
+    ("%Hh") e o eixo categórico levaria o último ponto de volta ao início.
+    """
+    return (int(now) // HOUR - hours + 1) * HOUR
+
+
+def temperature_series(cell: str, hours: int = 24, now: float = None):
+    """
+    Temperatura média por hora da célula nas últimas ``hours`` horas (no
+    máximo ``hours`` pontos), como lista de [timestamp da hora, °C]. Uma
+    consulta indexada; o agrupamento por hora é feito em NumPy.
+    """
+    now = time.time() if now is None else now
+    rows = list(
+        WeatherObservation.objects
+        .filter(
+            cell=cell,
+            dt__gte=_series_start(hours, now),
+            dt__lte=int(now),
+            temperature__isnull=False,
+        )
+        .values_list("dt", "temperature")
+    )
+    if not rows:
+        return []
+
+    data = np.asarray(rows, dtype=float)
+    buckets, inverse = np.unique((data[:, 0] // HOUR).astype(np.int64), return_inverse=True)
+    means = np.bincount(inverse, weights=data[:, 1]) / np.bincount(inverse)
+    return [[int(bucket) * HOUR, round(float(mean), 2)] for bucket, mean in zip(buckets, means)]
+
+
+def pollution_series(cell: str, fields=FIELDS, hours: int = 24, now: float = None):
+    """
+    Histórico armazenado da célula nas últimas ``hours`` horas (mesma
+    janela de ``temperature_series``), por campo: {"dt": [...], campo:
+    [...]}. Não consulta o OpenWeather.
+    """
+    now = time.time() if now is None else now
+    points = load(cell, _series_start(hours, now), int(now))
+    if not points:
+        return {}
+    return {key: [p[key] for p in points] for key in ("dt", *fields)}
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .grid import cell_center, cell_key
+from .models import CellActivity
+
+
+class HitCounter:
+    """
+    Contagem de acessos por célula dentro do worker. Os totais são enviados
+    ao banco (CellActivity) no máximo a cada HOT_CELLS_FLUSH_INTERVAL segundos.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, lat: float, lon: float):
+        """Conta um acesso; retorna True quando é hora de descarregar os totais."""
+        cell = cell_key(lat, lon)
+        with self._lock:
+            entry = self._counts.get(cell)
+            if entry is None:
+                self._counts[cell] = [*cell_center(lat, lon), 1]
+            else:
+                entry[2] += 1
+            return time.monotonic() - self._last_flush >= settings.HOT_CELLS_FLUSH_INTERVAL
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self._last_flush = time.monotonic()
+        return counts
+
+
+_counter = HitCounter()
+
+
+def flush():
+    """Soma os acessos acumulados no worker à pontuação de cada célula."""
+    now = timezone.now()
+    for cell, (lat, lon, hits) in _counter.drain().items():
+        updated = CellActivity.objects.filter(cell=cell).update(
+            score=F("score") + hits, last_seen=now
+        )
+        if not updated:
+            CellActivity.objects.bulk_create(
+                [CellActivity(cell=cell, latitude=lat, longitude=lon, score=hits, last_seen=now)],
+                ignore_conflicts=True,
+            )
+
+
+def record_hit(lat: float, lon: float):
+    if _counter.record(lat, lon):
+        flush()
+
+
+async def arecord_hit(lat: float, lon: float):
+    if _counter.record(lat, lon):
+        await sync_to_async(flush)()
+
+
+def hottest_cells(limit: int):
+    return list(
+        CellActivity.objects.filter(score__gt=0)
+        .order_by("-score")
+        .values_list("cell", "latitude", "longitude")[:limit]
+    )
+
+
+def decay(factor: float):
+    """Envelhece as pontuações e descarta células que esfriaram."""
+    CellActivity.objects.update(score=F("score") * factor)
+    CellActivity.objects.filter(score__lt=0.01).delete()
@@ -0,0 +1,126 @@
+import os
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ReportJob, WeatherReport
+
+
+def claim_jobs(limit: int):
+    """
+    Reserva até ``limit`` jobs pendentes, do mais antigo para o mais novo.
+    ``skip_locked`` permite vários workers consumindo a mesma fila.
+    """
+    if limit <= 0:
+        return []
+
+    with transaction.atomic():
+        jobs = list(
+            ReportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=ReportJob.PENDING)
+            .order_by("created_at")[:limit]
+        )
+        if jobs:
+            now = timezone.now()
+            ReportJob.objects.filter(id__in=[job.id for job in jobs]).update(
+                status=ReportJob.RUNNING, started_at=now
+            )
+            for job in jobs:
+                job.status, job.started_at = ReportJob.RUNNING, now
+    return jobs
+
+
+def complete_job(job: ReportJob, report_path: str):
+    """Registra o relatório gerado e marca o job como concluído."""
+    data = job.payload
+    with transaction.atomic():
+        report = WeatherReport.objects.create(
+            city=data["city"],
+            latitude=data["latitude"],
+            longitude=data["longitude"],
+            file_path=report_path,
+            content_hash=job.content_hash,
+        )
+        reuse_report(job, report)
+    return report
+
+
+def reuse_report(job: ReportJob, report: WeatherReport):
+    """Conclui o job apontando para um relatório já existente."""
+    job.report = report
+    job.status = ReportJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["report", "status", "finished_at"])
+
+
+def fail_job(job: ReportJob, error: str):
+    job.status = ReportJob.FAILED
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+
+
+def requeue_job(job: ReportJob):
+    """Devolve o job à fila para outra tentativa."""
+    job.status = ReportJob.PENDING
+    job.started_at = None
+    job.save(update_fields=["status", "started_at"])
+
+
+def requeue_stale(timeout: int, exclude=()):
+    """
+    Devolve à fila jobs presos em execução (ex.: worker reiniciado). Os
+    ids em ``exclude`` (os que o próprio worker ainda está gerando) ficam.
+    """
+    limit = timezone.now() - timedelta(seconds=timeout)
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, started_at__lt=limit
+    ).exclude(id__in=list(exclude)).update(status=ReportJob.PENDING, started_at=None)
+
+
+def queue_depth():
+    return ReportJob.objects.filter(status__in=[ReportJob.PENDING, ReportJob.RUNNING]).count()
+
+
+async def aqueue_depth():
+    return await ReportJob.objects.filter(
+        status__in=[ReportJob.PENDING, ReportJob.RUNNING]
+    ).acount()
+
+
+def _reports_with_hash(content_hash: str):
+    return WeatherReport.objects.filter(content_hash=content_hash).order_by("-generated_at")
+
+
+def find_report(content_hash: str):
+    """Relatório mais recente com o mesmo conteúdo cujo arquivo ainda existe."""
+    if not content_hash:
+        return None
+    report = _reports_with_hash(content_hash).first()
+    if report is not None and os.path.isfile(report.absolute_path):
+        return report
+    return None
+
+
+async def afind_report(content_hash: str):
+    if not content_hash:
+        return None
+    report = await _reports_with_hash(content_hash).afirst()
+    # stat() no disco fora do event loop
+    exists = report is not None and await sync_to_async(
+        os.path.isfile, thread_sensitive=False
+    )(report.absolute_path)
+    return report if exists else None
+
+
+async def afind_active_job(content_hash: str):
+    """Job com o mesmo conteúdo que ainda está na fila ou em execução."""
+    if not content_hash:
+        return None
+    return await ReportJob.objects.filter(
+        content_hash=content_hash,
+        status__in=[ReportJob.PENDING, ReportJob.RUNNING],
+    ).order_by("created_at").afirst()
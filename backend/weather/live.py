@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+
+from . import hotcells, metrics
+from .grid import cell_center, cell_key
+from .resilience import UpstreamError
+from .services import aget_air_pollution_data, aget_weather_data
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("weather", "air")
+
+
+def diff(old: dict, new: dict):
+    """
+    Campos que mudaram de ``old`` para ``new``, por seção ("weather", "air").
+    Seções ausentes em ``new`` (falha na leitura) ficam de fora.
+    """
+    delta = {}
+    for section in SECTIONS:
+        current = new.get(section)
+        if current is None:
+            continue
+        previous = old.get(section) or {}
+        changed = {k: v for k, v in current.items() if previous.get(k) != v}
+        changed.update({k: None for k in previous if k not in current})
+        if changed:
+            delta[section] = changed
+    return delta
+
+
+def event(name: str, data: dict):
+    """Evento no formato Server-Sent Events."""
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class CellFeed:
+    """
+    Leituras de uma célula entregues aos assinantes do worker. Uma única
+    tarefa lê o cache da grade a cada LIVE_POLL_INTERVAL segundos (o
+    OpenWeather só é consultado quando a leitura vence) e repassa a todos
+    apenas os campos que mudaram. Essas leituras não contam para as células
+    quentes; cada assinatura conta como um acesso.
+    """
+
+    def __init__(self, hub, key: str, lat: float, lon: float):
+        self.hub = hub
+        self.key = key
+        self.lat, self.lon = lat, lon
+        self.state = {}
+        self.subscribers = set()
+        self.ready = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run())
+
+    async def _read(self):
+        weather, air = await asyncio.gather(
+            aget_weather_data(self.lat, self.lon, count_hit=False),
+            aget_air_pollution_data(self.lat, self.lon, count_hit=False),
+            return_exceptions=True,
+        )
+        reading = {}
+        if isinstance(weather, Exception):
+            if not isinstance(weather, UpstreamError):
+                logger.warning("Falha ao ler o clima da célula %s: %s", self.key, weather)
+        else:
+            reading["weather"] = weather
+        if air is not None and not isinstance(air, Exception):
+            reading["air"] = air
+        return reading
+
+    async def _run(self):
+        try:
+            while self.subscribers or not self.ready.is_set():
+                reading = await self._read()
+                delta = diff(self.state, reading)
+                if delta:
+                    for section in delta:
+                        self.state[section] = reading[section]
+                    if self.ready.is_set():
+                        self._publish(event("update", delta))
+                        metrics.inc("live_events_total", {"event": "update"})
+                self.ready.set()
+                await asyncio.sleep(settings.LIVE_POLL_INTERVAL)
+        finally:
+            self.ready.set()
+            self.hub.discard(self)
+
+    def _publish(self, message: str):
+        for queue in self.subscribers:
+            if queue.full():
+                # Assinante lento: descarta o que estava na fila e manda o
+                # estado completo, para que ele não aplique deltas fora de ordem
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(event("snapshot", self.state))
+            else:
+                queue.put_nowait(message)
+
+    def snapshot(self):
+        return event("snapshot", self.state)
+
+
+class LiveHub:
+    """Feeds por célula do worker, criados no primeiro assinante."""
+
+    def __init__(self):
+        self.feeds = {}
+
+    @property
+    def subscribers(self):
+        return sum(len(feed.subscribers) for feed in self.feeds.values())
+
+    async def subscribe(self, lat: float, lon: float):
+        """
+        Inscreve um assinante na célula de (lat, lon). Retorna (feed, fila):
+        a fila recebe os eventos já formatados, a partir do estado atual.
+        """
+        key = cell_key(lat, lon)
+        feed = self.feeds.get(key)
+        if feed is None:
+            feed = self.feeds[key] = CellFeed(self, key, *cell_center(lat, lon))
+
+        queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+        feed.subscribers.add(queue)
+        try:
+            await hotcells.arecord_hit(lat, lon)
+            await feed.ready.wait()
+        except BaseException:
+            # Cliente desconectou antes da primeira leitura: sem isso a fila
+            # ficaria inscrita e o feed leria a célula para sempre
+            self.unsubscribe(feed, queue)
+            raise
+        queue.put_nowait(feed.snapshot())
+        return feed, queue
+
+    def unsubscribe(self, feed: CellFeed, queue):
+        feed.subscribers.discard(queue)
+        if not feed.subscribers:
+            feed.task.cancel()
+            self.discard(feed)
+
+    def discard(self, feed: CellFeed):
+        if self.feeds.get(feed.key) is feed:
+            del self.feeds[feed.key]
+
+
+# Um hub por worker do uvicorn (cada um com seu event loop)
+hub = LiveHub()
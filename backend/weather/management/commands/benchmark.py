@@ -0,0 +1,435 @@
+import asyncio
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import django
+import httpx
+import numpy as np
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from weather import fake_openweather, storage
+from weather.fake_openweather import FakeOpenWeather
+from weather.grid import cell_center
+from weather.models import WeatherReport
+from weather.reports import generate_weather_report
+from weather.services import _parse_air_pollution, _parse_weather
+
+# Região de São Paulo usada para sortear as células do teste
+BBOX = (-23.70, -46.80, -23.45, -46.45)
+
+
+def _routes(points, batch_size, fixtures):
+    """
+    Rotas medidas: nome -> função que monta (método, caminho, corpo[, cabeçalhos])
+    para um ponto. ``fixtures`` traz os ids de jobs e relatórios existentes.
+    """
+    now = int(time.time())
+    jobs, reports = fixtures["jobs"], fixtures["reports"]
+    return {
+        "weather": lambda lat, lon: ("GET", f"/api/weather?lat={lat}&lon={lon}", None),
+        "air": lambda lat, lon: ("GET", f"/api/air?lat={lat}&lon={lon}", None),
+        "air_history": lambda lat, lon: ("GET", f"/api/air/history?lat={lat}&lon={lon}", None),
+        "air_history_week": lambda lat, lon: (
+            "GET",
+            f"/api/air/history?lat={lat}&lon={lon}&start={now - 7 * 86400}&end={now}"
+            "&resolution=hour&fields=pm2_5&stats=mean,p95",
+            None,
+        ),
+        "air_history_stream": lambda lat, lon: (
+            "GET",
+            f"/api/air/history?lat={lat}&lon={lon}&start={now - 90 * 86400}&end={now}"
+            "&resolution=day&format=ndjson",
+            None,
+        ),
+        "forecast": lambda lat, lon: ("GET", f"/api/forecast?lat={lat}&lon={lon}", None),
+        "snapshot": lambda lat, lon: ("GET", f"/api/snapshot?lat={lat}&lon={lon}", None),
+        "batch": lambda lat, lon: (
+            "POST", "/api/batch", {"points": random.sample(points, min(batch_size, len(points)))}
+        ),
+        "list_reports": lambda lat, lon: ("GET", "/api/reports/Benchmark?limit=50", None),
+        "report": lambda lat, lon: ("POST", "/api/report/weather", {"lat": lat, "lon": lon}),
+        "report_job": lambda lat, lon: ("GET", f"/api/report/jobs/{random.choice(jobs)}", None),
+        "download": lambda lat, lon: (
+            "GET", f"/api/report/download/{random.choice(reports)}", None, {"Range": "bytes=0-65535"}
+        ),
+        "nearby": lambda lat, lon: ("GET", f"/api/report/nearby?lat={lat}&lon={lon}&radius=5", None),
+        # Mede o tempo até o primeiro evento (snapshot) e fecha a conexão
+        "live": lambda lat, lon: (
+            "GET", f"/api/live?lat={lat}&lon={lon}", None, {"Accept": "text/event-stream"}
+        ),
+        "metrics": lambda lat, lon: ("GET", "/api/metrics", None),
+    }
+
+
+# Rotas que só fazem sentido com ids existentes: rota -> fixture necessária
+_NEEDS = {"report_job": "jobs", "download": "reports"}
+
+
+def _report_data(lat, lon):
+    """Payload de relatório a partir das respostas do OpenWeather falso."""
+    data = _parse_weather(fake_openweather._weather(lat, lon, {}), lat, lon)
+    data["city"] = "Benchmark"
+    data["pollution"] = _parse_air_pollution(fake_openweather._air_pollution(lat, lon, {}))
+    now = int(time.time()) // 3600 * 3600
+    data["temperature_series"] = [
+        [now - h * 3600, round(data["temperatura"] + random.uniform(-3, 3), 2)]
+        for h in range(23, -1, -1)
+    ]
+    return data
+
+
+async def _first_event(app, path):
+    """
+    Abre o SSE direto na aplicação ASGI e espera o primeiro evento; depois
+    simula a desconexão do cliente. O ASGITransport do httpx só devolve a
+    resposta quando o corpo termina, o que num stream nunca acontece.
+    Retorna o status HTTP.
+    """
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(b"host", b"localhost"), (b"accept", b"text/event-stream")],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 0),
+    }
+    first = asyncio.Event()
+    requested = False
+    status = None
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await first.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif b"event:" in message.get("body", b"") or not message.get("more_body"):
+            first.set()
+
+    await asyncio.wait_for(app(scope, receive, send), timeout=60)
+    return status
+
+
+def _is_error(status: str):
+    """Só 2xx, 304 e "ok" (PDF gerado) contam como sucesso."""
+    return not (status.startswith("2") or status in ("304", "ok"))
+
+
+def _summary(latencies, statuses, elapsed):
+    ms = np.asarray(latencies) * 1000
+    errors = sum(n for code, n in statuses.items() if _is_error(code))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 2),
+            "p50": round(float(np.percentile(ms, 50)), 2),
+            "p95": round(float(np.percentile(ms, 95)), 2),
+            "p99": round(float(np.percentile(ms, 99)), 2),
+            "max": round(float(ms.max()), 2),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede vazão e latências (p50/p95/p99) de cada rota da API e a geração "
+        "de PDFs contra um OpenWeather falso local, e grava o resultado em JSON. "
+        "Rodando a aplicação neste processo, usa um banco de teste descartável "
+        "(com relatórios de exemplo para download e busca por proximidade), um "
+        "prefixo próprio no cache e diretórios temporários para relatórios, "
+        "métricas e gráficos. Falha se alguma resposta não for 2xx ou 304."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requisições por rota.")
+        parser.add_argument("--concurrency", type=int, default=20, help="Requisições simultâneas.")
+        parser.add_argument("--cells", type=int, default=50, help="Células distintas sorteadas.")
+        parser.add_argument("--batch-size", type=int, default=50, help="Pontos por /api/batch.")
+        parser.add_argument("--reports", type=int, default=20, help="PDFs gerados (0 desliga).")
+        parser.add_argument(
+            "--routes", default="", help="Rotas separadas por vírgula (padrão: todas)."
+        )
+        parser.add_argument("--latency", type=float, default=50, help="Latência do falso, em ms.")
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--throttle-rate", type=float, default=0.0)
+        parser.add_argument(
+            "--upstream",
+            default="",
+            help="OPENWEATHER_BASE_URL a usar em vez de subir o servidor falso.",
+        )
+        parser.add_argument(
+            "--target",
+            default="",
+            help=(
+                "URL de uma API já em execução (ex.: http://localhost:8000). Sem ela a "
+                "aplicação ASGI roda neste processo. O servidor alvo precisa estar "
+                "configurado com OPENWEATHER_BASE_URL apontando para o falso."
+            ),
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Reaproveita o banco de teste entre execuções (mais rápido).",
+        )
+        parser.add_argument("--output", default="", help="Arquivo JSON de saída.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+
+        fake = None
+        upstream = options["upstream"]
+        if not upstream and not options["target"]:
+            fake = FakeOpenWeather(
+                latency=options["latency"] / 1000,
+                jitter=options["latency"] / 4000,
+                error_rate=options["error_rate"],
+                throttle_rate=options["throttle_rate"],
+            ).start()
+            upstream = fake.base_url
+
+        # Sem a cota real: o que se mede aqui é a aplicação, não o limitador
+        overrides = {
+            "OPENWEATHER_BASE_URL": upstream or settings.OPENWEATHER_BASE_URL,
+            "OPENWEATHER_API_KEY": settings.OPENWEATHER_API_KEY or "benchmark",
+            "UPSTREAM_RATE_PER_MINUTE": 10**9,
+            "UPSTREAM_BURST": 10**9,
+        }
+        # As leituras falsas não podem chegar ao cache, às métricas nem aos
+        # gráficos de verdade; o banco é trocado pelo de teste em seguida
+        isolated = not options["target"]
+        scratch = tempfile.TemporaryDirectory(prefix="benchmark-")
+        if isolated:
+            prefix = f"benchmark-{os.getpid()}-{int(time.time())}"
+            overrides.update(
+                CACHES={
+                    alias: dict(config, KEY_PREFIX=f"{config.get('KEY_PREFIX', '')}{prefix}")
+                    for alias, config in settings.CACHES.items()
+                },
+                DATA_DIR=os.path.join(scratch.name, "data"),
+                METRICS_DIR=os.path.join(scratch.name, "metrics"),
+                CHART_CACHE_DIR="",
+                # Os POSTs de relatório enfileiram jobs que nenhum worker consome
+                REPORT_QUEUE_MAX_PENDING=10**9,
+            )
+
+        started_at = datetime.now()
+        with override_settings(**overrides), scratch:
+            databases = (
+                setup_databases(verbosity=0, interactive=False, keepdb=options["keepdb"])
+                if isolated else None
+            )
+            try:
+                if isolated:
+                    self._seed_reports(options["cells"])
+                try:
+                    routes = asyncio.run(self._run_routes(options))
+                finally:
+                    if fake is not None:
+                        fake.stop()
+                reports = self._run_reports(options["reports"]) if options["reports"] else None
+            finally:
+                if databases is not None:
+                    teardown_databases(databases, verbosity=0, keepdb=options["keepdb"])
+
+        result = {
+            "meta": {
+                "started_at": started_at.isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "target": options["target"] or "asgi-in-process",
+                "upstream": upstream or "externo",
+                "upstream_calls": fake.calls if fake else None,
+                "options": {
+                    k: options[k]
+                    for k in ("requests", "concurrency", "cells", "batch_size", "latency",
+                              "error_rate", "throttle_rate", "seed")
+                },
+            },
+            "routes": routes,
+            "reports": reports,
+        }
+
+        path = options["output"] or os.path.join(
+            settings.BASE_DIR, "data", "benchmarks",
+            f"benchmark-{started_at.strftime('%Y%m%d-%H%M%S')}.json",
+        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+        self._print(routes, reports)
+        self.stdout.write(f"Resultado gravado em {path}")
+
+        failed = {name: r["status"] for name, r in routes.items() if r["errors"]}
+        if failed:
+            raise CommandError("Rotas com respostas de erro: " + "; ".join(
+                f"{name} {statuses}" for name, statuses in failed.items()
+            ))
+
+    async def _run_routes(self, options):
+        south, west, north, east = BBOX
+        cells = [
+            cell_center(random.uniform(south, north), random.uniform(west, east))
+            for _ in range(options["cells"])
+        ]
+        size = settings.WEATHER_GRID_SIZE
+        points = [
+            [round(lat + random.uniform(-size, size) / 3, 5),
+             round(lon + random.uniform(-size, size) / 3, 5)]
+            for lat, lon in cells
+        ]
+
+        if options["target"]:
+            app = None
+            client = httpx.AsyncClient(base_url=options["target"], timeout=60)
+        else:
+            app = get_asgi_application()
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://localhost",
+                timeout=60,
+            )
+
+        results = {}
+        async with client:
+            fixtures = await self._fixtures(client, points)
+            builders = _routes(points, options["batch_size"], fixtures)
+            selected = (
+                [r.strip() for r in options["routes"].split(",") if r.strip()] or list(builders)
+            )
+            for name in selected:
+                if name in _NEEDS and not fixtures[_NEEDS[name]]:
+                    self.stdout.write(f"  {name}: ignorada, nenhum id em {_NEEDS[name]}")
+                    continue
+                results[name] = await self._run_route(
+                    client, app, builders[name], points,
+                    options["requests"], options["concurrency"],
+                )
+                self.stdout.write(f"  {name}: {results[name]['throughput_rps']} req/s")
+        return results
+
+    async def _fixtures(self, client, points):
+        """
+        Ids para as rotas de job e de download, obtidos pela própria API: os
+        jobs de alguns POSTs de relatório e os relatórios perto dos pontos.
+        """
+        jobs, reports = [], set()
+        for lat, lon in points[:10]:
+            response = await client.post("/api/report/weather", json={"lat": lat, "lon": lon})
+            if response.status_code == 202:
+                jobs.append(response.json()["job_id"])
+            response = await client.get(f"/api/report/nearby?lat={lat}&lon={lon}&radius=5")
+            if response.status_code == 200:
+                reports.update(row["id"] for row in response.json())
+        return {"jobs": jobs, "reports": sorted(reports)}
+
+    async def _request(self, client, app, method, path, body, headers):
+        """Envia uma requisição e retorna o status; SSE só até o primeiro evento."""
+        if (headers or {}).get("Accept") != "text/event-stream":
+            response = await client.request(method, path, json=body, headers=headers)
+            return response.status_code
+        if app is not None:
+            return await _first_event(app, path)
+        async with client.stream(method, path, headers=headers) as response:
+            if response.status_code == 200:
+                async for chunk in response.aiter_text():
+                    if "event:" in chunk:
+                        break
+            return response.status_code
+
+    async def _run_route(self, client, app, build, points, total, concurrency):
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(build(*random.choice(points)))
+
+        latencies, statuses = [], {}
+
+        async def worker():
+            while not queue.empty():
+                method, path, body, headers = (*queue.get_nowait(), None)[:4]
+                t0 = time.perf_counter()
+                try:
+                    status = str(await self._request(client, app, method, path, body, headers))
+                except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - t0)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return _summary(latencies, statuses, time.perf_counter() - started)
+
+    def _run_reports(self, count):
+        """Gera ``count`` PDFs em sequência neste processo e apaga os arquivos."""
+        south, west, north, east = BBOX
+        latencies, statuses = [], {}
+
+        started = time.perf_counter()
+        for i in range(count):
+            lat, lon = random.uniform(south, north), random.uniform(west, east)
+            data = _report_data(lat, lon)
+
+            t0 = time.perf_counter()
+            path = generate_weather_report(data)
+            latencies.append(time.perf_counter() - t0)
+            statuses["ok"] = statuses.get("ok", 0) + 1
+            storage.remove_file(path)
+
+        summary = _summary(latencies, statuses, time.perf_counter() - started)
+        summary["reports_per_second"] = summary.pop("throughput_rps")
+        return summary
+
+    def _seed_reports(self, count):
+        """
+        Registra ``count`` relatórios "Benchmark" espalhados pela região, todos
+        apontando para um único PDF gerado no DATA_DIR temporário.
+        """
+        south, west, north, east = BBOX
+        path = generate_weather_report(_report_data((south + north) / 2, (west + east) / 2))
+        for i in range(count):
+            WeatherReport.objects.create(
+                city="Benchmark",
+                latitude=random.uniform(south, north),
+                longitude=random.uniform(west, east),
+                file_path=path,
+            )
+
+    def _print(self, routes, reports):
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'rota':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'erros':>8}"
+        )
+        rows = list(routes.items())
+        if reports:
+            rows.append(("pdf", dict(reports, throughput_rps=reports["reports_per_second"])))
+        for name, r in rows:
+            lat = r["latency_ms"]
+            self.stdout.write(
+                f"{name:<18}{r['throughput_rps']:>10}{lat['p50']:>10}{lat['p95']:>10}"
+                f"{lat['p99']:>10}{r['errors']:>8}"
+            )
@@ -0,0 +1,250 @@
+import asyncio
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from weather import geohash, jobs
+from weather.fingerprint import report_fingerprint
+from weather.history import pollution_series, temperature_series
+from weather.models import WeatherReport, normalize_city
+from weather.reports import POLLUTION_CHART_FIELDS, generate_weather_report, warm_up
+from weather.services import aget_batch_data
+
+
+def _init_process():
+    # Necessário quando o pool usa "spawn"; com "fork" é praticamente um no-op
+    django.setup()
+    warm_up()
+
+
+def _field(row: dict, *names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def load_locations(path: str):
+    """
+    Lê as localizações de um CSV (colunas lat/lon ou latitude/longitude e,
+    opcionalmente, city/cidade/bairro) ou de um JSON com uma lista de objetos
+    nesse formato ou de pares [lat, lon]. Retorna (localizações, inválidas).
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    locations, invalid = [], []
+    for i, row in enumerate(rows, start=1):
+        if isinstance(row, (list, tuple)):
+            row = {"lat": row[0], "lon": row[1], "city": row[2] if len(row) > 2 else None}
+        try:
+            lat = float(_field(row, "lat", "latitude"))
+            lon = float(_field(row, "lon", "longitude"))
+        except (TypeError, ValueError):
+            invalid.append({
+                "lat": row.get("lat"),
+                "lon": row.get("lon"),
+                "city": None,
+                "error": f"Linha {i}: 'lat' e 'lon' numéricos são obrigatórios.",
+            })
+            continue
+        locations.append({
+            "lat": lat,
+            "lon": lon,
+            "city": _field(row, "city", "cidade", "bairro", "name"),
+        })
+    return locations, invalid
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera relatórios PDF em lote para uma lista de localizações (CSV ou "
+        "JSON): busca clima e poluição com concorrência limitada, renderiza em "
+        "um pool de processos e grava os registros com bulk_create."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Arquivo .csv ou .json com as localizações.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.BATCH_CONCURRENCY,
+            help="Células consultadas no OpenWeather ao mesmo tempo.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.REPORT_WORKER_CONCURRENCY,
+            help="Processos renderizando PDFs em paralelo.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Registros gravados por bulk_create.",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=3,
+            help="Novas tentativas para as células sem dados (ex.: cota esgotada).",
+        )
+        parser.add_argument(
+            "--retry-wait",
+            type=float,
+            default=60,
+            help="Segundos de espera antes de cada nova tentativa.",
+        )
+        parser.add_argument(
+            "--no-reuse",
+            action="store_true",
+            help="Gera o PDF mesmo havendo um com o mesmo conteúdo na janela de dedup.",
+        )
+        parser.add_argument(
+            "--failures",
+            default="",
+            help="Arquivo JSON onde gravar os itens que falharam.",
+        )
+
+    def handle(self, *args, **options):
+        locations, failures = load_locations(options["path"])
+        total = len(locations)
+        if not total:
+            self.stdout.write("Nenhuma localização válida no arquivo.")
+            return
+
+        started = time.perf_counter()
+        self.stdout.write(f"Buscando clima e poluição de {total} localização(ões)...")
+        cells, keys = self._fetch(locations, options)
+
+        pending, reused = [], 0
+        for index, (item, key) in enumerate(zip(locations, keys)):
+            cell = cells[key]
+            if cell["weather"] is None:
+                failures.append(dict(item, error=cell["errors"].get("weather")))
+                continue
+
+            data = dict(cell["weather"], latitude=item["lat"], longitude=item["lon"])
+            if item["city"]:
+                data["city"] = item["city"]
+            data["pollution"] = cell["air"]
+            content_hash = report_fingerprint(data)
+
+            if not options["no_reuse"] and jobs.find_report(content_hash) is not None:
+                reused += 1
+                continue
+
+            data["temperature_series"] = temperature_series(key)
+            data["pollution_series"] = pollution_series(key, POLLUTION_CHART_FIELDS)
+            pending.append((index, data, content_hash))
+
+        self.stdout.write(
+            f"Dados obtidos em {time.perf_counter() - started:.1f}s: "
+            f"{len(pending)} a gerar, {reused} reaproveitado(s), {len(failures)} falha(s)."
+        )
+
+        created = self._render(pending, locations, failures, options)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Concluído em {elapsed:.1f}s: {created} relatório(s) gerado(s), "
+            f"{reused} reaproveitado(s), {len(failures)} falha(s)."
+        )
+        for failure in failures:
+            self.stderr.write(
+                f"  ({failure['lat']}, {failure['lon']}) {failure['city'] or ''}: "
+                f"{failure['error']}"
+            )
+        if failures and options["failures"]:
+            with open(options["failures"], "w", encoding="utf-8") as f:
+                json.dump(failures, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Falhas gravadas em {options['failures']}")
+
+    def _fetch(self, locations, options):
+        """
+        Clima e poluição de todas as localizações. Células que falharam (cota
+        esgotada, disjuntor aberto) são consultadas de novo após
+        ``--retry-wait`` segundos, até ``--retries`` vezes.
+        """
+        points = [(item["lat"], item["lon"]) for item in locations]
+        try:
+            cells, keys = asyncio.run(
+                aget_batch_data(points, concurrency=options["concurrency"])
+            )
+            for attempt in range(options["retries"]):
+                failed = [p for p, key in zip(points, keys) if cells[key]["weather"] is None]
+                if not failed:
+                    break
+                self.stdout.write(
+                    f"{len(failed)} localização(ões) sem dados; nova tentativa "
+                    f"em {options['retry_wait']:.0f}s ({attempt + 1}/{options['retries']})."
+                )
+                time.sleep(options["retry_wait"])
+                retried, _ = asyncio.run(
+                    aget_batch_data(failed, concurrency=options["concurrency"])
+                )
+                cells.update(retried)
+        except ValueError as e:
+            raise CommandError(str(e))
+        return cells, keys
+
+    def _render(self, pending, locations, failures, options):
+        """Renderiza os PDFs no pool e grava os registros em lotes."""
+        if not pending:
+            return 0
+
+        batch_size = options["batch_size"]
+        rows, created, done = [], 0, 0
+
+        # Aquece o motor antes do fork: os filhos herdam fontes e estilos prontos
+        warm_up()
+
+        # Os processos filhos não podem herdar conexões abertas com o banco
+        connections.close_all()
+
+        with ProcessPoolExecutor(
+            max_workers=options["processes"], initializer=_init_process
+        ) as pool:
+            futures = {
+                pool.submit(generate_weather_report, data): (index, data, content_hash)
+                for index, data, content_hash in pending
+            }
+            for future in as_completed(futures):
+                index, data, content_hash = futures[future]
+                done += 1
+                try:
+                    path = future.result()
+                except Exception as e:
+                    failures.append(dict(locations[index], error=str(e)))
+                    self.stderr.write(f"[{done}/{len(pending)}] {data['city']}: falhou ({e})")
+                    continue
+
+                # bulk_create não chama save(): chave da cidade e geohash vão preenchidos aqui
+                rows.append(WeatherReport(
+                    city=data["city"],
+                    city_key=normalize_city(data["city"]),
+                    geohash=geohash.encode(data["latitude"], data["longitude"]),
+                    latitude=data["latitude"],
+                    longitude=data["longitude"],
+                    file_path=path,
+                    content_hash=content_hash,
+                ))
+                self.stdout.write(f"[{done}/{len(pending)}] {data['city']}: ok")
+
+                if len(rows) >= batch_size:
+                    created += len(WeatherReport.objects.bulk_create(rows))
+                    rows = []
+
+        if rows:
+            created += len(WeatherReport.objects.bulk_create(rows))
+        return created
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from weather import storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica a retenção dos relatórios (idade e quantidade por cidade) e dos "
+        "jobs encerrados, apaga PDFs sem registro e, com --delete-missing, "
+        "registros sem PDF."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age-days",
+            type=int,
+            default=settings.REPORT_RETENTION_DAYS,
+            help="Apaga relatórios mais velhos que isso (0 desliga).",
+        )
+        parser.add_argument(
+            "--keep-per-city",
+            type=int,
+            default=settings.REPORT_RETENTION_PER_CITY,
+            help="Mantém só os N mais recentes de cada cidade (0 desliga).",
+        )
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=settings.REPORT_ORPHAN_GRACE,
+            help="Idade mínima, em segundos, de um PDF sem registro para ser apagado.",
+        )
+        parser.add_argument(
+            "--job-max-age-days",
+            type=int,
+            default=settings.REPORT_JOB_RETENTION_DAYS,
+            help="Apaga jobs concluídos ou falhos há mais que isso (0 desliga).",
+        )
+        parser.add_argument(
+            "--delete-missing",
+            action="store_true",
+            help="Apaga também os registros cujo PDF não existe mais (por padrão só conta).",
+        )
+        parser.add_argument(
+            "--max-missing",
+            type=float,
+            default=settings.REPORT_RECONCILE_MAX_MISSING,
+            help="Aborta se faltar mais que esta fração dos PDFs registrados.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--skip-orphans",
+            action="store_true",
+            help="Só aplica a retenção, sem varrer o diretório.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Só conta o que seria apagado.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        prefix = "[simulação] " if dry_run else ""
+
+        rows, files = storage.delete_reports(
+            storage.expired_reports(options["max_age_days"], options["keep_per_city"]),
+            batch_size=batch_size,
+            dry_run=dry_run,
+        )
+        self.stdout.write(f"{prefix}Retenção: {rows} registro(s) e {files} arquivo(s) apagados.")
+
+        jobs = storage.delete_jobs(
+            storage.expired_jobs(options["job_max_age_days"]),
+            batch_size=batch_size,
+            dry_run=dry_run,
+        )
+        self.stdout.write(f"{prefix}Fila: {jobs} job(s) encerrado(s) apagado(s).")
+
+        if options["skip_orphans"]:
+            return
+
+        delete_missing = options["delete_missing"]
+        try:
+            orphans, missing = storage.reconcile(
+                options["grace"],
+                batch_size=batch_size,
+                dry_run=dry_run,
+                delete_missing=delete_missing,
+                max_missing=options["max_missing"],
+            )
+        except storage.StorageUnavailable as e:
+            raise CommandError(f"Reconciliação abortada: {e}")
+        self.stdout.write(f"{prefix}Reconciliação: {orphans} PDF(s) sem registro apagado(s).")
+        if delete_missing:
+            self.stdout.write(f"{prefix}{missing} registro(s) sem PDF apagado(s).")
+        elif missing:
+            self.stdout.write(
+                f"{missing} registro(s) sem PDF mantido(s); use --delete-missing para apagá-los."
+            )
+
+        if not dry_run:
+            storage.prune_empty_dirs()
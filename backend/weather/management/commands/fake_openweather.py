@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from weather.fake_openweather import FakeOpenWeather
+
+
+class Command(BaseCommand):
+    help = (
+        "Sobe um OpenWeather falso (weather, forecast, air_pollution e "
+        "air_pollution/history) para testes de carga sem rede. Aponte a API "
+        "para ele com OPENWEATHER_BASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument(
+            "--latency", type=float, default=50, help="Latência média por chamada, em ms."
+        )
+        parser.add_argument(
+            "--jitter", type=float, default=20, help="Variação aleatória da latência, em ms."
+        )
+        parser.add_argument(
+            "--error-rate", type=float, default=0.0, help="Fração de chamadas que recebem 500."
+        )
+        parser.add_argument(
+            "--throttle-rate", type=float, default=0.0, help="Fração de chamadas que recebem 429."
+        )
+
+    def handle(self, *args, **options):
+        fake = FakeOpenWeather(
+            host=options["host"],
+            port=options["port"],
+            latency=options["latency"] / 1000,
+            jitter=options["jitter"] / 1000,
+            error_rate=options["error_rate"],
+            throttle_rate=options["throttle_rate"],
+        )
+        self.stdout.write(f"OpenWeather falso em {fake.base_url}")
+        self.stdout.write(f"Use OPENWEATHER_BASE_URL={fake.base_url}")
+        try:
+            fake.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fake.stop()
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from weather import hotcells
+from weather.cache import grid_cache
+from weather.services import refresh_cell
+
+ENDPOINTS = ("weather", "air")
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza antecipadamente, dentro de uma cota por minuto, o clima e a "
+        "qualidade do ar das células mais acessadas antes que o cache expire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.REFRESH_AHEAD_INTERVAL,
+            help="Segundos entre rodadas.",
+        )
+        parser.add_argument(
+            "--quota",
+            type=int,
+            default=settings.REFRESH_AHEAD_QUOTA_PER_MINUTE,
+            help="Máximo de chamadas ao OpenWeather por minuto.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Executa uma única rodada e encerra.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        quota = options["quota"]
+        window_start, used = time.monotonic(), 0
+
+        self.stdout.write(f"Refresh antecipado iniciado (cota={quota}/min).")
+        while True:
+            if time.monotonic() - window_start >= 60:
+                window_start, used = time.monotonic(), 0
+
+            used += self._round(quota - used)
+            hotcells.decay(settings.REFRESH_AHEAD_DECAY)
+
+            if options["once"]:
+                break
+            time.sleep(interval)
+
+    def _round(self, budget: int):
+        """Uma rodada: renova as entradas perto de expirar, das células mais quentes primeiro."""
+        if budget <= 0:
+            return 0
+
+        deadline = time.time() + settings.REFRESH_AHEAD_MARGIN
+        calls = 0
+        for cell, lat, lon in hotcells.hottest_cells(settings.REFRESH_AHEAD_MAX_CELLS):
+            for endpoint in ENDPOINTS:
+                expires_at = grid_cache.expires_at(endpoint, lat, lon)
+                if expires_at is not None and expires_at > deadline:
+                    continue
+                if calls >= budget:
+                    return calls
+
+                calls += 1
+                try:
+                    refresh_cell(endpoint, lat, lon)
+                except Exception as e:
+                    self.stderr.write(f"Falha ao atualizar {endpoint} da célula {cell}: {e}")
+
+        if calls:
+            self.stdout.write(f"{calls} leitura(s) renovada(s).")
+        return calls
@@ -0,0 +1,154 @@
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from weather import jobs
+from weather.grid import cell_key
+from weather.history import pollution_series, temperature_series
+from weather.reports import POLLUTION_CHART_FIELDS, generate_weather_report, warm_up
+
+
+def _init_process():
+    # Necessário quando o pool usa "spawn"; com "fork" é praticamente um no-op
+    django.setup()
+    warm_up()
+
+
+class Command(BaseCommand):
+    help = "Consome a fila de ReportJob e gera os PDFs em um pool de processos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.REPORT_WORKER_CONCURRENCY,
+            help="Quantidade de relatórios renderizados em paralelo.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.REPORT_WORKER_POLL_INTERVAL,
+            help="Segundos entre consultas à fila quando ela está vazia.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Processa o que estiver na fila e encerra.",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        poll_interval = options["poll_interval"]
+
+        # Aquece o motor antes do fork: os filhos herdam fontes e estilos prontos
+        warm_up()
+
+        self.stdout.write(f"Worker de relatórios iniciado (concorrência={concurrency}).")
+        self.running = {}
+        # Jobs que estavam no pool quando um processo filho morreu: na segunda
+        # vez o job é dado como falho, para não derrubar o pool em laço
+        self.crashed = set()
+        pool = self._pool(concurrency)
+        next_requeue = 0.0
+        try:
+            while True:
+                if time.monotonic() >= next_requeue:
+                    self._requeue_stale()
+                    next_requeue = time.monotonic() + settings.REPORT_REQUEUE_INTERVAL
+
+                broken = False
+                claimed = jobs.claim_jobs(concurrency - len(self.running))
+                for job in claimed:
+                    if broken:
+                        jobs.requeue_job(job)
+                        continue
+                    existing = jobs.find_report(job.content_hash)
+                    if existing is not None:
+                        jobs.reuse_report(job, existing)
+                        self.stdout.write(f"Job {job.id} reaproveitou o relatório {existing.id}.")
+                        continue
+                    try:
+                        future = pool.submit(generate_weather_report, self._payload(job))
+                    except BrokenProcessPool:
+                        jobs.requeue_job(job)
+                        broken = True
+                        continue
+                    self.running[future] = job
+
+                if not broken and self.running:
+                    done, _ = wait(self.running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        # Os que quebraram ficam em self.running para o _recover
+                        if isinstance(future.exception(), BrokenProcessPool):
+                            broken = True
+                            continue
+                        self._finish(self.running.pop(future), future)
+
+                if broken:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self._recover()
+                    pool = self._pool(concurrency)
+                    continue
+
+                if not self.running:
+                    if claimed:
+                        continue
+                    if options["once"]:
+                        break
+                    time.sleep(poll_interval)
+        finally:
+            pool.shutdown()
+
+    def _pool(self, concurrency):
+        # Os processos filhos não podem herdar conexões abertas com o banco
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=concurrency, initializer=_init_process)
+
+    def _requeue_stale(self):
+        own = [job.id for job in self.running.values()]
+        requeued = jobs.requeue_stale(settings.REPORT_JOB_TIMEOUT, exclude=own)
+        if requeued:
+            self.stdout.write(f"{requeued} job(s) presos devolvidos à fila.")
+
+    def _recover(self):
+        """
+        Um processo do pool morreu (ex.: falta de memória) e levou junto os
+        jobs em andamento: voltam à fila, ou falham se já passaram por isso.
+        """
+        self.stderr.write("Pool de processos quebrado; recriando.")
+        for job in self.running.values():
+            if job.id in self.crashed:
+                self.crashed.discard(job.id)
+                jobs.fail_job(job, "O processo de renderização terminou inesperadamente.")
+                self.stderr.write(f"Job {job.id} falhou: processo encerrado duas vezes.")
+            else:
+                self.crashed.add(job.id)
+                jobs.requeue_job(job)
+                self.stdout.write(f"Job {job.id} devolvido à fila.")
+        self.running = {}
+
+    def _payload(self, job):
+        """Dados do job acrescidos das séries de temperatura e poluição gravadas para a célula."""
+        data = job.payload
+        cell = cell_key(data["latitude"], data["longitude"])
+        return dict(
+            data,
+            temperature_series=temperature_series(cell),
+            pollution_series=pollution_series(cell, POLLUTION_CHART_FIELDS),
+        )
+
+    def _finish(self, job, future):
+        self.crashed.discard(job.id)
+        try:
+            report = jobs.complete_job(job, future.result())
+            self.stdout.write(f"Job {job.id} concluído: relatório {report.id}.")
+        except Exception as e:
+            jobs.fail_job(job, str(e))
+            self.stderr.write(f"Job {job.id} falhou: {e}")
+            self.stderr.write(traceback.format_exc())
@@ -0,0 +1,156 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Etapas de cada tipo de processo, na ordem em que acontecem na partida.
+# "modulo:funcao" importa o módulo e chama a função.
+PROFILES = {
+    "api": [
+        "django:setup",
+        "numpy",
+        "httpx",
+        "weather.services",
+        "weather.views",
+        "urban_local.urls",
+        "django.core.asgi:get_asgi_application",
+    ],
+    "report": [
+        "django:setup",
+        "matplotlib.figure",
+        "reportlab.platypus",
+        "weather.reports",
+        "weather.reports:warm_up",
+    ],
+}
+
+# Pacotes que só os processos que renderizam relatórios devem carregar
+REPORT_STACK = ("matplotlib", "reportlab", "PIL")
+
+# Executado num interpretador novo (com -X importtime) para medir a partida
+# real, sem nada já importado por este processo
+CHILD = r"""
+import importlib, json, os, sys, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+steps = []
+started = time.perf_counter()
+for step in json.loads(sys.argv[1]):
+    module, _, func = step.partition(":")
+    rss, t0 = rss_mb(), time.perf_counter()
+    target = importlib.import_module(module)
+    if func:
+        getattr(target, func)()
+    steps.append({
+        "step": step,
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+        "rss_mb": round(rss_mb() - rss, 1),
+    })
+
+print(json.dumps({
+    "steps": steps,
+    "total_ms": round((time.perf_counter() - started) * 1000, 1),
+    "rss_mb": round(rss_mb(), 1),
+    "modules": sorted({name.split(".")[0] for name in sys.modules}),
+}))
+"""
+
+
+def _package_times(importtime: str):
+    """Soma o tempo próprio (µs) de cada pacote na saída de ``-X importtime``."""
+    totals = {}
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        own = own.strip()
+        if not own.isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(own)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a partida de um processo (worker da API ou de relatórios) num "
+        "interpretador novo: tempo de import e RSS por etapa e tempo por pacote."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            choices=sorted(PROFILES),
+            default="api",
+            help="Tipo de processo medido.",
+        )
+        parser.add_argument(
+            "--top", type=int, default=15, help="Pacotes mais lentos listados."
+        )
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            default=0,
+            help="Falha se a partida passar disso (0 desliga).",
+        )
+        parser.add_argument("--json", default="", help="Arquivo JSON de saída.")
+
+    def handle(self, *args, **options):
+        profile = options["profile"]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            "DJANGO_SETTINGS_MODULE", "urban_local.settings"
+        ))
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD, json.dumps(PROFILES[profile])],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Falha ao medir a partida:\n{proc.stderr[-2000:]}")
+
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        packages = _package_times(proc.stderr)
+        loaded = [name for name in REPORT_STACK if name in result["modules"]]
+
+        self.stdout.write(
+            f"Perfil {profile}: {result['total_ms']:.0f} ms, RSS {result['rss_mb']:.1f} MB"
+        )
+        self.stdout.write("")
+        self.stdout.write(f"{'etapa':<42}{'ms':>10}{'RSS MB':>10}")
+        for step in result["steps"]:
+            self.stdout.write(f"{step['step']:<42}{step['ms']:>10.1f}{step['rss_mb']:>+10.1f}")
+
+        self.stdout.write("")
+        self.stdout.write(f"{'pacote (tempo próprio somado)':<42}{'ms':>10}")
+        for package, micros in packages[:options["top"]]:
+            self.stdout.write(f"{package:<42}{micros / 1000:>10.1f}")
+
+        if profile == "api" and loaded:
+            self.stderr.write(
+                f"Atenção: o worker da API carregou {', '.join(loaded)}; "
+                "o motor de relatórios deve ficar só nos processos que renderizam."
+            )
+
+        if options["json"]:
+            result["packages_ms"] = {name: micros / 1000 for name, micros in packages}
+            with open(options["json"], "w") as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(f"Resultado gravado em {options['json']}")
+
+        if options["budget_ms"] and result["total_ms"] > options["budget_ms"]:
+            raise CommandError(
+                f"Partida de {result['total_ms']:.0f} ms acima do orçamento de "
+                f"{options['budget_ms']:.0f} ms."
+            )
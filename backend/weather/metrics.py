@@ -0,0 +1,246 @@
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Limites dos histogramas de latência, em segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Retratos sem atualização há mais que esse número de intervalos de gravação
+# são de processos que já morreram e são apagados na exposição
+STALE_FLUSHES = 3
+
+# Containers diferentes podem compartilhar METRICS_DIR e repetir pids
+HOSTNAME = socket.gethostname()
+
+METRICS = {
+    "http_requests_total": ("counter", "Requisições atendidas, por view, método e status."),
+    "http_request_duration_seconds": ("histogram", "Latência das requisições, por view."),
+    "upstream_requests_total": ("counter", "Chamadas ao OpenWeather, por endpoint e status."),
+    "upstream_request_duration_seconds": ("histogram", "Latência das chamadas ao OpenWeather."),
+    "report_render_seconds": ("histogram", "Tempo de geração do PDF, por fase (chart, build, write)."),
+    "weather_cache_requests_total": ("counter", "Consultas ao cache da grade, por endpoint e resultado."),
+    "chart_cache_requests_total": ("counter", "Consultas ao cache de gráficos, por resultado (memory, disk, miss)."),
+    "live_events_total": ("counter", "Eventos enviados aos feeds ao vivo (/api/live), por tipo."),
+    "weather_cache_hit_ratio": ("gauge", "Fração das consultas ao cache da grade sem ir ao OpenWeather."),
+}
+
+
+class Registry:
+    """
+    Contadores e histogramas do processo. Cada processo (worker do uvicorn,
+    worker de relatórios e seus filhos) grava de tempos em tempos um retrato
+    cumulativo em METRICS_DIR/<host>-<pid>.json; a exposição soma todos os
+    arquivos. Depois da primeira gravação, uma thread regrava o retrato a
+    cada METRICS_FLUSH_INTERVAL, mesmo sem novas métricas: arquivo parado é
+    de processo morto.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.path = None
+        self.counters = {}
+        self.histograms = {}
+        self._last_flush = time.monotonic()
+        self._heartbeat = None
+
+    def _check_fork(self):
+        # Um filho criado por fork herda os valores do pai; recomeça do zero
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def inc(self, name: str, labels: dict = None, value: float = 1):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_fork()
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            # Threads não sobrevivem ao fork: cada processo inicia a sua
+            self._heartbeat = threading.Thread(
+                target=self._beat, args=(self.pid,), name="metrics-flush", daemon=True
+            )
+            self._heartbeat.start()
+
+    def _beat(self, pid: int):
+        while os.getpid() == pid:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL / 2:
+                self.flush()
+
+    def flush(self):
+        """Grava o retrato do processo de forma atômica (arquivo temporário + rename)."""
+        with self._lock:
+            self._check_fork()
+            self._last_flush = time.monotonic()
+            snapshot = {
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "histograms": [[n, list(l), *e] for (n, l), e in self.histograms.items()],
+            }
+
+        if self._heartbeat is None:
+            self._start_heartbeat()
+
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self.path = os.path.join(settings.METRICS_DIR, f"{HOSTNAME}-{self.pid}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+@atexit.register
+def _remove_at_exit():
+    # Processo encerrado: o retrato deixa de ser somado
+    if registry.pid == os.getpid() and registry.path:
+        try:
+            os.remove(registry.path)
+        except OSError:
+            pass
+
+
+def _labels(labels: dict = None):
+    return tuple(sorted((labels or {}).items()))
+
+
+def inc(name: str, labels: dict = None, value: float = 1):
+    registry.inc(name, labels, value)
+
+
+def observe(name: str, value: float, labels: dict = None):
+    registry.observe(name, value, labels)
+
+
+@contextmanager
+def timer(name: str, labels: dict = None):
+    """Mede o bloco e registra a duração no histograma ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, labels)
+
+
+def collect():
+    """
+    Soma os retratos de todos os processos em (contadores, histogramas).
+    Retratos parados há mais de STALE_FLUSHES intervalos são apagados.
+    """
+    registry.flush()
+
+    stale = time.time() - STALE_FLUSHES * settings.METRICS_FLUSH_INTERVAL
+    counters, histograms = {}, {}
+    for entry in os.scandir(settings.METRICS_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            if entry.stat().st_mtime < stale:
+                os.remove(entry.path)
+                continue
+            with open(entry.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            entry = histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], buckets)]
+            entry[1] += total
+            entry[2] += count
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _cache_hit_ratio(counters):
+    """Taxa de acerto do cache da grade por endpoint (LRU local + compartilhado)."""
+    hits, totals = {}, {}
+    for (name, labels), value in counters.items():
+        if name != "weather_cache_requests_total":
+            continue
+        labels = dict(labels)
+        endpoint = labels.get("endpoint")
+        totals[endpoint] = totals.get(endpoint, 0) + value
+        if labels.get("result") in ("local", "shared"):
+            hits[endpoint] = hits.get(endpoint, 0) + value
+    return {endpoint: hits.get(endpoint, 0) / total for endpoint, total in totals.items() if total}
+
+
+def render():
+    """Todas as métricas agregadas, no formato texto do Prometheus."""
+    counters, histograms = collect()
+    lines = []
+
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            continue
+
+        if kind == "gauge":
+            for endpoint, ratio in sorted(_cache_hit_ratio(counters).items()):
+                lines.append(f"{name}{_format_labels([('endpoint', endpoint)])} {ratio:.4f}")
+            continue
+
+        for (n, labels), (buckets, total, count) in sorted(histograms.items()):
+            if n != name:
+                continue
+            for bound, cumulative in zip(BUCKETS, buckets):
+                le = _format_labels(labels, [("le", f"{bound:g}")])
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,129 @@
+import time
+import zlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele fica só o gzip
+    brotli = None
+
+_ACCEPTS_BR = _lazy_re_compile(r"\bbr\b")
+_ACCEPTS_GZIP = _lazy_re_compile(r"\bgzip\b")
+
+# Abaixo disso o cabeçalho do formato comprimido come o ganho
+MIN_LENGTH = 200
+
+# Streams comprimidos: JSON escrito aos pedaços e NDJSON (histórico longo)
+STREAM_TYPES = ("application/json", "application/x-ndjson")
+
+
+def _encoding(request):
+    accept = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    if brotli is not None and _ACCEPTS_BR.search(accept):
+        return "br"
+    if _ACCEPTS_GZIP.search(accept):
+        return "gzip"
+    return None
+
+
+async def _compress_stream(chunks, encoding: str):
+    """
+    Comprime um stream assíncrono num único fluxo, com flush a cada pedaço
+    para que o cliente consiga descomprimir o que já chegou.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    async for chunk in chunks:
+        yield compress(chunk) + flush()
+    yield finish()
+
+
+class JsonCompressionMiddleware(MiddlewareMixin):
+    """
+    Comprime respostas JSON com brotli (se instalado) ou gzip, conforme o
+    ``Accept-Encoding`` do cliente. Streams assíncronos de JSON/NDJSON são
+    comprimidos pedaço a pedaço; PDFs ficam de fora: já são comprimidos ou
+    são servidos em intervalos (Range).
+    """
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "")
+
+        if response.streaming:
+            if not (response.is_async and content_type.startswith(STREAM_TYPES)):
+                return response
+            encoding = _encoding(request)
+            if encoding is None:
+                return response
+            response.streaming_content = _compress_stream(response.streaming_content, encoding)
+            if response.has_header("Content-Length"):
+                del response.headers["Content-Length"]
+            response["Content-Encoding"] = encoding
+            return response
+
+        if not content_type.startswith("application/json"):
+            return response
+        if len(response.content) < MIN_LENGTH:
+            return response
+
+        encoding = _encoding(request)
+        if encoding == "br":
+            compressed = brotli.compress(response.content, quality=5)
+        elif encoding == "gzip":
+            compressed = compress_string(response.content)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+
+        # O corpo mudou: a ETag deixa de ser forte (RFC 9110 §8.8.1)
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Latência e contagem de requisições por nome de rota (weather/urls.py)."""
+
+    def process_request(self, request):
+        request._metrics_started = time.perf_counter()
+
+    def process_response(self, request, response):
+        started = getattr(request, "_metrics_started", None)
+        if started is None:
+            return response
+
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else "unmatched"
+        metrics.observe(
+            "http_request_duration_seconds", time.perf_counter() - started, {"view": view}
+        )
+        metrics.inc(
+            "http_requests_total",
+            {"view": view, "method": request.method, "status": response.status_code},
+        )
+        return response
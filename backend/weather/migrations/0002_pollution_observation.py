@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollutionObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=40)),
+                ('dt', models.BigIntegerField()),
+                ('aqi', models.PositiveSmallIntegerField(default=0)),
+                ('pm2_5', models.FloatField(default=0.0)),
+                ('pm10', models.FloatField(default=0.0)),
+                ('o3', models.FloatField(default=0.0)),
+                ('no2', models.FloatField(default=0.0)),
+                ('so2', models.FloatField(default=0.0)),
+                ('co', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'dt'), name='unique_pollution_cell_dt')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:00
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalize_city(city):
+    decomposed = unicodedata.normalize("NFKD", city or "")
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(ascii_only.lower().split())
+
+
+def fill_city_key(apps, schema_editor):
+    WeatherReport = apps.get_model("weather", "WeatherReport")
+    batch = []
+    for report in WeatherReport.objects.only("id", "city").iterator(chunk_size=2000):
+        report.city_key = _normalize_city(report.city)
+        batch.append(report)
+        if len(batch) >= 2000:
+            WeatherReport.objects.bulk_update(batch, ["city_key"])
+            batch = []
+    if batch:
+        WeatherReport.objects.bulk_update(batch, ["city_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0004_report_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherreport',
+            name='city_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_city_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='weatherreport',
+            index=models.Index(fields=['city_key', '-generated_at', '-id'], name='report_city_generated'),
+        ),
+    ]
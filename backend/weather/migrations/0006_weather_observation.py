@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0005_report_city_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeatherObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=40)),
+                ('dt', models.BigIntegerField()),
+                ('temperature', models.FloatField(null=True)),
+                ('feels_like', models.FloatField(null=True)),
+                ('humidity', models.FloatField(null=True)),
+                ('pressure', models.FloatField(null=True)),
+                ('wind_speed', models.FloatField(null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'dt'), name='unique_weather_cell_dt')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:20
+
+import os
+
+from django.conf import settings
+from django.db import migrations
+
+
+def make_relative(apps, schema_editor):
+    """Caminhos absolutos dentro de DATA_DIR passam a ser relativos a ele."""
+    WeatherReport = apps.get_model("weather", "WeatherReport")
+    prefix = os.path.join(str(settings.DATA_DIR), "")
+    batch = []
+    for report in WeatherReport.objects.filter(file_path__startswith=prefix).only(
+        "id", "file_path"
+    ).iterator(chunk_size=2000):
+        report.file_path = report.file_path[len(prefix):]
+        batch.append(report)
+        if len(batch) >= 2000:
+            WeatherReport.objects.bulk_update(batch, ["file_path"])
+            batch = []
+    if batch:
+        WeatherReport.objects.bulk_update(batch, ["file_path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0008_upstream_quota'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_relative, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+from weather import geohash
+
+
+def fill_geohash(apps, schema_editor):
+    WeatherReport = apps.get_model("weather", "WeatherReport")
+    batch = []
+    for report in WeatherReport.objects.only("id", "latitude", "longitude").iterator(
+        chunk_size=2000
+    ):
+        report.geohash = geohash.encode(report.latitude, report.longitude)
+        batch.append(report)
+        if len(batch) >= 2000:
+            WeatherReport.objects.bulk_update(batch, ["geohash"])
+            batch = []
+    if batch:
+        WeatherReport.objects.bulk_update(batch, ["geohash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0009_report_relative_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherreport',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='weatherreport',
+            index=models.Index(fields=['geohash'], name='report_geohash', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0010_report_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=40)),
+                ('start', models.BigIntegerField()),
+                ('end', models.BigIntegerField()),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cell', 'start'], name='coverage_cell_start')],
+            },
+        ),
+    ]
@@ -1,14 +1,183 @@
+import os
+import unicodedata
+
+from django.conf import settings
 from django.db import models
 
+from . import geohash
+
+
+def normalize_city(city: str):
+    """Chave de busca da cidade: minúsculas, sem acentos e espaços repetidos."""
+    decomposed = unicodedata.normalize("NFKD", city or "")
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(ascii_only.lower().split())
+
+
 class WeatherReport(models.Model):
     city = models.CharField(max_length=100)
+    city_key = models.CharField(max_length=100, blank=True, editable=False)
     latitude = models.FloatField()
     longitude = models.FloatField()
     generated_at = models.DateTimeField(auto_now_add=True)
     file_path = models.CharField(max_length=300)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
 
     class Meta:
         ordering = ["-generated_at"]
+        indexes = [
+            # Listagem por cidade paginada por (generated_at, id)
+            models.Index(
+                fields=["city_key", "-generated_at", "-id"],
+                name="report_city_generated",
+            ),
+            # Busca por proximidade (geohash LIKE 'prefixo%'); no Postgres o
+            # operador de padrão é necessário para o LIKE usar o índice
+            models.Index(
+                fields=["geohash"],
+                name="report_geohash",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.city_key = normalize_city(self.city)
+        self.geohash = geohash.encode(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
+    @property
+    def absolute_path(self):
+        """Caminho do PDF no disco; ``file_path`` é relativo a DATA_DIR."""
+        return os.path.join(settings.DATA_DIR, self.file_path)
 
     def __str__(self):
         return f"{self.city} - {self.generated_at.strftime('%d/%m/%Y %H:%M')}"
+
+
+class PollutionObservation(models.Model):
+    """Ponto horário do histórico de poluição de uma célula da grade."""
+
+    cell = models.CharField(max_length=40)
+    dt = models.BigIntegerField()
+    aqi = models.PositiveSmallIntegerField(default=0)
+    pm2_5 = models.FloatField(default=0.0)
+    pm10 = models.FloatField(default=0.0)
+    o3 = models.FloatField(default=0.0)
+    no2 = models.FloatField(default=0.0)
+    so2 = models.FloatField(default=0.0)
+    co = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            # Também serve as consultas por intervalo (cell = ? AND dt BETWEEN ...)
+            models.UniqueConstraint(fields=["cell", "dt"], name="unique_pollution_cell_dt"),
+        ]
+
+    def __str__(self):
+        return f"{self.cell} @ {self.dt}"
+
+
+class HistoryCoverage(models.Model):
+    """
+    Intervalo do histórico de poluição de uma célula já consultado no
+    OpenWeather. Horas sem ponto dentro dele não são lacunas até a
+    cobertura vencer (HISTORY_COVERAGE_TTL).
+    """
+
+    cell = models.CharField(max_length=40)
+    start = models.BigIntegerField()
+    end = models.BigIntegerField()
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cell", "start"], name="coverage_cell_start"),
+        ]
+
+    def __str__(self):
+        return f"{self.cell} [{self.start}, {self.end}]"
+
+
+class ReportJob(models.Model):
+    """Pedido de relatório PDF aguardando o worker (`manage.py run_report_worker`)."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pendente"),
+        (RUNNING, "Em execução"),
+        (DONE, "Concluído"),
+        (FAILED, "Falhou"),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    payload = models.JSONField()
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    report = models.ForeignKey(
+        WeatherReport, null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs"
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="reportjob_status_created"),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status})"
+
+
+class WeatherObservation(models.Model):
+    """Leitura de clima gravada a cada consulta ao OpenWeather, por célula."""
+
+    cell = models.CharField(max_length=40)
+    dt = models.BigIntegerField()
+    temperature = models.FloatField(null=True)
+    feels_like = models.FloatField(null=True)
+    humidity = models.FloatField(null=True)
+    pressure = models.FloatField(null=True)
+    wind_speed = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cell", "dt"], name="unique_weather_cell_dt"),
+        ]
+
+    def __str__(self):
+        return f"{self.cell} @ {self.dt}"
+
+
+class CellActivity(models.Model):
+    """Popularidade de uma célula da grade, usada pelo refresh antecipado."""
+
+    cell = models.CharField(max_length=40, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    score = models.FloatField(default=0.0)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score"], name="cellactivity_score"),
+        ]
+
+    def __str__(self):
+        return f"{self.cell} ({self.score:.1f})"
+
+
+class UpstreamQuota(models.Model):
+    """Balde de tokens compartilhado pelos workers para a cota do OpenWeather."""
+
+    name = models.CharField(max_length=40, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.1f}"
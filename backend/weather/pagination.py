@@ -0,0 +1,19 @@
+import base64
+from datetime import datetime
+
+
+def encode_cursor(generated_at: datetime, report_id: int):
+    """Cursor opaco com a chave (generated_at, id) do último item da página."""
+    raw = f"{generated_at.isoformat()}|{report_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Inverso de ``encode_cursor``; levanta ValueError se o cursor for inválido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        generated_at, report_id = raw.split("|")
+        return datetime.fromisoformat(generated_at), int(report_id)
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError("cursor inválido") from e
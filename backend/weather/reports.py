@@ -1,15 +1,22 @@
 import io
+import logging
 import os
-import random
-from datetime import datetime, timedelta
+import secrets
+import threading
+import time
+from datetime import datetime
 
-import matplotlib.pyplot as plt
 import pytz
 from django.conf import settings
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image as PILImage
+from reportlab import rl_config
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
 from reportlab.platypus import (
     Image,
     Paragraph,
@@ -19,78 +26,75 @@ from reportlab.platypus import (
     TableStyle,
 )
 
+from . import metrics, storage
+from .charts import chart_cache, chart_key
 
-def generate_weather_report(data: dict):
-    """Gera um PDF estilizado de relatório meteorológico."""
+logger = logging.getLogger(__name__)
+
+LOGO_SIZE = 8 * cm
+LOGO_DPI = 150
+CHART_DPI = 150
+
+# Poluentes do gráfico de histórico: todos em µg/m³, no mesmo eixo
+POLLUTION_CHART_FIELDS = {
+    "pm2_5": ("PM2.5", "#D1495B"),
+    "pm10": ("PM10", "#EDAE49"),
+    "o3": ("O3", "#00798C"),
+    "no2": ("NO2", "#30638E"),
+}
+
+
+class _PreloadedImage(Image):
+    """Flowable de imagem que reaproveita um ImageReader já decodificado."""
+
+    def __init__(self, reader: ImageReader, width, height):
+        self._img = reader
+        super().__init__(io.BytesIO(), width=width, height=height)
 
-    city = data.get("city", "Desconhecida")
-
-    tz = pytz.timezone("America/Sao_Paulo")
-    now_utc = datetime.utcnow()
-    now_local = now_utc.astimezone(tz)
-
-    timestamp_display = now_local.strftime("%d/%m/%Y %H:%M")
-    timestamp_filename = now_local.strftime("%Y%m%d_%H%M%S")
-
-    safe_city = data["city"].replace(" ", "_")
-    city_dir = os.path.join(settings.DATA_DIR, safe_city)
-    os.makedirs(city_dir, exist_ok=True)
-    filename = f"{safe_city}_{timestamp_filename}.pdf"
-    filepath = os.path.join(city_dir, filename)
-    os.makedirs(settings.DATA_DIR, exist_ok=True)
-
-    doc = SimpleDocTemplate(filepath, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    logo_path = os.path.join(settings.BASE_DIR, "data/assets/logo.png")
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=8 * cm, height=8 * cm)
-        logo.hAlign = "CENTER"
-        elements.append(logo)
-    elements.append(Spacer(1, 8))
-
-    title_style = ParagraphStyle(
-        "Title",
-        fontSize=20,
-        alignment=1,
-        textColor=colors.HexColor("#004E98"),
-        spaceAfter=10,
-    )
-    subtitle_style = ParagraphStyle(
-        "Subtitle",
-        fontSize=12,
-        alignment=1,
-        textColor=colors.grey,
-        spaceAfter=15,
-    )
 
-    elements.append(Paragraph("Relatório Ambiental Urbano", title_style))
-    elements.append(Paragraph(f"Bairro: {city}", subtitle_style))
-
-    temp_data = simulate_temperature_data(data["temperatura"], tz)
-    chart_img = generate_temperature_chart(temp_data)
-    chart_image = Image(chart_img, width=15 * cm, height=6 * cm)
-    chart_image.hAlign = "CENTER"
-    elements.append(chart_image)
-    elements.append(Spacer(1, 20))
-
-    table_data = [
-        ["Temperatura (°C)", f"{data['temperatura']:.1f}"],
-        ["Umidade (%)", f"{data['umidade']}"],
-        ["Sensação (°C)", f"{data['sensacao']}"],
-        ["Pressão (hPa)", f"{data['pressao']}"],
-        ["Velocidade do Vento (m/s)", f"{data['vento']}"],
-        ["Descrição", f"{data['descricao']}"],
-        ["Nascer do Sol", f"{data['nascer_sol']}"],
-        ["Por do Sol", f"{data['por_sol']}"],
-        ["Latitude", f"{data['latitude']:.3f}"],
-        ["Longitude", f"{data['longitude']:.3f}"],
-    ]
-
-    table = Table(table_data, colWidths=[8 * cm, 8 * cm])
-    table.setStyle(
-        TableStyle(
+class ReportRenderer:
+    """
+    Motor de renderização dos relatórios, criado uma vez por processo.
+
+    Guarda os estilos do ReportLab, o logo já decodificado e uma figura Agg
+    por thread, sem tocar no estado global do ``matplotlib.pyplot``; várias
+    threads podem gerar relatórios ao mesmo tempo.
+    """
+
+    def __init__(self):
+        self.tz = pytz.timezone("America/Sao_Paulo")
+
+        # Imagens gravadas em binário: sem o custo (e os +25%) do ASCII85
+        rl_config.useA85 = 0
+
+        self.title_style = ParagraphStyle(
+            "Title",
+            fontSize=20,
+            alignment=1,
+            textColor=colors.HexColor("#004E98"),
+            spaceAfter=10,
+        )
+        self.subtitle_style = ParagraphStyle(
+            "Subtitle",
+            fontSize=12,
+            alignment=1,
+            textColor=colors.grey,
+            spaceAfter=15,
+        )
+        self.header_style = ParagraphStyle(
+            "Header",
+            fontSize=14,
+            alignment=1,
+            textColor=colors.HexColor("#004E98"),
+            spaceAfter=8,
+        )
+        self.footer_style = ParagraphStyle(
+            "Footer",
+            fontSize=10,
+            alignment=1,
+            textColor=colors.grey,
+        )
+        self.table_style = TableStyle(
             [
                 ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#004E98")),
                 ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
@@ -100,94 +104,260 @@ def generate_weather_report(data: dict):
                 ("BACKGROUND", (0, 1), (-1, -1), colors.whitesmoke),
             ]
         )
-    )
-    elements.append(table)
-    elements.append(Spacer(1, 20))
 
-    pollution = data.get("pollution")
-    if pollution:
-        elements.append(Spacer(1, 10))
+        self.logo = self._load_logo()
+        self._local = threading.local()
+
+    def _load_logo(self):
+        """Decodifica o logo uma única vez, já no tamanho em que é desenhado."""
+        logo_path = os.path.join(settings.BASE_DIR, "data/assets/logo.png")
+        if not os.path.exists(logo_path):
+            return None
+
+        pixels = round(LOGO_SIZE / 72 * LOGO_DPI)
+        with PILImage.open(logo_path) as img:
+            img = img.convert("RGB")
+            img.thumbnail((pixels, pixels), PILImage.LANCZOS)
+
+        reader = ImageReader(img)
+        # Deixa os bytes prontos para que as threads só façam leituras
+        reader.getRGBData()
+        return reader
+
+    def _figure(self):
+        """Figura e eixos reaproveitáveis, um par por thread."""
+        local = self._local
+        if not hasattr(local, "figure"):
+            local.figure = Figure(figsize=(6, 2.5))
+            FigureCanvasAgg(local.figure)
+            local.axes = local.figure.add_subplot()
+        return local.figure, local.axes
+
+    def temperature_chart(self, data_points):
+        """
+        Gráfico de temperatura em PNG (buffer para inserir no PDF). Séries
+        já desenhadas vêm do cache de gráficos, sem passar pelo matplotlib.
+        """
+        times = [t.strftime("%Hh") for t, _ in data_points]
+        temps = [v for _, v in data_points]
+
+        key = chart_key("temperature", times, temps, dpi=CHART_DPI)
+        return io.BytesIO(chart_cache.get_or_render(key, lambda: self._draw_temperature(times, temps)))
+
+    def _draw_temperature(self, times, temps):
+        fig, ax = self._figure()
+        ax.clear()
+        ax.plot(times, temps, marker="o", linewidth=2, color="#004E98")
+        ax.set_title("Variação de Temperatura (últimas 24h)", fontsize=10)
+        ax.set_xlabel("Hora")
+        ax.set_ylabel("°C")
+        ax.grid(True, linestyle="--", alpha=0.5)
+        ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+        return self._png(fig)
+
+    def pollution_chart(self, series: dict):
+        """
+        Histórico dos poluentes numa única figura, uma linha por campo de
+        POLLUTION_CHART_FIELDS presente em ``series`` ({"dt": [...], campo:
+        [...]}). Retorna None se não houver pontos.
+        """
+        if not series or not series.get("dt"):
+            return None
+
+        times = [datetime.fromtimestamp(ts, self.tz).strftime("%Hh") for ts in series["dt"]]
+        lines = {field: series[field] for field in POLLUTION_CHART_FIELDS if field in series}
+
+        key = chart_key("pollution", times, lines, dpi=CHART_DPI)
+        return io.BytesIO(chart_cache.get_or_render(key, lambda: self._draw_pollution(times, lines)))
+
+    def _draw_pollution(self, times, lines):
+        fig, ax = self._figure()
+        ax.clear()
+        for field, values in lines.items():
+            label, color = POLLUTION_CHART_FIELDS[field]
+            ax.plot(times, values, linewidth=1.5, color=color, label=label)
+        ax.set_title("Poluentes (últimas 24h)", fontsize=10)
+        ax.set_xlabel("Hora")
+        ax.set_ylabel("µg/m³")
+        ax.grid(True, linestyle="--", alpha=0.5)
+        ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+        ax.legend(fontsize=7, ncol=len(lines), loc="upper left")
+        return self._png(fig)
+
+    def _png(self, fig):
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=CHART_DPI)
+        return buf.getvalue()
+
+    def render(self, data: dict):
+        """Gera o PDF e retorna o caminho relativo a DATA_DIR em que foi gravado."""
+
+        started = time.perf_counter()
+        city = data.get("city", "Desconhecida")
+
+        now_utc = datetime.utcnow()
+        now_local = now_utc.astimezone(self.tz)
+
+        timestamp_display = now_local.strftime("%d/%m/%Y %H:%M")
+        timestamp_filename = now_local.strftime("%Y%m%d_%H%M%S")
+
+        safe_city = data["city"].replace(" ", "_").replace("/", "_")
+        # Sufixo aleatório: dois relatórios da mesma cidade no mesmo segundo
+        filename = f"{safe_city}_{timestamp_filename}_{secrets.token_hex(4)}.pdf"
+        relative_path = storage.report_path(safe_city, now_local, filename)
+        filepath = storage.absolute(relative_path)
+
+        # Monta o PDF em memória para medir a montagem e a gravação separadamente
+        output = io.BytesIO()
+        doc = SimpleDocTemplate(output, pagesize=A4)
+        elements = []
+
+        if self.logo is not None:
+            logo = _PreloadedImage(self.logo, width=LOGO_SIZE, height=LOGO_SIZE)
+            logo.hAlign = "CENTER"
+            elements.append(logo)
+        elements.append(Spacer(1, 8))
+
+        elements.append(Paragraph("Relatório Ambiental Urbano", self.title_style))
+        elements.append(Paragraph(f"Bairro: {city}", self.subtitle_style))
+
+        temp_data = temperature_points(data, self.tz)
+        chart_img = self.temperature_chart(temp_data)
+        pollution_img = self.pollution_chart(data.get("pollution_series"))
+        chart_done = time.perf_counter()
+
+        chart_image = Image(chart_img, width=15 * cm, height=6 * cm)
+        chart_image.hAlign = "CENTER"
+        elements.append(chart_image)
+        elements.append(Spacer(1, 20))
+
+        table_data = [
+            ["Temperatura (°C)", f"{data['temperatura']:.1f}"],
+            ["Umidade (%)", f"{data['umidade']}"],
+            ["Sensação (°C)", f"{data['sensacao']}"],
+            ["Pressão (hPa)", f"{data['pressao']}"],
+            ["Velocidade do Vento (m/s)", f"{data['vento']}"],
+            ["Descrição", f"{data['descricao']}"],
+            ["Nascer do Sol", f"{data['nascer_sol']}"],
+            ["Por do Sol", f"{data['por_sol']}"],
+            ["Latitude", f"{data['latitude']:.3f}"],
+            ["Longitude", f"{data['longitude']:.3f}"],
+        ]
+
+        table = Table(table_data, colWidths=[8 * cm, 8 * cm])
+        table.setStyle(self.table_style)
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+
+        pollution = data.get("pollution")
+        if pollution:
+            elements.append(Spacer(1, 10))
+            elements.append(Paragraph("Qualidade do Ar", self.header_style))
+
+            air_table_data = [
+                ["AQI (Índice de Qualidade do Ar)", pollution["aqi"]],
+                ["PM2.5 (µg/m³)", pollution["pm2_5"]],
+                ["PM10 (µg/m³)", pollution["pm10"]],
+                ["Ozônio (O3)", pollution["o3"]],
+                ["Dióxido de Nitrogênio (NO2)", pollution["no2"]],
+                ["Dióxido de Enxofre (SO2)", pollution["so2"]],
+                ["Monóxido de Carbono (CO)", pollution["co"]],
+            ]
+
+            air_table = Table(air_table_data, colWidths=[10 * cm, 6 * cm])
+            air_table.setStyle(self.table_style)
+
+            elements.append(air_table)
+            elements.append(Spacer(1, 20))
+
+        if pollution_img is not None:
+            pollution_image = Image(pollution_img, width=15 * cm, height=6 * cm)
+            pollution_image.hAlign = "CENTER"
+            elements.append(pollution_image)
+            elements.append(Spacer(1, 20))
 
         elements.append(
-            Paragraph(
-                "Qualidade do Ar",
-                ParagraphStyle(
-                    "Header",
-                    fontSize=14,
-                    alignment=1,
-                    textColor=colors.HexColor("#004E98"),
-                    spaceAfter=8,
-                ),
-            )
+            Paragraph(f"Gerado em: {timestamp_display} (horário de Brasília)", self.footer_style)
         )
 
-        air_table_data = [
-            ["AQI (Índice de Qualidade do Ar)", pollution["aqi"]],
-            ["PM2.5 (µg/m³)", pollution["pm2_5"]],
-            ["PM10 (µg/m³)", pollution["pm10"]],
-            ["Ozônio (O3)", pollution["o3"]],
-            ["Dióxido de Nitrogênio (NO2)", pollution["no2"]],
-            ["Dióxido de Enxofre (SO2)", pollution["so2"]],
-            ["Monóxido de Carbono (CO)", pollution["co"]],
-        ]
+        doc.build(elements)
+        built = time.perf_counter()
+
+        with open(filepath, "wb") as f:
+            f.write(output.getbuffer())
+        finished = time.perf_counter()
 
-        air_table = Table(air_table_data, colWidths=[10 * cm, 6 * cm])
-        air_table.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#004E98")),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                    ("BACKGROUND", (0, 1), (-1, -1), colors.whitesmoke),
-                ]
-            )
+        metrics.observe("report_render_seconds", chart_done - started, {"phase": "chart"})
+        metrics.observe("report_render_seconds", built - chart_done, {"phase": "build"})
+        metrics.observe("report_render_seconds", finished - built, {"phase": "write"})
+        logger.info(
+            "Relatório %s gerado em %.0f ms (gráfico %.0f ms, PDF %.0f ms, gravação %.0f ms)",
+            filename,
+            (finished - started) * 1000,
+            (chart_done - started) * 1000,
+            (built - chart_done) * 1000,
+            (finished - built) * 1000,
         )
+        return relative_path
 
-        elements.append(air_table)
-        elements.append(Spacer(1, 20))
 
-    footer_style = ParagraphStyle(
-        "Footer",
-        fontSize=10,
-        alignment=1,
-        textColor=colors.grey,
-    )
-    elements.append(
-        Paragraph(f"Gerado em: {timestamp_display} (horário de Brasília)", footer_style)
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    """Motor de renderização do processo, criado no primeiro uso."""
+    global _renderer
+
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = ReportRenderer()
+    return _renderer
+
+
+_warm = False
+
+
+def warm_up():
+    """
+    Prepara o processo para renderizar: cria o motor, desenha um gráfico
+    descartável (carrega fontes e caches de glifos do matplotlib) e monta um
+    PDF mínimo. Chamado na partida dos workers, fora do caminho do primeiro
+    relatório; não passa pelo cache de gráficos.
+    """
+    global _warm
+
+    if _warm:
+        return
+    started = time.perf_counter()
+    renderer = get_renderer()
+    renderer._draw_temperature(["00h", "01h"], [20.0, 21.0])
+    SimpleDocTemplate(io.BytesIO(), pagesize=A4).build(
+        [Paragraph("Relatório Ambiental Urbano", renderer.title_style)]
     )
+    _warm = True
+    logger.info("Motor de relatórios pronto em %.0f ms", (time.perf_counter() - started) * 1000)
 
-    doc.build(elements)
-    return filepath
 
+def generate_weather_report(data: dict):
+    """Gera um PDF estilizado de relatório meteorológico."""
+    path = get_renderer().render(data)
+    # Processos do pool não passam por atexit: grava as métricas a cada relatório
+    metrics.registry.flush()
+    return path
 
-def simulate_temperature_data(current_temp: float, tz):
-    """Gera dados simulados de temperatura nas últimas 24h com horário local."""
 
-    base_time = datetime.utcnow().astimezone(tz)
-    return [
-        (base_time - timedelta(hours=i), current_temp + random.uniform(-3, 3))
-        for i in reversed(range(24))
-    ]
+def temperature_points(data: dict, tz):
+    """
+    Pontos (horário local, °C) do gráfico de 24h, a partir da série gravada
+    em ``data["temperature_series"]``; sem série, usa só a leitura atual.
+    """
+    series = data.get("temperature_series") or [[time.time(), data["temperatura"]]]
+    return [(datetime.fromtimestamp(ts, tz), temp) for ts, temp in series]
 
 
 def generate_temperature_chart(data_points):
     """Gera gráfico em memória e retorna o buffer para inserir no PDF."""
-    times = [t.strftime("%Hh") for t, _ in data_points]
-    temps = [v for _, v in data_points]
-
-    plt.figure(figsize=(6, 2.5))
-    plt.plot(times, temps, marker="o", linewidth=2, color="#004E98")
-    plt.title("Variação de Temperatura (últimas 24h)", fontsize=10)
-    plt.xlabel("Hora")
-    plt.ylabel("°C")
-    plt.grid(True, linestyle="--", alpha=0.5)
-    plt.xticks(rotation=45, fontsize=8)
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", dpi=150)
-    plt.close()
-    buf.seek(0)
-    return buf
+    return get_renderer().temperature_chart(data_points)
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UpstreamQuota
+
+
+class UpstreamError(Exception):
+    """Falha ao consultar o OpenWeather (timeout, conexão, 429 ou 5xx)."""
+
+
+class UpstreamUnavailable(UpstreamError):
+    """Chamada nem foi feita: circuito aberto ou cota esgotada."""
+
+
+def acquire_token(name: str = "openweather"):
+    """
+    Consome um token do balde compartilhado (UPSTREAM_RATE_PER_MINUTE, com
+    rajadas de até UPSTREAM_BURST). A linha fica travada só durante o cálculo,
+    o que serializa os workers sem precisar de outro serviço além do banco.
+    """
+    rate = settings.UPSTREAM_RATE_PER_MINUTE / 60
+    capacity = settings.UPSTREAM_BURST
+
+    with transaction.atomic():
+        now = timezone.now()
+        bucket, _ = UpstreamQuota.objects.select_for_update().get_or_create(
+            name=name, defaults={"tokens": capacity, "updated_at": now}
+        )
+        elapsed = max((now - bucket.updated_at).total_seconds(), 0)
+        tokens = min(capacity, bucket.tokens + elapsed * rate)
+
+        allowed = tokens >= 1
+        bucket.tokens = tokens - 1 if allowed else tokens
+        bucket.updated_at = now
+        bucket.save(update_fields=["tokens", "updated_at"])
+    return allowed
+
+
+class CircuitBreaker:
+    """
+    Disjuntor por endpoint, local ao worker. Abre após
+    BREAKER_FAILURE_THRESHOLD falhas seguidas (chamadas acima do orçamento de
+    latência contam como falha) e, depois de BREAKER_RESET_TIMEOUT segundos,
+    deixa passar uma chamada de teste.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.opened_until > now:
+                return False
+            if self.opened_until and not self._probing:
+                # Meio aberto: só uma chamada de teste por vez
+                self._probing = True
+                return True
+            return not self._probing
+
+    def release(self):
+        """
+        Devolve a chamada de teste que não chegou ao OpenWeather (cota
+        esgotada, cancelamento, erro local): sem isso o circuito ficaria
+        meio aberto esperando um resultado que nunca vem.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self, elapsed: float):
+        if elapsed > settings.UPSTREAM_LATENCY_BUDGET:
+            self.record_failure()
+            return
+        with self._lock:
+            self.failures = 0
+            self.opened_until = 0.0
+            self._probing = False
+
+    def record_failure(self, retry_after: float = None):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            # Falha da chamada de teste (meio aberto) reabre o circuito na hora
+            half_open = bool(self.opened_until)
+            tripped = self.failures >= settings.BREAKER_FAILURE_THRESHOLD
+            if retry_after is not None or half_open or tripped:
+                cooldown = retry_after if retry_after is not None else settings.BREAKER_RESET_TIMEOUT
+                self.opened_until = time.monotonic() + cooldown
+
+    @property
+    def is_open(self):
+        return self.opened_until > time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str):
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
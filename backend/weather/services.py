@@ -1,24 +1,98 @@
-import requests
+import asyncio
+import logging
 import pytz
 import time
 
+from collections import deque
 from datetime import datetime
+from itertools import islice
 
 from django.conf import settings
 
+from . import clients, history, hotcells
+from .cache import grid_cache
+from .grid import cell_center, cell_key
+from .resilience import UpstreamError
+
+logger = logging.getLogger(__name__)
+
+
+def _url(path: str):
+    # Lido a cada chamada para que OPENWEATHER_BASE_URL possa ser trocado em
+    # benchmarks (servidor falso local) sem reimportar o módulo
+    return f"{settings.OPENWEATHER_BASE_URL}/{path}"
+
+
 def get_weather_data(lat: float, lon: float):
+    """Clima atual da célula da grade que contém (lat, lon), com cache."""
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    hotcells.record_hit(lat, lon)
+    data = grid_cache.get_or_fetch(
+        "weather", lat, lon, _fetch_weather_data, settings.WEATHER_CACHE_TTL
+    )
+    data["latitude"] = lat
+    data["longitude"] = lon
+    return data
+
+async def aget_weather_data(lat: float, lon: float, count_hit: bool = True):
+    """
+    Versão assíncrona de ``get_weather_data``. Com ``count_hit=False`` a
+    leitura não conta para a popularidade da célula (leituras internas).
+    """
 
     if not settings.OPENWEATHER_API_KEY:
         raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
 
-    url = (
-        f"https://api.openweathermap.org/data/2.5/weather?"
-        f"lat={lat}&lon={lon}&appid={settings.OPENWEATHER_API_KEY}&units=metric&lang=pt_br"
+    if count_hit:
+        await hotcells.arecord_hit(lat, lon)
+    data = await grid_cache.aget_or_fetch(
+        "weather", lat, lon, _afetch_weather_data, settings.WEATHER_CACHE_TTL
     )
+    data["latitude"] = lat
+    data["longitude"] = lon
+    return data
+
+def refresh_cell(endpoint: str, lat: float, lon: float):
+    """
+    Atualiza no cache a leitura ``endpoint`` ("weather" ou "air") da célula,
+    indo sempre ao OpenWeather. Usado pelo refresh antecipado.
+    """
+    fetchers = {
+        "weather": (_fetch_weather_data, settings.WEATHER_CACHE_TTL),
+        "air": (_fetch_air_pollution_data, settings.AIR_CACHE_TTL),
+    }
+    fetch, ttl = fetchers[endpoint]
+    return grid_cache.refresh(endpoint, lat, lon, fetch, ttl)
+
+def _weather_params(lat: float, lon: float):
+    return {
+        "lat": lat,
+        "lon": lon,
+        "appid": settings.OPENWEATHER_API_KEY,
+        "units": "metric",
+        "lang": "pt_br",
+    }
+
+def _fetch_weather_data(lat: float, lon: float):
+
+    res = clients.get("weather", _url("weather"), _weather_params(lat, lon))
+    res.raise_for_status()
+    raw = res.json()
+    history.record_weather(cell_key(lat, lon), raw)
+    return _parse_weather(raw, lat, lon)
+
+async def _afetch_weather_data(lat: float, lon: float):
 
-    res = requests.get(url, timeout=10)
+    res = await clients.aget("weather", _url("weather"), _weather_params(lat, lon))
     res.raise_for_status()
-    data = res.json()
+    raw = res.json()
+    await history.arecord_weather(cell_key(lat, lon), raw)
+    return _parse_weather(raw, lat, lon)
+
+def _parse_weather(data: dict, lat: float, lon: float):
 
     weather = data.get("weather", [{}])[0]
     tz = pytz.timezone("America/Sao_Paulo")
@@ -41,23 +115,124 @@ def get_weather_data(lat: float, lon: float):
         "por_sol": sunset.strftime("%H:%M:%S"),
     }
 
-def get_air_pollution_data(lat: float, lon: float):
+def get_forecast_data(lat: float, lon: float):
+    """
+    Resumo da previsão das próximas 24h da célula (chuva acumulada e médias
+    de umidade, pressão e nuvens), que alimenta o cálculo de risco de
+    alagamento no app. Com cache por célula.
+    """
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    hotcells.record_hit(lat, lon)
+    data = grid_cache.get_or_fetch(
+        "forecast", lat, lon, _fetch_forecast_data, settings.FORECAST_CACHE_TTL
+    )
+    data["latitude"] = lat
+    data["longitude"] = lon
+    return data
+
+async def aget_forecast_data(lat: float, lon: float):
+    """Versão assíncrona de ``get_forecast_data``."""
 
     if not settings.OPENWEATHER_API_KEY:
         raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
 
-    url = (
-        f"https://api.openweathermap.org/data/2.5/air_pollution"
-        f"?lat={lat}&lon={lon}&appid={settings.OPENWEATHER_API_KEY}"
+    await hotcells.arecord_hit(lat, lon)
+    data = await grid_cache.aget_or_fetch(
+        "forecast", lat, lon, _afetch_forecast_data, settings.FORECAST_CACHE_TTL
     )
+    data["latitude"] = lat
+    data["longitude"] = lon
+    return data
+
+def _fetch_forecast_data(lat: float, lon: float):
+
+    res = clients.get("forecast", _url("forecast"), _weather_params(lat, lon))
+    res.raise_for_status()
+    return _parse_forecast(res.json(), lat, lon)
+
+async def _afetch_forecast_data(lat: float, lon: float):
+
+    res = await clients.aget("forecast", _url("forecast"), _weather_params(lat, lon))
+    res.raise_for_status()
+    return _parse_forecast(res.json(), lat, lon)
+
+def _parse_forecast(raw: dict, lat: float, lon: float):
+
+    # A previsão vem em passos de 3h: os 8 primeiros cobrem as próximas 24h
+    steps = raw.get("list", [])[:8]
+    rain = [e.get("rain", {}).get("3h", 0) for e in steps]
+    count = len(steps) or 1
+
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "inicio": steps[0]["dt"] if steps else None,
+        "fim": steps[-1]["dt"] if steps else None,
+        "chuva": round(sum(rain), 2),
+        "chuva_max_3h": max(rain, default=0),
+        "umid": round(sum(e.get("main", {}).get("humidity", 0) for e in steps) / count, 1),
+        "press": round(sum(e.get("main", {}).get("pressure", 0) for e in steps) / count, 1),
+        "nuvem": round(sum(e.get("clouds", {}).get("all", 0) for e in steps) / count, 1),
+    }
+
+def get_air_pollution_data(lat: float, lon: float):
+    """Qualidade do ar atual da célula da grade, com cache."""
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    hotcells.record_hit(lat, lon)
+    try:
+        return grid_cache.get_or_fetch(
+            "air", lat, lon, _fetch_air_pollution_data, settings.AIR_CACHE_TTL
+        )
+    except UpstreamError:
+        return None
+
+async def aget_air_pollution_data(lat: float, lon: float, count_hit: bool = True):
+    """Versão assíncrona de ``get_air_pollution_data`` (``count_hit`` como em ``aget_weather_data``)."""
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    if count_hit:
+        await hotcells.arecord_hit(lat, lon)
+    try:
+        return await grid_cache.aget_or_fetch(
+            "air", lat, lon, _afetch_air_pollution_data, settings.AIR_CACHE_TTL
+        )
+    except UpstreamError:
+        return None
+
+def _air_params(lat: float, lon: float):
+    return {"lat": lat, "lon": lon, "appid": settings.OPENWEATHER_API_KEY}
 
-    res = requests.get(url, timeout=10)
+def _fetch_air_pollution_data(lat: float, lon: float):
+
+    res = clients.get("air_pollution", _url("air_pollution"), _air_params(lat, lon))
 
     if res.status_code != 200:
         return None
 
-    res.raise_for_status()
-    data = res.json()["list"][0]
+    return _parse_air_pollution(res.json())
+
+async def _afetch_air_pollution_data(lat: float, lon: float):
+
+    res = await clients.aget(
+        "air_pollution", _url("air_pollution"), _air_params(lat, lon)
+    )
+
+    if res.status_code != 200:
+        return None
+
+    return _parse_air_pollution(res.json())
+
+def _parse_air_pollution(raw: dict):
+
+    data = raw["list"][0]
     comp = data["components"]
     return {
         "aqi": data["main"]["aqi"],
@@ -69,19 +244,201 @@ def get_air_pollution_data(lat: float, lon: float):
         "co": comp.get("co", 0),
     }
 
+async def aget_batch_data(points, concurrency: int = None):
+    """
+    Clima e qualidade do ar de vários pontos (lat, lon) de uma vez.
+
+    Os pontos são agrupados por célula da grade: cada célula é consultada
+    uma única vez, as que já estão no cache compartilhado vêm em uma só
+    leitura e as demais vão ao OpenWeather com no máximo ``concurrency``
+    (padrão BATCH_CONCURRENCY) células em paralelo.
+
+    Retorna (células, chaves): ``células`` mapeia a chave de cada célula
+    para {"weather", "air", "errors"} e ``chaves`` traz a célula de cada
+    ponto, na ordem recebida.
+    """
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    keys = [cell_key(lat, lon) for lat, lon in points]
+    centers = {}
+    for key, (lat, lon) in zip(keys, points):
+        centers.setdefault(key, cell_center(lat, lon))
+
+    await asyncio.gather(
+        grid_cache.aprefetch("weather", centers.values()),
+        grid_cache.aprefetch("air", centers.values()),
+    )
+
+    semaphore = asyncio.Semaphore(concurrency or settings.BATCH_CONCURRENCY)
+
+    async def load(lat: float, lon: float):
+        async with semaphore:
+            weather, air = await asyncio.gather(
+                aget_weather_data(lat, lon),
+                aget_air_pollution_data(lat, lon),
+                return_exceptions=True,
+            )
+
+        errors = {}
+        if isinstance(weather, Exception):
+            errors["weather"], weather = str(weather), None
+        if air is None:
+            errors["air"] = "Não foi possível obter dados atuais."
+        elif isinstance(air, Exception):
+            errors["air"], air = str(air), None
+        return {"weather": weather, "air": air, "errors": errors}
+
+    results = await asyncio.gather(*(load(*center) for center in centers.values()))
+    return dict(zip(centers, results)), keys
+
 def get_air_pollution_history_data(lat: float, lon: float, start: int, end: int):
     """
     Busca histórico de poluição para intervalo de tempo (timestamps UNIX).
+    Serve o que já está armazenado e consulta o OpenWeather só nas lacunas;
+    se essa consulta falhar, serve só o que está armazenado.
+    """
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    try:
+        cell = cell_key(lat, lon)
+        stored = history.load(cell, start, end)
+        gaps = history.missing_ranges(stored, start, end, history.coverage(cell, start, end))
+
+        fetched = []
+        try:
+            for gap_start, gap_end in gaps:
+                fetched += _fetch_air_pollution_history(*cell_center(lat, lon), gap_start, gap_end)
+        except Exception as e:
+            logger.warning("Lacunas do histórico de %s indisponíveis: %s", cell, e)
+            return stored if stored else None
+        if fetched:
+            history.save(cell, fetched)
+        if gaps:
+            history.record_coverage(cell, gaps)
+
+        points = history.merge(stored, fetched, start, end)
+        return points if points else None
+
+    except Exception as e:
+        logger.exception("Falha ao obter histórico de poluição: %s", e)
+        return None
+
+async def aget_air_pollution_history_data(lat: float, lon: float, start: int, end: int):
+    """Versão assíncrona de ``get_air_pollution_history_data``."""
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    try:
+        points, _ = await aload_air_pollution_history(lat, lon, start, end)
+        return points if points else None
+
+    except Exception as e:
+        logger.exception("Falha ao obter histórico de poluição: %s", e)
+        return None
+
+async def aload_air_pollution_history(lat: float, lon: float, start: int, end: int):
+    """
+    Histórico de [start, end] como (pontos, stale). Se a busca das lacunas
+    no OpenWeather falhar (cota, disjuntor, erro HTTP), retorna os pontos já
+    armazenados com ``stale=True`` em vez de descartá-los.
+    """
+
+    if not settings.OPENWEATHER_API_KEY:
+        raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
+
+    cell = cell_key(lat, lon)
+    try:
+        return await _aload_history(cell, cell_center(lat, lon), start, end), False
+    except Exception as e:
+        logger.warning("Lacunas do histórico de %s indisponíveis: %s", cell, e)
+        return await history.aload(cell, start, end), True
+
+async def astream_air_pollution_history(lat: float, lon: float, start: int, end: int,
+                                        resolution: str = "raw"):
+    """
+    Histórico de [start, end] em janelas de HISTORY_WINDOW segundos (ver
+    ``history.windows``), entregue janela a janela e em ordem como
+    (pontos, stale). Até HISTORY_WINDOW_CONCURRENCY janelas são buscadas ao
+    mesmo tempo, então a memória e o tempo até a primeira janela não
+    dependem do tamanho do intervalo. Janela cujas lacunas não puderam ser
+    buscadas traz só os pontos armazenados, com ``stale=True``.
     """
 
     if not settings.OPENWEATHER_API_KEY:
         raise ValueError("OPENWEATHER_API_KEY não configurada no .env")
 
-    start_ts = datetime.fromtimestamp(start)
-    end_ts = datetime.fromtimestamp(end)
+    cell, center = cell_key(lat, lon), cell_center(lat, lon)
+    windows = iter(history.windows(start, end, settings.HISTORY_WINDOW, resolution))
+    pending = deque()
+
+    async def load(window_start, window_end):
+        try:
+            return await _aload_history(cell, center, window_start, window_end), False
+        except Exception as e:
+            logger.warning("Lacunas do histórico de %s indisponíveis: %s", cell, e)
+            return await history.aload(cell, window_start, window_end), True
+
+    def schedule():
+        free = settings.HISTORY_WINDOW_CONCURRENCY - len(pending)
+        for window_start, window_end in islice(windows, max(free, 0)):
+            pending.append(asyncio.ensure_future(load(window_start, window_end)))
+
+    try:
+        schedule()
+        while pending:
+            result = await pending.popleft()
+            schedule()
+            yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _aload_history(cell: str, center, start: int, end: int):
+    """Pontos armazenados de [start, end] completados com as lacunas buscadas."""
+
+    stored = await history.aload(cell, start, end)
+    covered = await history.acoverage(cell, start, end)
+    gaps = history.missing_ranges(stored, start, end, covered)
+
+    chunks = await asyncio.gather(*(
+        _afetch_air_pollution_history(*center, gap_start, gap_end)
+        for gap_start, gap_end in gaps
+    ))
+    fetched = [point for chunk in chunks for point in chunk]
+    if fetched:
+        await history.asave(cell, fetched)
+    if gaps:
+        await history.arecord_coverage(cell, gaps)
+
+    return history.merge(stored, fetched, start, end)
+
+def _fetch_air_pollution_history(lat: float, lon: float, start: int, end: int):
+
+    response = clients.get(
+        "air_pollution/history",
+        _url("air_pollution/history"),
+        _history_params(lat, lon, start, end),
+    )
+    response.raise_for_status()
+    return _parse_history(response.json())
+
+async def _afetch_air_pollution_history(lat: float, lon: float, start: int, end: int):
 
-    url = "https://api.openweathermap.org/data/2.5/air_pollution/history"
-    params = {
+    response = await clients.aget(
+        "air_pollution/history",
+        _url("air_pollution/history"),
+        _history_params(lat, lon, start, end),
+    )
+    response.raise_for_status()
+    return _parse_history(response.json())
+
+def _history_params(lat: float, lon: float, start: int, end: int):
+    return {
         "lat": lat,
         "lon": lon,
         "start": start,
@@ -89,34 +446,26 @@ def get_air_pollution_history_data(lat: float, lon: float, start: int, end: int)
         "appid": settings.OPENWEATHER_API_KEY,
     }
 
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        
-        response.raise_for_status()
-        raw = response.json()
-
-        history = []
-        for item in raw.get("list", []):
-            components = item.get("components", {})
-
-            history.append({
-                "dt": item.get("dt"),
-                "aqi": item.get("main", {}).get("aqi", 0),
-                "pm2_5": components.get("pm2_5", 0.0),
-                "pm10": components.get("pm10", 0.0),
-                "o3": components.get("o3", 0.0),
-                "no2": components.get("no2", 0.0),
-                "so2": components.get("so2", 0.0),
-                "co": components.get("co", 0.0),
-            })
-
-        return history if history else None
+def _parse_history(raw: dict):
+
+    points = []
+    for item in raw.get("list", []):
+        components = item.get("components", {})
+
+        points.append({
+            "dt": item.get("dt"),
+            "aqi": item.get("main", {}).get("aqi", 0),
+            "pm2_5": components.get("pm2_5", 0.0),
+            "pm10": components.get("pm10", 0.0),
+            "o3": components.get("o3", 0.0),
+            "no2": components.get("no2", 0.0),
+            "so2": components.get("so2", 0.0),
+            "co": components.get("co", 0.0),
+        })
+
+    return points
 
-    except Exception as e:
-        print(f"[ERRO] get_air_pollution_history_data: {e}")
-        return None
-    
 def date_to_timestamp(date_str):
 
     dt = datetime.strptime(date_str, "%Y-%m-%d")
-    return int(time.mktime(dt.timetuple()))
\ No newline at end of file
+    return int(time.mktime(dt.timetuple()))
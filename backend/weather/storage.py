@@ -0,0 +1,241 @@
+import hashlib
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import ReportJob, WeatherReport
+
+
+class StorageUnavailable(Exception):
+    """DATA_DIR ausente ou com arquivos demais faltando: nada é apagado."""
+
+
+def report_path(city: str, when, filename: str):
+    """
+    Caminho (relativo a DATA_DIR) de um novo relatório, já com o diretório
+    criado: ``AAAA/MM/DD/<shard>/<arquivo>``. O shard (2 dígitos hex do nome)
+    limita cada diretório a uma fração dos PDFs do dia, mesmo nos bairros
+    mais movimentados.
+    """
+    shard = hashlib.sha1(f"{city}/{filename}".encode()).hexdigest()[:2]
+    relative = os.path.join(when.strftime("%Y/%m/%d"), shard, filename)
+    os.makedirs(os.path.dirname(absolute(relative)), exist_ok=True)
+    return relative
+
+
+def absolute(path: str):
+    """Caminho absoluto; registros antigos já guardam o caminho absoluto."""
+    return os.path.join(settings.DATA_DIR, path)
+
+
+def relative(path: str):
+    """Forma relativa a DATA_DIR de um caminho absoluto dentro dele."""
+    return os.path.relpath(path, settings.DATA_DIR)
+
+
+def expired_reports(max_age_days: int, keep_per_city: int):
+    """
+    Relatórios fora da retenção: gerados há mais de ``max_age_days`` dias ou
+    além dos ``keep_per_city`` mais recentes da cidade (0 desliga o critério).
+    Retorna um queryset de (id, file_path).
+    """
+    condition = Q(pk__in=[])
+    if max_age_days:
+        condition |= Q(generated_at__lt=timezone.now() - timedelta(days=max_age_days))
+    if keep_per_city:
+        ranked = WeatherReport.objects.annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F("city_key")],
+                order_by=[F("generated_at").desc(), F("id").desc()],
+            )
+        ).filter(rank__gt=keep_per_city)
+        condition |= Q(pk__in=ranked.values("pk"))
+    return WeatherReport.objects.filter(condition).values_list("id", "file_path")
+
+
+def remove_file(path: str):
+    """Apaga o PDF; arquivo já ausente não é erro."""
+    try:
+        os.remove(absolute(path))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def delete_reports(rows, batch_size: int = 500, dry_run: bool = False):
+    """
+    Apaga arquivos e linhas de (id, file_path) em lotes, sem carregar tudo na
+    memória. Jobs que apontavam para eles ficam com ``report`` nulo.
+    Retorna (linhas, arquivos) apagados.
+    """
+    rows_deleted = files_deleted = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            r, f = _delete_batch(batch, dry_run)
+            rows_deleted, files_deleted = rows_deleted + r, files_deleted + f
+            batch = []
+    if batch:
+        r, f = _delete_batch(batch, dry_run)
+        rows_deleted, files_deleted = rows_deleted + r, files_deleted + f
+    return rows_deleted, files_deleted
+
+
+def _delete_batch(batch, dry_run: bool):
+    if dry_run:
+        return len(batch), sum(os.path.isfile(absolute(path)) for _, path in batch)
+    files = sum(remove_file(path) for _, path in batch)
+    WeatherReport.objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+    return len(batch), files
+
+
+def _walk(root: str):
+    """Percorre os PDFs sob ``root`` com os.scandir, um arquivo por vez."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".pdf"):
+                    yield entry
+
+
+def reconcile(
+    grace: int,
+    batch_size: int = 500,
+    dry_run: bool = False,
+    delete_missing: bool = False,
+    max_missing: float = 0.5,
+):
+    """
+    Confere DATA_DIR contra a tabela. Primeiro conta as linhas cujo arquivo
+    sumiu: se DATA_DIR não existir ou faltar mais que ``max_missing`` dos
+    arquivos (disco não montado, caminho errado), levanta StorageUnavailable
+    antes de apagar qualquer coisa. Depois, numa passada em streaming pelo
+    diretório, apaga os PDFs sem linha correspondente (mais velhos que
+    ``grace`` segundos, para não pegar um relatório ainda sendo registrado).
+    As linhas sem arquivo só são apagadas com ``delete_missing``, em lotes.
+    Retorna (arquivos órfãos, linhas sem arquivo).
+    """
+    root = str(settings.DATA_DIR)
+    if not os.path.isdir(root):
+        raise StorageUnavailable(f"DATA_DIR não encontrado: {root}")
+
+    total = missing = 0
+    for _, path in _rows(batch_size):
+        total += 1
+        missing += not os.path.isfile(absolute(path))
+    if missing and missing / total > max_missing:
+        raise StorageUnavailable(
+            f"{missing} de {total} relatórios sem arquivo em {root}; "
+            "o armazenamento parece indisponível"
+        )
+
+    cutoff = time.time() - grace
+    orphans = 0
+
+    def flush(batch):
+        # Registros antigos guardam o caminho absoluto; os novos, o relativo
+        known = set(
+            WeatherReport.objects.filter(
+                file_path__in=[p for entry in batch for p in (entry.path, relative(entry.path))]
+            ).values_list("file_path", flat=True)
+        )
+        removed = 0
+        for entry in batch:
+            if entry.path in known or relative(entry.path) in known:
+                continue
+            if entry.stat().st_mtime > cutoff:
+                continue
+            if not dry_run:
+                os.remove(entry.path)
+            removed += 1
+        return removed
+
+    batch = []
+    for entry in _walk(root):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            orphans += flush(batch)
+            batch = []
+    if batch:
+        orphans += flush(batch)
+
+    if missing and delete_missing and not dry_run:
+        batch = []
+        for pk, path in _rows(batch_size):
+            if os.path.isfile(absolute(path)):
+                continue
+            batch.append(pk)
+            if len(batch) >= batch_size:
+                WeatherReport.objects.filter(pk__in=batch).delete()
+                batch = []
+        if batch:
+            WeatherReport.objects.filter(pk__in=batch).delete()
+
+    return orphans, missing
+
+
+def _rows(batch_size: int):
+    """(id, file_path) de todos os relatórios, lidos aos lotes com ``iterator()``."""
+    return (
+        WeatherReport.objects.order_by()
+        .values_list("id", "file_path")
+        .iterator(chunk_size=batch_size)
+    )
+
+
+def expired_jobs(max_age_days: int):
+    """Jobs concluídos ou falhos há mais de ``max_age_days`` dias (0 desliga)."""
+    if not max_age_days:
+        return ReportJob.objects.none()
+    return ReportJob.objects.filter(
+        status__in=[ReportJob.DONE, ReportJob.FAILED],
+        finished_at__lt=timezone.now() - timedelta(days=max_age_days),
+    )
+
+
+def delete_jobs(jobs, batch_size: int = 500, dry_run: bool = False):
+    """Apaga os jobs do queryset em lotes de ids. Retorna quantos foram apagados."""
+    deleted = 0
+    batch = []
+    for pk in jobs.order_by().values_list("id", flat=True).iterator(chunk_size=batch_size):
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            deleted += _delete_job_batch(batch, dry_run)
+            batch = []
+    if batch:
+        deleted += _delete_job_batch(batch, dry_run)
+    return deleted
+
+
+def _delete_job_batch(batch, dry_run: bool):
+    if not dry_run:
+        ReportJob.objects.filter(pk__in=batch).delete()
+    return len(batch)
+
+
+def prune_empty_dirs():
+    """
+    Remove os diretórios de shard/dia que ficaram vazios, de baixo para
+    cima; o rmdir (que falha em diretório não vazio) decide, e um dia sem
+    shards sai na mesma passada.
+    """
+    removed = 0
+    for root, dirs, files in os.walk(settings.DATA_DIR, topdown=False):
+        if root == str(settings.DATA_DIR) or files:
+            continue
+        try:
+            os.rmdir(root)
+            removed += 1
+        except OSError:
+            pass
+    return removed
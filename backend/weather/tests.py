@@ -1,3 +1,868 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import clients, geohash, history, jobs, middleware, storage, views
+from .cache import GridCache
+from .downloads import parse_range
+from .fingerprint import report_fingerprint
+from .management.commands import run_report_worker
+from .middleware import JsonCompressionMiddleware
+from .models import ReportJob, WeatherObservation, WeatherReport
+from .pagination import decode_cursor, encode_cursor
+from .resilience import CircuitBreaker, UpstreamError, UpstreamUnavailable
+
+HOUR = history.HOUR
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM, WEATHER_LOCAL_CACHE_SIZE=2, WEATHER_STALE_TTL=60)
+class GridCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = GridCache()
+        self.cache.shared.clear()
+        self.calls = []
+
+    def fetch(self, lat, lon):
+        self.calls.append((lat, lon))
+        return {"temp": len(self.calls)}
+
+    def test_points_in_the_same_cell_share_one_fetch(self):
+        first = self.cache.get_or_fetch("weather", -23.5501, -46.6301, self.fetch, 60)
+        second = self.cache.get_or_fetch("weather", -23.5509, -46.6309, self.fetch, 60)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_returns_copies(self):
+        self.cache.get_or_fetch("weather", 1.0, 1.0, self.fetch, 60)["temp"] = 99
+        self.assertEqual(self.cache.get_or_fetch("weather", 1.0, 1.0, self.fetch, 60), {"temp": 1})
+
+    def test_shared_layer_serves_other_workers(self):
+        self.cache.get_or_fetch("weather", 1.0, 1.0, self.fetch, 60)
+        other = GridCache()
+        self.assertEqual(other.get_or_fetch("weather", 1.0, 1.0, self.fetch, 60), {"temp": 1})
+        self.assertEqual(len(self.calls), 1)
+
+    def test_local_layer_evicts_least_recently_used(self):
+        for lat in (1.0, 2.0, 3.0):
+            self.cache.get_or_fetch("weather", lat, 1.0, self.fetch, 60)
+        self.assertIsNone(self.cache.local.get(self.cache.key("weather", 1.0, 1.0)))
+        self.assertIsNotNone(self.cache.local.get(self.cache.key("weather", 3.0, 1.0)))
+
+    def test_expired_entry_is_fetched_again(self):
+        self.cache.get_or_fetch("weather", 1.0, 1.0, self.fetch, 60)
+        with mock.patch("weather.cache.time.time", return_value=time.time() + 120):
+            self.assertEqual(self.cache.get_or_fetch("weather", 1.0, 1.0, self.fetch, 60), {"temp": 2})
+
+    def test_upstream_error_serves_stale_value(self):
+        self.cache.get_or_fetch("weather", 1.0, 1.0, self.fetch, 60)
+
+        def failing(lat, lon):
+            raise UpstreamError("disjuntor aberto")
+
+        # Vencida no LRU, mas ainda dentro de WEATHER_STALE_TTL no compartilhado
+        with mock.patch("weather.cache.time.time", return_value=time.time() + 90):
+            value = self.cache.get_or_fetch("weather", 1.0, 1.0, failing, 60)
+        self.assertEqual(value, {"temp": 1, "stale": True})
+
+    def test_upstream_error_without_value_is_raised(self):
+        def failing(lat, lon):
+            raise UpstreamError("cota esgotada")
+
+        with self.assertRaises(UpstreamError):
+            self.cache.get_or_fetch("weather", 5.0, 5.0, failing, 60)
+
+    def test_empty_response_is_not_cached(self):
+        self.cache.get_or_fetch("air", 1.0, 1.0, lambda lat, lon: None, 60)
+        self.cache.get_or_fetch("air", 1.0, 1.0, self.fetch, 60)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        started = threading.Barrier(5)
+
+        def slow(lat, lon):
+            time.sleep(0.1)
+            return self.fetch(lat, lon)
+
+        def request():
+            started.wait()
+            return self.cache.get_or_fetch("weather", 1.0, 1.0, slow, 60)
+
+        with ThreadPoolExecutor(5) as pool:
+            results = list(pool.map(lambda _: request(), range(5)))
+        self.assertEqual(results, [{"temp": 1}] * 5)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.cache._flights, {})
+
+    def test_concurrent_async_misses_share_one_fetch(self):
+        async def afetch(lat, lon):
+            await asyncio.sleep(0.05)
+            return self.fetch(lat, lon)
+
+        async def run():
+            return await asyncio.gather(*(
+                self.cache.aget_or_fetch("weather", 1.0, 1.0, afetch, 60) for _ in range(5)
+            ))
+
+        results = asyncio.run(run())
+        self.assertEqual(results, [{"temp": 1}] * 5)
+        results[0]["temp"] = 99
+        self.assertEqual(results[1], {"temp": 1})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.cache._aflights, {})
+
+    def test_async_waiters_share_errors_and_survive_a_cancelled_caller(self):
+        async def failing(lat, lon):
+            await asyncio.sleep(0.05)
+            raise UpstreamError("cota esgotada")
+
+        async def afetch(lat, lon):
+            await asyncio.sleep(0.05)
+            return self.fetch(lat, lon)
+
+        async def run():
+            errors = await asyncio.gather(*(
+                self.cache.aget_or_fetch("weather", 5.0, 5.0, failing, 60) for _ in range(3)
+            ), return_exceptions=True)
+
+            first = asyncio.ensure_future(self.cache.aget_or_fetch("weather", 1.0, 1.0, afetch, 60))
+            second = asyncio.ensure_future(self.cache.aget_or_fetch("weather", 1.0, 1.0, afetch, 60))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return errors, await second, first.cancelled()
+
+        errors, value, cancelled = asyncio.run(run())
+        self.assertTrue(all(isinstance(e, UpstreamError) for e in errors))
+        self.assertEqual(value, {"temp": 1})
+        self.assertTrue(cancelled)
+        self.assertEqual(len(self.calls), 1)
+
+
+class MissingRangesTests(SimpleTestCase):
+    def setUp(self):
+        self.end = int(time.time()) // HOUR * HOUR - 24 * HOUR
+        self.start = self.end - 23 * HOUR
+
+    def points(self, *hours):
+        return [{"dt": self.start + h * HOUR} for h in hours]
+
+    def test_everything_missing_is_one_range(self):
+        self.assertEqual(history.missing_ranges([], self.start, self.end), [(self.start, self.end)])
+
+    def test_complete_range_has_no_gaps(self):
+        stored = self.points(*range(24))
+        self.assertEqual(history.missing_ranges(stored, self.start, self.end), [])
+
+    def test_gaps_are_grouped(self):
+        stored = self.points(*range(3, 10), *range(12, 24))
+        self.assertEqual(history.missing_ranges(stored, self.start, self.end), [
+            (self.start, self.start + 2 * HOUR),
+            (self.start + 10 * HOUR, self.start + 11 * HOUR),
+        ])
+
+    def test_covered_hours_are_not_gaps(self):
+        stored = self.points(*range(12, 24))
+        covered = [(self.start, self.start + 5 * HOUR)]
+        self.assertEqual(
+            history.missing_ranges(stored, self.start, self.end, covered),
+            [(self.start + 6 * HOUR, self.start + 11 * HOUR)],
+        )
+
+    def test_future_hours_are_not_gaps(self):
+        now = int(time.time()) // HOUR * HOUR
+        stored = [{"dt": now - HOUR}, {"dt": now}]
+        self.assertEqual(history.missing_ranges(stored, now - HOUR, now + 10 * HOUR), [])
+
+    def test_many_gaps_merge_the_closest_ones(self):
+        # Lacunas isoladas nas horas 0, 2, 4, 6, 8, 10 e 20: a hora 20 está
+        # longe das demais, então a união acontece entre as próximas
+        holes = {0, 2, 4, 6, 8, 10, 20}
+        stored = self.points(*(h for h in range(24) if h not in holes))
+        ranges = history.missing_ranges(stored, self.start, self.end)
+        self.assertEqual(len(ranges), history.MAX_GAP_FETCHES)
+        self.assertIn((self.start + 20 * HOUR, self.start + 20 * HOUR), ranges)
+        for hole in holes:
+            slot = self.start + hole * HOUR
+            self.assertTrue(any(a <= slot <= b for a, b in ranges))
+
+
+class AggregateTests(SimpleTestCase):
+    def test_raw_keeps_only_requested_fields(self):
+        points = [{"dt": 0, "aqi": 2, "pm2_5": 1.5, "pm10": 3.0}]
+        self.assertEqual(history.aggregate(points, "raw", ("pm2_5",)), [{"dt": 0, "pm2_5": 1.5}])
+
+    def test_hour_buckets_with_mean_min_max_and_percentile(self):
+        base = 1_700_000_000 // HOUR * HOUR
+        points = [{"dt": base + i * 600, "pm2_5": float(v)} for i, v in enumerate((1, 2, 3, 4, 5, 6))]
+        points.append({"dt": base + HOUR, "pm2_5": 10.0})
+
+        result = history.aggregate(points, "hour", ("pm2_5",), ("mean", "min", "max", "p50"))
+        self.assertEqual(result, [
+            {"dt": base, "count": 6, "pm2_5": 3.5, "pm2_5_min": 1.0,
+             "pm2_5_max": 6.0, "pm2_5_p50": 3.5},
+            {"dt": base + HOUR, "count": 1, "pm2_5": 10.0, "pm2_5_min": 10.0,
+             "pm2_5_max": 10.0, "pm2_5_p50": 10.0},
+        ])
+
+    def test_weeks_start_on_monday(self):
+        # 2024-01-03 (quarta) cai na semana iniciada em 2024-01-01 (segunda)
+        monday = 1704067200
+        result = history.aggregate([{"dt": monday + 2 * 86400, "aqi": 1}], "week", ("aqi",))
+        self.assertEqual(result[0]["dt"], monday)
+
+    def test_window_by_window_matches_whole_range(self):
+        start = 1_700_000_000 // 86400 * 86400
+        points = [{"dt": start + h * HOUR, "aqi": (h * 7) % 5} for h in range(24 * 20)]
+        whole = history.aggregate(points, "day", ("aqi",), ("mean", "p95"))
+
+        windowed = []
+        for window_start, window_end in history.windows(start, points[-1]["dt"], 7 * 86400, "day"):
+            window = [p for p in points if window_start <= p["dt"] <= window_end]
+            windowed += history.aggregate(window, "day", ("aqi",), ("mean", "p95"))
+        self.assertEqual(windowed, whole)
+
+
+class ChartSeriesTests(TestCase):
+    """Séries dos gráficos de 24h: uma hora por ponto, sem rótulo repetido."""
+
+    def setUp(self):
+        self.now = 1_700_000_000 // HOUR * HOUR + 1800
+
+    def test_temperature_series_has_one_point_per_hour(self):
+        WeatherObservation.objects.bulk_create([
+            WeatherObservation(cell="c", dt=self.now - i * 1800, temperature=20.0 + i % 3)
+            for i in range(60)
+        ])
+        series = history.temperature_series("c", now=self.now)
+        self.assertEqual(len(series), 24)
+        labels = {time.strftime("%H", time.gmtime(ts)) for ts, _ in series}
+        self.assertEqual(len(labels), 24)
+        self.assertEqual(series[-1][0], self.now // HOUR * HOUR)
+
+    def test_pollution_series_has_one_point_per_hour(self):
+        history.save("c", [
+            {"dt": self.now // HOUR * HOUR - h * HOUR, **{f: 1 for f in history.FIELDS}}
+            for h in range(30)
+        ])
+        series = history.pollution_series("c", ("pm2_5",), now=self.now)
+        self.assertEqual(len(series["dt"]), 24)
+        self.assertEqual(len({ts % 86400 for ts in series["dt"]}), 24)
+
+
+class ReportQueueTests(TestCase):
+    def job(self, **fields):
+        payload = {"city": "Fila", "latitude": -23.55, "longitude": -46.63}
+        return ReportJob.objects.create(payload=payload, **fields)
+
+    def test_claim_marks_the_oldest_jobs_running(self):
+        first, second, third = self.job(), self.job(), self.job()
+        claimed = jobs.claim_jobs(2)
+        self.assertEqual([job.id for job in claimed], [first.id, second.id])
+        self.assertEqual(
+            set(ReportJob.objects.filter(status=ReportJob.RUNNING).values_list("id", flat=True)),
+            {first.id, second.id},
+        )
+        self.assertEqual(jobs.claim_jobs(0), [])
+        self.assertEqual([job.id for job in jobs.claim_jobs(5)], [third.id])
+
+    def test_requeue_stale_skips_recent_and_excluded_jobs(self):
+        old = timezone.now() - timedelta(seconds=120)
+        stuck = self.job(status=ReportJob.RUNNING, started_at=old)
+        own = self.job(status=ReportJob.RUNNING, started_at=old)
+        recent = self.job(status=ReportJob.RUNNING, started_at=timezone.now())
+
+        self.assertEqual(jobs.requeue_stale(60, exclude=[own.id]), 1)
+        statuses = dict(ReportJob.objects.values_list("id", "status"))
+        self.assertEqual(statuses[stuck.id], ReportJob.PENDING)
+        self.assertEqual(statuses[own.id], ReportJob.RUNNING)
+        self.assertEqual(statuses[recent.id], ReportJob.RUNNING)
+
+    def test_worker_requeues_then_fails_jobs_lost_with_the_pool(self):
+        self.job()
+        job = jobs.claim_jobs(1)[0]
+        command = run_report_worker.Command(stdout=io.StringIO(), stderr=io.StringIO())
+        command.crashed = set()
+
+        command.running = {object(): job}
+        command._recover()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.PENDING)
+        self.assertIsNone(job.started_at)
+
+        command.running = {object(): jobs.claim_jobs(1)[0]}
+        command._recover()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+        self.assertEqual(command.running, {})
+
+    @override_settings(REPORT_QUEUE_MAX_PENDING=1)
+    def test_post_enqueues_once_and_reports_status(self):
+        data = {"city": "Fila", "latitude": -23.55, "longitude": -46.63, "temperatura": 20}
+
+        async def weather(lat, lon):
+            return dict(data)
+
+        async def pollution(lat, lon):
+            return {"aqi": 2}
+
+        with mock.patch.object(views, "aget_weather_data", weather), \
+                mock.patch.object(views, "aget_air_pollution_data", pollution):
+            first = self.client.post(
+                "/api/report/weather", {"lat": -23.55, "lon": -46.63}, content_type="application/json"
+            )
+            again = self.client.post(
+                "/api/report/weather", {"lat": -23.55, "lon": -46.63}, content_type="application/json"
+            )
+            data["temperatura"] = 25
+            full = self.client.post(
+                "/api/report/weather", {"lat": -23.55, "lon": -46.63}, content_type="application/json"
+            )
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(again.json()["job_id"], first.json()["job_id"])
+        self.assertEqual(full.status_code, 503)
+
+        status = self.client.get(f"/api/report/jobs/{first.json()['job_id']}").json()
+        self.assertEqual(status["status"], ReportJob.PENDING)
+        self.assertNotIn("download_url", status)
+        self.assertEqual(self.client.get("/api/report/jobs/0").status_code, 404)
+
+
+class ReportListingTests(TestCase):
+    def setUp(self):
+        self.reports = []
+        for i in range(5):
+            report = WeatherReport.objects.create(
+                city="São Paulo", latitude=-23.55, longitude=-46.63, file_path=f"r{i}.pdf"
+            )
+            self.reports.append(report)
+        # Dois relatórios no mesmo instante: o id desempata a ordem
+        same = timezone.now().replace(microsecond=0)
+        WeatherReport.objects.filter(pk__in=[r.pk for r in self.reports[:2]]).update(generated_at=same)
+        WeatherReport.objects.create(city="Santos", latitude=-23.96, longitude=-46.33, file_path="s.pdf")
+
+    def test_cursor_round_trip(self):
+        when = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(when, 42)), (when, 42))
+        for bad in ("", "!!", encode_cursor(when, 1)[:-3]):
+            with self.assertRaises(ValueError):
+                decode_cursor(bad)
+
+    def test_pages_follow_the_cursor_without_gaps_or_repeats(self):
+        seen, url = [], "/api/reports/sao paulo?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.json()]
+            cursor = response.get("X-Next-Cursor")
+            url = f"/api/reports/SAO PAULO?limit=2&cursor={cursor}" if cursor else None
+
+        expected = list(
+            WeatherReport.objects.filter(city="São Paulo")
+            .order_by("-generated_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_next_link_and_invalid_params(self):
+        response = self.client.get("/api/reports/São Paulo?limit=4")
+        self.assertIn('rel="next"', response["Link"])
+        self.assertNotIn("X-Next-Cursor", self.client.get("/api/reports/Santos").headers)
+        self.assertEqual(self.client.get("/api/reports/Santos?cursor=xyz").status_code, 400)
+        self.assertEqual(self.client.get("/api/reports/Santos?limit=abc").status_code, 400)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_absent_or_malformed_header_is_ignored(self):
+        for header in (None, "", "items=0-1", "bytes=0-1,5-6", "bytes=-"):
+            self.assertIsNone(parse_range(header, 100), header)
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range("bytes=10-19", 100), (10, 19))
+
+    def test_open_range_and_end_past_size(self):
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=90-500", 100), (90, 99))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-500", 100), (0, 99))
+        self.assertIs(parse_range("bytes=-0", 100), False)
+
+    def test_end_before_start_is_ignored(self):
+        self.assertIsNone(parse_range("bytes=10-5", 100))
+
+    def test_start_past_size_is_unsatisfiable(self):
+        self.assertIs(parse_range("bytes=100-", 100), False)
+        self.assertIs(parse_range("bytes=150-160", 100), False)
+
+
+class DownloadReportTests(TestCase):
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        override = override_settings(DATA_DIR=data_dir.name, REPORT_SENDFILE_HEADER="")
+        override.enable()
+        self.addCleanup(override.disable)
+
+        os.makedirs(os.path.join(data_dir.name, "reports"))
+        self.report = WeatherReport.objects.create(
+            city="T", latitude=0, longitude=0, file_path="reports/t.pdf", content_hash="ab" * 32,
+        )
+        with open(self.report.absolute_path, "wb") as f:
+            f.write(bytes(range(100)))
+        self.url = f"/api/report/download/{self.report.id}"
+
+    def content(self, response):
+        async def collect():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        return asyncio.run(collect())
+
+    def test_full_download_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), bytes(range(100)))
+        self.assertTrue(response["ETag"].startswith('"abababababababab-'))
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_rewritten_file_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        stat = os.stat(self.report.absolute_path)
+        os.utime(self.report.absolute_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertNotEqual(self.client.get(self.url)["ETag"], etag)
+
+    def test_range_and_if_range(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(self.content(response), bytes(range(10, 20)))
+
+        stale = self.client.get(self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"outro"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */100")
+
+    def test_missing_file_is_404(self):
+        os.remove(self.report.absolute_path)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class JsonCompressionTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = JsonCompressionMiddleware(lambda request: None)
+        self.payload = {"list": [{"dt": i, "pm2_5": 1.5} for i in range(100)]}
+
+    def respond(self, response, accept="gzip, deflate"):
+        request = self.factory.get("/api/air/history", HTTP_ACCEPT_ENCODING=accept)
+        return self.middleware.process_response(request, response)
+
+    def test_gzip_json_and_weaken_the_etag(self):
+        response = JsonResponse(self.payload)
+        response["ETag"] = '"abc"'
+        response = self.respond(response)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.payload)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+
+    def test_small_unaccepted_or_non_json_bodies_are_left_alone(self):
+        small = self.respond(JsonResponse({"ok": True}))
+        self.assertFalse(small.has_header("Content-Encoding"))
+        identity = self.respond(JsonResponse(self.payload), accept="")
+        self.assertFalse(identity.has_header("Content-Encoding"))
+        pdf = self.respond(HttpResponse(b"%PDF" * 100, content_type="application/pdf"))
+        self.assertFalse(pdf.has_header("Content-Encoding"))
+
+    @unittest.skipIf(middleware.brotli is None, "brotli não instalado")
+    def test_prefers_brotli(self):
+        response = self.respond(JsonResponse(self.payload), accept="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(json.loads(middleware.brotli.decompress(response.content)), self.payload)
+
+    def test_async_ndjson_stream_is_compressed_chunk_by_chunk(self):
+        lines = [json.dumps({"dt": i}).encode() + b"\n" for i in range(50)]
+
+        async def chunks():
+            for line in lines:
+                yield line
+
+        response = self.respond(
+            StreamingHttpResponse(chunks(), content_type="application/x-ndjson")
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        async def collect():
+            # Cada pedaço já descomprime sozinho (flush por pedaço)
+            decompressor = zlib.decompressobj(31)
+            parts = []
+            async for chunk in response.streaming_content:
+                parts.append(decompressor.decompress(chunk))
+            return parts
+
+        parts = asyncio.run(collect())
+        self.assertEqual(parts[:len(lines)], lines)
+
+    def test_columnar_transposes_points(self):
+        points = [{"dt": 1, "pm2_5": 2.0}, {"dt": 2, "pm2_5": None}]
+        self.assertEqual(history.columnar(points), {"dt": [1, 2], "pm2_5": [2.0, None]})
+        self.assertEqual(history.columnar([]), {})
+
+
+@override_settings(BREAKER_FAILURE_THRESHOLD=3, BREAKER_RESET_TIMEOUT=30, UPSTREAM_LATENCY_BUDGET=1)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker("test")
+        self.now = 1000.0
+        patcher = mock.patch("weather.resilience.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success(0.1)
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.is_open)
+
+    def test_slow_success_counts_as_failure(self):
+        for _ in range(3):
+            self.breaker.record_success(5)
+        self.assertTrue(self.breaker.is_open)
+
+    def test_half_open_allows_a_single_probe(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success(0.1)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+    def test_retry_after_opens_immediately(self):
+        self.breaker.record_failure(retry_after=10)
+        self.assertFalse(self.breaker.allow())
+        self.now += 11
+        self.assertTrue(self.breaker.allow())
+
+    def test_released_probe_can_be_retried(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(BREAKER_FAILURE_THRESHOLD=3, BREAKER_RESET_TIMEOUT=30)
+class UpstreamClientTests(SimpleTestCase):
+    """Chamadas de teste (meio aberto) que não chegam ao OpenWeather."""
+
+    def half_open(self, endpoint):
+        breaker = clients.get_breaker(endpoint)
+        # Cooldown zero: o circuito já nasce meio aberto
+        breaker.record_failure(retry_after=0)
+        return breaker
+
+    def test_quota_exhausted_probe_is_released(self):
+        breaker = self.half_open("test_quota_sync")
+        with mock.patch.object(clients, "acquire_token", return_value=False):
+            with self.assertRaises(UpstreamUnavailable):
+                clients.get("test_quota_sync", "http://upstream.invalid")
+        self.assertTrue(breaker.allow())
+
+    def test_quota_exhausted_async_probe_is_released(self):
+        breaker = self.half_open("test_quota_async")
+        with mock.patch.object(clients, "acquire_token", return_value=False):
+            with self.assertRaises(UpstreamUnavailable):
+                asyncio.run(clients.aget("test_quota_async", "http://upstream.invalid"))
+        self.assertTrue(breaker.allow())
+
+    def test_cancelled_probe_is_released(self):
+        breaker = self.half_open("test_cancel")
+        client = mock.Mock(get=mock.AsyncMock(side_effect=asyncio.CancelledError))
+
+        async def call():
+            with mock.patch.object(clients, "_async_state", return_value=(client, asyncio.Semaphore(1))):
+                await clients.aget("test_cancel", "http://upstream.invalid")
+
+        with mock.patch.object(clients, "acquire_token", return_value=True):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(call())
+        self.assertTrue(breaker.allow())
+
+
+@override_settings(REPORT_DEDUP_WINDOW=600)
+class ReportFingerprintTests(TestCase):
+    def setUp(self):
+        self.now = 1_700_000_100
+        self.data = {
+            "city": "São Paulo",
+            "latitude": -23.5505,
+            "longitude": -46.6333,
+            "temperatura": 24.2,
+            "sensacao": 25.1,
+            "umidade": 60,
+            "pressao": 1012,
+            "vento": 3.21,
+            "descricao": "nublado",
+            "pollution": {"aqi": 2, "pm2_5": 12.3, "pm10": 20.1, "o3": 40.0,
+                          "no2": 10.0, "so2": 2.0, "co": 300.0},
+        }
+
+    def test_small_changes_in_the_same_window_match(self):
+        other = dict(self.data, city=" são paulo ", temperatura=24.4, latitude=-23.5507)
+        self.assertEqual(
+            report_fingerprint(self.data, self.now),
+            report_fingerprint(other, self.now + 60),
+        )
+
+    def test_visible_changes_differ(self):
+        base = report_fingerprint(self.data, self.now)
+        self.assertNotEqual(base, report_fingerprint(dict(self.data, temperatura=26.0), self.now))
+        self.assertNotEqual(base, report_fingerprint(dict(self.data, city="Santos"), self.now))
+        self.assertNotEqual(base, report_fingerprint(dict(self.data, pollution=None), self.now))
+
+    def test_next_window_differs(self):
+        self.assertNotEqual(
+            report_fingerprint(self.data, self.now),
+            report_fingerprint(self.data, self.now + 600),
+        )
+
+    def test_find_report_requires_the_file(self):
+        content_hash = report_fingerprint(self.data, self.now)
+        with tempfile.TemporaryDirectory() as data_dir, override_settings(DATA_DIR=data_dir):
+            report = WeatherReport.objects.create(
+                city="São Paulo", latitude=-23.5505, longitude=-46.6333,
+                file_path="reports/sp.pdf", content_hash=content_hash,
+            )
+            self.assertIsNone(jobs.find_report(content_hash))
+
+            os.makedirs(os.path.join(data_dir, "reports"))
+            with open(report.absolute_path, "wb") as f:
+                f.write(b"%PDF")
+            self.assertEqual(jobs.find_report(content_hash), report)
+            self.assertIsNone(jobs.find_report(""))
+
+
+class GeohashTests(SimpleTestCase):
+    def test_encode_known_point(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+
+    def test_neighbours_surround_the_cell(self):
+        cells = geohash.neighbours(-23.5505, -46.6333, 6)
+        self.assertEqual(len(cells), 9)
+        self.assertIn(geohash.encode(-23.5505, -46.6333, 6), cells)
+
+        # Um ponto logo além da borda da célula cai numa das vizinhas
+        height, width = geohash.cell_size(6)
+        self.assertIn(geohash.encode(-23.5505 + height, -46.6333 - width, 6), cells)
+
+    def test_precision_covers_the_radius(self):
+        for radius in (0.5, 2, 10, 50):
+            height, width = geohash.cell_size(geohash.precision_for(radius, -23.5))
+            self.assertGreaterEqual(height * 111.19, radius)
+
+    def test_bounding_box_contains_the_circle(self):
+        lat, lon, radius = -23.5, -46.6, 10
+        south, north, west, east = geohash.bounding_box(lat, lon, radius)
+        self.assertAlmostEqual(geohash.distance_km(lat, lon, north, lon), radius, places=3)
+
+        # Pontos do círculo, de 5 em 5 graus de rumo: nenhum fica fora da caixa
+        angle, phi = radius / geohash.EARTH_RADIUS_KM, math.radians(lat)
+        for bearing in map(math.radians, range(0, 360, 5)):
+            point_phi = math.asin(
+                math.sin(phi) * math.cos(angle) + math.cos(phi) * math.sin(angle) * math.cos(bearing)
+            )
+            point_lon = lon + math.degrees(math.atan2(
+                math.sin(bearing) * math.sin(angle) * math.cos(phi),
+                math.cos(angle) - math.sin(phi) * math.sin(point_phi),
+            ))
+            self.assertLessEqual(south - 1e-9, math.degrees(point_phi))
+            self.assertLessEqual(math.degrees(point_phi), north + 1e-9)
+            self.assertLessEqual(west - 1e-9, point_lon)
+            self.assertLessEqual(point_lon, east + 1e-9)
+
+
+class StorageCleanupTests(TestCase):
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        self.root = data_dir.name
+        override = override_settings(DATA_DIR=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def report(self, city="Centro", name="r.pdf", exists=True, days_old=0):
+        path = storage.report_path(city, timezone.now(), name)
+        if exists:
+            with open(storage.absolute(path), "wb") as f:
+                f.write(b"%PDF")
+        report = WeatherReport.objects.create(city=city, latitude=0, longitude=0, file_path=path)
+        if days_old:
+            WeatherReport.objects.filter(pk=report.pk).update(
+                generated_at=timezone.now() - timedelta(days=days_old)
+            )
+        return report
+
+    def orphan(self, name, age=7200):
+        path = os.path.join(self.root, "2020", "01", "01", "ab", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"%PDF")
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_report_path_is_sharded_by_day(self):
+        when = timezone.now()
+        path = storage.report_path("Centro", when, "a.pdf")
+        day, shard, name = path.rsplit(os.sep, 2)
+        self.assertEqual(day, when.strftime("%Y/%m/%d"))
+        self.assertRegex(shard, r"^[0-9a-f]{2}$")
+        self.assertEqual(name, "a.pdf")
+        self.assertTrue(os.path.isdir(os.path.dirname(storage.absolute(path))))
+
+    def test_retention_by_age_and_per_city(self):
+        old = self.report(name="old.pdf", days_old=40)
+        newest = [self.report(name=f"n{i}.pdf") for i in range(3)]
+        other = self.report(city="Bairro", name="b.pdf")
+
+        expired = {pk for pk, _ in storage.expired_reports(30, 2)}
+        self.assertEqual(expired, {old.pk, newest[0].pk})
+
+        rows, files = storage.delete_reports(storage.expired_reports(30, 2), batch_size=1)
+        self.assertEqual((rows, files), (2, 2))
+        self.assertFalse(os.path.exists(old.absolute_path))
+        self.assertTrue(WeatherReport.objects.filter(pk=other.pk).exists())
+
+    def test_reconcile_removes_old_orphans_and_keeps_rows_without_the_flag(self):
+        kept = [self.report(name=f"k{i}.pdf") for i in range(3)]
+        gone = self.report(name="gone.pdf", exists=False)
+        old_orphan, young_orphan = self.orphan("old.pdf"), self.orphan("young.pdf", age=0)
+
+        self.assertEqual(storage.reconcile(3600, batch_size=2), (1, 1))
+        self.assertFalse(os.path.exists(old_orphan))
+        self.assertTrue(os.path.exists(young_orphan))
+        self.assertTrue(all(os.path.exists(r.absolute_path) for r in kept))
+        self.assertTrue(WeatherReport.objects.filter(pk=gone.pk).exists())
+
+        self.assertEqual(storage.reconcile(3600, batch_size=2, delete_missing=True), (0, 1))
+        self.assertFalse(WeatherReport.objects.filter(pk=gone.pk).exists())
+        self.assertEqual(WeatherReport.objects.count(), 3)
+
+    def test_reconcile_aborts_when_storage_looks_unavailable(self):
+        self.report(name="a.pdf")
+        self.report(name="b.pdf", exists=False)
+        self.report(name="c.pdf", exists=False)
+        orphan = self.orphan("o.pdf")
+
+        with self.assertRaises(storage.StorageUnavailable):
+            storage.reconcile(0, delete_missing=True)
+        self.assertTrue(os.path.exists(orphan))
+        self.assertEqual(WeatherReport.objects.count(), 3)
+
+        with override_settings(DATA_DIR=os.path.join(self.root, "nao-montado")):
+            with self.assertRaises(storage.StorageUnavailable):
+                storage.reconcile(0)
+            with self.assertRaises(CommandError):
+                call_command("cleanup_reports", "--delete-missing", stdout=io.StringIO())
+
+    def test_finished_jobs_expire(self):
+        old = timezone.now() - timedelta(days=10)
+        payload = {"city": "Centro"}
+        done = ReportJob.objects.create(payload=payload, status=ReportJob.DONE, finished_at=old)
+        failed = ReportJob.objects.create(payload=payload, status=ReportJob.FAILED, finished_at=old)
+        recent = ReportJob.objects.create(
+            payload=payload, status=ReportJob.DONE, finished_at=timezone.now()
+        )
+        pending = ReportJob.objects.create(payload=payload)
+
+        self.assertEqual(storage.delete_jobs(storage.expired_jobs(0)), 0)
+        self.assertEqual(storage.delete_jobs(storage.expired_jobs(7), batch_size=1), 2)
+        self.assertEqual(
+            set(ReportJob.objects.values_list("id", flat=True)), {recent.id, pending.id}
+        )
+
+    def test_command_prunes_empty_directories(self):
+        report = self.report(name="x.pdf", days_old=40)
+        out = io.StringIO()
+        call_command("cleanup_reports", "--max-age-days", "30", stdout=out)
+        self.assertIn("Retenção: 1 registro(s) e 1 arquivo(s)", out.getvalue())
+        self.assertFalse(os.path.exists(os.path.dirname(report.absolute_path)))
+        self.assertEqual(os.listdir(self.root), [])
+
+
+class NearbyReportsTests(TestCase):
+    def setUp(self):
+        self.origin = (-23.5505, -46.6333)
+        for city, lat, lon in [
+            ("Perto", -23.5515, -46.6333),
+            ("Médio", -23.5605, -46.6333),
+            ("Longe", -23.7505, -46.6333),
+        ]:
+            WeatherReport.objects.create(city=city, latitude=lat, longitude=lon, file_path="x.pdf")
+
+    def get(self, **params):
+        lat, lon = self.origin
+        return self.client.get("/api/report/nearby", {"lat": lat, "lon": lon, **params})
+
+    def test_sorted_by_distance_within_radius(self):
+        response = self.get(radius=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["city"] for r in response.json()], ["Perto", "Médio"])
+
+    def test_candidates_are_capped(self):
+        with override_settings(REPORTS_NEARBY_MAX_CANDIDATES=1):
+            response = self.get(radius=50)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_city_named_nearby_is_listed(self):
+        WeatherReport.objects.create(city="Nearby", latitude=0, longitude=0, file_path="n.pdf")
+        response = self.client.get("/api/reports/nearby")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["city"] for r in response.json()], ["Nearby"])
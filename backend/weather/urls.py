@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import weather_report, list_reports, get_pollution, pollution_history,download_report, get_weather
+from .views import weather_report, list_reports, nearby_reports, get_pollution, pollution_history,download_report, get_weather, get_forecast, snapshot, batch, report_job_status, prometheus_metrics, live
 
 urlpatterns = [
     # path("weather-report/", weather_report),
@@ -11,8 +11,16 @@ urlpatterns = [
     path("weather", get_weather, name="weather"),
     path("air", get_pollution, name="air"),
     path("air/history", pollution_history, name="air_history"),
+    path("forecast", get_forecast, name="forecast"),
+    path("snapshot", snapshot, name="snapshot"),
+    path("batch", batch, name="batch"),
+    path("live", live, name="live"),
     path("report/weather", weather_report, name="report_weather"),
+    path("report/jobs/<int:job_id>", report_job_status, name="report_job_status"),
+    path("report/nearby", nearby_reports, name="nearby_reports"),
 
     path("reports/<str:city>", list_reports, name="list_reports"),
-    path("report/download/<int:report_id>", download_report, name="download_report")
+    path("report/download/<int:report_id>", download_report, name="download_report"),
+
+    path("metrics", prometheus_metrics, name="metrics"),
 ]
\ No newline at end of file
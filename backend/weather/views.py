@@ -1,25 +1,51 @@
 import os
 import json
+import hashlib
+import logging
+import asyncio
+import heapq
 import pytz
-import requests
 
 from datetime import datetime
+from asgiref.sync import sync_to_async
 from django.urls import reverse
-from django.http import JsonResponse, FileResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-
-from .models import WeatherReport
+from django.db.models import Q
+
+from . import geohash, history, metrics
+from .cache import grid_cache
+from .downloads import (
+    file_etag,
+    file_response,
+    parse_range,
+    sendfile_response,
+    unsatisfiable_response,
+)
+from .fingerprint import report_fingerprint
+from .jobs import afind_active_job, afind_report, aqueue_depth
+from .live import hub as live_hub
+from .models import ReportJob, WeatherReport, normalize_city
+from .pagination import decode_cursor, encode_cursor
+from .resilience import UpstreamError
 from .services import (
-    get_weather_data,
-    get_air_pollution_data,
-    get_air_pollution_history_data,
+    aget_batch_data,
+    aget_forecast_data,
+    aget_weather_data,
+    aget_air_pollution_data,
+    aget_air_pollution_history_data,
+    aload_air_pollution_history,
+    astream_air_pollution_history,
 )
-from .reports import generate_weather_report
+
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
-def get_weather(request):
+async def get_weather(request):
     """Retorna dados climáticos atuais para o app Flutter"""
     if request.method != "GET":
         return JsonResponse({"error": "Use GET"}, status=405)
@@ -31,14 +57,19 @@ def get_weather(request):
         return JsonResponse({"error": "Parâmetros obrigatórios: lat e lon"}, status=400)
 
     try:
-        data = get_weather_data(float(lat), float(lon))
-        return JsonResponse(data, safe=False)
+        data = await aget_weather_data(float(lat), float(lon))
+        return _fresh_json(request, data, "weather", float(lat), float(lon))
+    except UpstreamError as e:
+        # 🔹 OpenWeather fora e nenhuma leitura anterior da célula para servir
+        response = JsonResponse({"error": str(e)}, status=503)
+        response["Retry-After"] = str(settings.BREAKER_RESET_TIMEOUT)
+        return response
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
 @csrf_exempt
-def get_pollution(request):
+async def get_pollution(request):
     if request.method != "GET":
         return JsonResponse({"error": "Use GET"}, status=405)
 
@@ -48,15 +79,62 @@ def get_pollution(request):
     if not lat or not lon:
         return JsonResponse({"error": "Campos 'lat' e 'lon' são obrigatórios."}, status=400)
 
-    data = get_air_pollution_data(float(lat), float(lon))
+    data = await aget_air_pollution_data(float(lat), float(lon))
     if data is None:
         return JsonResponse({"error": "Não foi possível obter dados atuais."}, status=500)
 
-    return JsonResponse({"data": data}, safe=False)
+    return _fresh_json(request, {"data": data}, "air", float(lat), float(lon))
+
+
+@csrf_exempt
+async def get_forecast(request):
+    """Resumo da previsão de 24h (chuva, umidade, pressão, nuvens) para o risco de alagamento."""
+    if request.method != "GET":
+        return JsonResponse({"error": "Use GET"}, status=405)
+
+    lat = request.GET.get("lat")
+    lon = request.GET.get("lon")
+
+    if not lat or not lon:
+        return JsonResponse({"error": "Parâmetros obrigatórios: lat e lon"}, status=400)
+
+    try:
+        data = await aget_forecast_data(float(lat), float(lon))
+        return _fresh_json(request, data, "forecast", float(lat), float(lon))
+    except UpstreamError as e:
+        response = JsonResponse({"error": str(e)}, status=503)
+        response["Retry-After"] = str(settings.BREAKER_RESET_TIMEOUT)
+        return response
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+def _fresh_json(request, payload, endpoint: str, lat: float, lon: float):
+    """
+    JSON com ETag e Cache-Control atrelados à validade da célula no cache:
+    o app e os proxies revalidam com If-None-Match e recebem 304 sem corpo.
+    """
+    response = JsonResponse(payload, safe=False)
+    response["ETag"] = f'"{hashlib.sha1(response.content).hexdigest()}"'
+
+    stale = (payload.get("data") or payload).get("stale")
+    max_age = 0 if stale else int(grid_cache.remaining(endpoint, lat, lon))
+
+    response = get_conditional_response(request, etag=response["ETag"], response=response)
+    if max_age:
+        patch_cache_control(response, public=True, max_age=max_age)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _csv_param(request, name: str):
+    """Lista de valores de um parâmetro separado por vírgulas (vazia se ausente)."""
+    return [v.strip() for v in request.GET.get(name, "").split(",") if v.strip()]
 
 
 @csrf_exempt
-def pollution_history(request):
+async def pollution_history(request):
     """Endpoint direto GET compatível com o Flutter ApiService"""
     if request.method != "GET":
         return JsonResponse({"error": "Use GET"}, status=405)
@@ -75,21 +153,272 @@ def pollution_history(request):
         end = int(now.timestamp())
         start = int((now.timestamp()) - 86400)
 
+    try:
+        start, end = int(start), int(end)
+    except ValueError:
+        return JsonResponse({"error": "Parâmetros 'start' e 'end' inválidos."}, status=400)
+
+    # 🔹 Agregação no servidor: resolution, fields e stats (mean,min,max,p95...)
+    resolution = request.GET.get("resolution", "raw")
+    if resolution != "raw" and resolution not in history.RESOLUTIONS:
+        return JsonResponse(
+            {"error": "resolution deve ser raw, hour, day ou week."}, status=400
+        )
+
+    fields = _csv_param(request, "fields") or history.FIELDS
+    unknown = [f for f in fields if f not in history.FIELDS]
+    if unknown:
+        return JsonResponse({"error": f"Campos desconhecidos: {', '.join(unknown)}"}, status=400)
+
+    try:
+        stats = [history.parse_stat(s) for s in _csv_param(request, "stats") or ["mean"]]
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     if not settings.OPENWEATHER_API_KEY:
         return JsonResponse({"error": "OPENWEATHER_API_KEY não configurada"}, status=500)
 
+    # 🔹 format=ndjson ou intervalo maior que uma janela: resposta em streaming
+    output = request.GET.get("format")
+    if output == "ndjson" or (
+        output != "columnar" and end - start > settings.HISTORY_WINDOW
+    ):
+        return await _stream_history(
+            float(lat), float(lon), start, end,
+            resolution, fields, stats, ndjson=output == "ndjson",
+        )
+
     try:
-        data = get_air_pollution_history_data(float(lat), float(lon), int(start), int(end))
-        if data is None:
+        data, stale = await aload_air_pollution_history(float(lat), float(lon), start, end)
+        if not data:
             return JsonResponse({"error": "Nenhum dado encontrado"}, status=404)
 
-        return JsonResponse({"list": data})
+        points = history.aggregate(data, resolution, fields, stats)
+
+        # 🔹 format=columnar: um array por campo em vez de um objeto por ponto
+        if request.GET.get("format") == "columnar":
+            payload = {"resolution": resolution, "columns": history.columnar(points)}
+        else:
+            payload = {"resolution": resolution, "list": points}
+
+        # 🔹 OpenWeather indisponível: só o que já estava armazenado, sem as lacunas
+        if stale:
+            payload["stale"] = True
+        return JsonResponse(payload)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+async def live(request):
+    """
+    Atualizações da célula de (lat, lon) por Server-Sent Events: um evento
+    ``snapshot`` com {"weather", "air"} e depois ``update`` só com os campos
+    que mudaram. Todos os assinantes da célula no worker compartilham uma
+    única leitura, no lugar de cada cliente consultar /weather e /air.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Use GET"}, status=405)
+
+    try:
+        lat = float(request.GET["lat"])
+        lon = float(request.GET["lon"])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Parâmetros obrigatórios: lat e lon"}, status=400)
+
+    if not settings.OPENWEATHER_API_KEY:
+        return JsonResponse({"error": "OPENWEATHER_API_KEY não configurada"}, status=500)
+
+    # 🔹 Limite de conexões abertas por worker
+    if live_hub.subscribers >= settings.LIVE_MAX_SUBSCRIBERS:
+        response = JsonResponse({"error": "Muitas conexões ao vivo, tente mais tarde."}, status=503)
+        response["Retry-After"] = str(int(settings.LIVE_KEEPALIVE))
+        return response
+
+    async def events():
+        feed, queue = await live_hub.subscribe(lat, lon)
+        try:
+            # Reconexão automática do EventSource depois de 5 s
+            yield "retry: 5000\n\n"
+            while not feed.task.done():
+                try:
+                    yield await asyncio.wait_for(queue.get(), settings.LIVE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            live_hub.unsubscribe(feed, queue)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _stream_history(lat, lon, start, end, resolution, fields, stats, ndjson=False):
+    """
+    Envia o histórico janela a janela: em NDJSON (um ponto por linha) ou no
+    mesmo JSON de sempre, ``{"resolution", "list"}``, escrito aos pedaços.
+
+    As janelas são lidas até a primeira com pontos antes de responder: sem
+    nenhum ponto no intervalo a resposta é 404, como no caminho sem
+    streaming. Janelas servidas só com o armazenado (OpenWeather
+    indisponível) terminam a resposta com ``"stale": true`` (ou uma linha
+    ``{"stale": true}``); uma falha no meio vira a chave ``error`` (ou uma
+    linha ``{"error"}``).
+    """
+    windows = astream_air_pollution_history(lat, lon, start, end, resolution)
+    first, stale = [], False
+    try:
+        async for window, window_stale in windows:
+            stale = stale or window_stale
+            first = history.aggregate(window, resolution, fields, stats)
+            if first:
+                break
+    except Exception as e:
+        await windows.aclose()
+        logger.exception("Falha no streaming do histórico de poluição")
+        return JsonResponse({"error": str(e)}, status=500)
+
+    if not first:
+        await windows.aclose()
+        return JsonResponse({"error": "Nenhum dado encontrado"}, status=404)
+
+    async def rest():
+        """Pontos da primeira janela e depois das seguintes, com o ``stale`` acumulado."""
+        nonlocal stale
+        yield first
+        async for window, window_stale in windows:
+            stale = stale or window_stale
+            points = history.aggregate(window, resolution, fields, stats)
+            if points:
+                yield points
+
+    async def ndjson_lines():
+        try:
+            async for points in rest():
+                yield "".join(json.dumps(point) + "\n" for point in points)
+        except Exception as e:
+            logger.exception("Falha no streaming do histórico de poluição")
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        finally:
+            await windows.aclose()
+        if stale:
+            yield json.dumps({"stale": True}) + "\n"
+
+    async def json_chunks():
+        yield '{"resolution": %s, "list": [' % json.dumps(resolution)
+        separator = ""
+        try:
+            async for points in rest():
+                yield separator + ", ".join(json.dumps(point) for point in points)
+                separator = ", "
+        except Exception as e:
+            logger.exception("Falha no streaming do histórico de poluição")
+            yield '], "error": %s}' % json.dumps(str(e))
+            return
+        finally:
+            await windows.aclose()
+        yield '], "stale": true}' if stale else "]}"
+
+    if ndjson:
+        response = StreamingHttpResponse(ndjson_lines(), content_type="application/x-ndjson")
+    else:
+        response = StreamingHttpResponse(json_chunks(), content_type="application/json")
+    # Sem buffer no nginx: cada janela sai assim que fica pronta
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@csrf_exempt
+async def snapshot(request):
+    """Clima, poluição atual e histórico de 24h em uma única resposta."""
+    if request.method != "GET":
+        return JsonResponse({"error": "Use GET"}, status=405)
+
+    lat = request.GET.get("lat")
+    lon = request.GET.get("lon")
+
+    if not lat or not lon:
+        return JsonResponse({"error": "Parâmetros obrigatórios: lat e lon"}, status=400)
+
+    lat, lon = float(lat), float(lon)
+    end = int(datetime.utcnow().timestamp())
+    start = end - 86400
+
+    # As três consultas ao OpenWeather saem ao mesmo tempo
+    results = await asyncio.gather(
+        aget_weather_data(lat, lon),
+        aget_air_pollution_data(lat, lon),
+        aget_air_pollution_history_data(lat, lon, start, end),
+        return_exceptions=True,
+    )
+
+    payload, errors = {}, {}
+    messages = {
+        "weather": "Não foi possível obter dados climáticos.",
+        "air": "Não foi possível obter dados atuais.",
+        "history": "Nenhum dado encontrado",
+    }
+    for name, result in zip(("weather", "air", "history"), results):
+        if isinstance(result, Exception):
+            payload[name] = None
+            errors[name] = str(result)
+        elif result is None:
+            payload[name] = None
+            errors[name] = messages[name]
+        else:
+            payload[name] = result
+    payload["errors"] = errors
+
+    status = 500 if len(errors) == len(messages) else 200
+    return JsonResponse(payload, status=status)
+
+
+def _parse_points(raw):
+    """Aceita pontos como [lat, lon] ou {"lat": ..., "lon": ...}."""
+    points = []
+    for item in raw:
+        if isinstance(item, dict):
+            item = (item.get("lat", item.get("latitude")), item.get("lon", item.get("longitude")))
+        lat, lon = item
+        points.append((float(lat), float(lon)))
+    return points
+
+
+@csrf_exempt
+async def batch(request):
+    """Clima e poluição atual de vários pontos, agrupados por célula da grade."""
+    if request.method != "POST":
+        return JsonResponse({"error": "Use POST"}, status=405)
+
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+        points = _parse_points(body.get("points") or [])
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse(
+            {"error": "Envie 'points' como lista de [lat, lon] ou {lat, lon}."}, status=400
+        )
+
+    if not points:
+        return JsonResponse({"error": "Campo 'points' é obrigatório."}, status=400)
+    if len(points) > settings.BATCH_MAX_POINTS:
+        return JsonResponse(
+            {"error": f"No máximo {settings.BATCH_MAX_POINTS} pontos por requisição."},
+            status=400,
+        )
+
+    try:
+        cells, keys = await aget_batch_data(points)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+    # 🔹 Cada célula aparece uma vez; os pontos apontam para a sua célula
+    return JsonResponse({"cells": cells, "points": keys})
+
 
 @csrf_exempt
-def weather_report(request):
+async def weather_report(request):
     if request.method != "POST":
         return JsonResponse({"error": "Use POST"}, status=405)
 
@@ -101,75 +430,274 @@ def weather_report(request):
         if lat is None or lon is None:
             return JsonResponse({"error": "Campos 'lat' e 'lon' são obrigatórios."}, status=400)
 
-        # 🔹 Obtem dados
-        data = get_weather_data(float(lat), float(lon))
-        pollution = get_air_pollution_data(lat, lon)
-        data["pollution"] = pollution
-
-        # 🔹 Gera PDF
-        report_path = generate_weather_report(data)
-
-        # 🔹 Cria no banco
-        report = WeatherReport.objects.create(
-            city=data["city"],
-            latitude=data["latitude"],
-            longitude=data["longitude"],
-            file_path=report_path,
+        # 🔹 Obtem dados (clima e poluição em paralelo)
+        data, pollution = await asyncio.gather(
+            aget_weather_data(float(lat), float(lon)),
+            aget_air_pollution_data(float(lat), float(lon)),
         )
-
-        # 🔹 Cria URL completa de download
-        from django.urls import reverse  # garante import local
-        download_url = request.build_absolute_uri(
-            reverse("download_report", args=[report.id])
+        data["pollution"] = pollution
+        content_hash = report_fingerprint(data)
+
+        # 🔹 Mesmo conteúdo na mesma janela: devolve o PDF já gerado
+        report = await afind_report(content_hash)
+        if report is not None:
+            download_url = request.build_absolute_uri(
+                reverse("download_report", args=[report.id])
+            )
+            return JsonResponse({
+                "status": "ok",
+                "city": data.get("city"),
+                "download_url": download_url,
+                "data": data,
+            })
+
+        # 🔹 ...ou o job idêntico que ainda está na fila
+        job = await afind_active_job(content_hash)
+
+        if job is None:
+            # 🔹 Fila cheia: pede para o cliente tentar mais tarde
+            if await aqueue_depth() >= settings.REPORT_QUEUE_MAX_PENDING:
+                response = JsonResponse(
+                    {"error": "Fila de relatórios cheia, tente novamente em instantes."},
+                    status=503,
+                )
+                response["Retry-After"] = str(settings.REPORT_QUEUE_RETRY_AFTER)
+                return response
+
+            # 🔹 Enfileira o PDF para o worker (manage.py run_report_worker)
+            job = await ReportJob.objects.acreate(payload=data, content_hash=content_hash)
+
+        status_url = request.build_absolute_uri(
+            reverse("report_job_status", args=[job.id])
         )
 
         return JsonResponse({
-            "status": "ok",
+            "status": job.status,
+            "job_id": job.id,
             "city": data.get("city"),
-            "download_url": download_url,
+            "status_url": status_url,
             "data": data,
-        })
+        }, status=202)
 
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Falha ao gerar relatório")
         return JsonResponse({"error": str(e)}, status=500)
 
 
 @csrf_exempt
-def list_reports(request, city):
+async def report_job_status(request, job_id):
+    """Situação de um relatório enfileirado; traz o download_url quando pronto."""
+    if request.method != "GET":
+        return JsonResponse({"error": "Use GET"}, status=405)
+
+    try:
+        job = await ReportJob.objects.aget(id=job_id)
+    except ReportJob.DoesNotExist:
+        return JsonResponse({"error": "Job não encontrado."}, status=404)
+
+    data = {
+        "job_id": job.id,
+        "status": job.status,
+        "city": job.payload.get("city"),
+    }
+    if job.status == ReportJob.DONE and job.report_id:
+        data["download_url"] = request.build_absolute_uri(
+            reverse("download_report", args=[job.report_id])
+        )
+    elif job.status == ReportJob.FAILED:
+        data["error"] = job.error
+
+    return JsonResponse(data)
+
+
+@csrf_exempt
+async def list_reports(request, city):
+    """
+    Relatórios da cidade, do mais recente ao mais antigo, paginados por cursor.
+    O cursor da próxima página vem no cabeçalho ``X-Next-Cursor`` (e em ``Link``).
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Use GET"}, status=405)
 
-    reports = WeatherReport.objects.filter(city__iexact=city).order_by("-generated_at")
+    try:
+        limit = int(request.GET.get("limit", settings.REPORTS_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "Parâmetro 'limit' inválido."}, status=400)
+    limit = max(1, min(limit, settings.REPORTS_MAX_PAGE_SIZE))
+
+    reports = WeatherReport.objects.filter(city_key=normalize_city(city))
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        try:
+            generated_at, last_id = decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({"error": "Parâmetro 'cursor' inválido."}, status=400)
+        reports = reports.filter(
+            Q(generated_at__lt=generated_at) | Q(generated_at=generated_at, id__lt=last_id)
+        )
+
+    rows = [
+        row async for row in reports
+        .order_by("-generated_at", "-id")
+        .values_list("id", "city", "generated_at")[:limit + 1]
+    ]
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
     tz = pytz.timezone("America/Sao_Paulo")
+    # "/api/report/download/0" -> prefixo comum a todas as URLs de download
+    download_prefix = request.build_absolute_uri(reverse("download_report", args=[0]))[:-1]
+
+    data = [
+        {
+            "id": report_id,
+            "city": report_city,
+            "generated_at": generated_at.astimezone(tz).strftime("%d/%m/%Y %H:%M"),
+            "download_url": f"{download_prefix}{report_id}",
+        }
+        for report_id, report_city, generated_at in rows
+    ]
+
+    response = JsonResponse(data, safe=False)
+    if has_next:
+        last_id, _, last_generated_at = rows[-1]
+        next_cursor = encode_cursor(last_generated_at, last_id)
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        params["limit"] = str(limit)
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+        response["X-Next-Cursor"] = next_cursor
+        response["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+@csrf_exempt
+async def nearby_reports(request):
+    """
+    Relatórios gerados a até ``radius`` km do ponto, do mais próximo ao mais
+    distante. O índice de geohash devolve só as linhas das 9 células em volta
+    do ponto, e a caixa do raio descarta o resto delas ainda no banco; a
+    distância exata é calculada apenas para esses candidatos, no máximo
+    REPORTS_NEARBY_MAX_CANDIDATES (os mais recentes).
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Use GET"}, status=405)
+
+    try:
+        lat = float(request.GET["lat"])
+        lon = float(request.GET["lon"])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Parâmetros 'lat' e 'lon' são obrigatórios."}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return JsonResponse({"error": "Coordenadas inválidas."}, status=400)
 
-    data = []
-    for r in reports:
-        download_path = reverse("download_report", args=[r.id])
-        full_url = request.build_absolute_uri(download_path)
-        data.append({
-            "id": r.id,
-            "city": r.city,
-            "generated_at": r.generated_at.astimezone(tz).strftime("%d/%m/%Y %H:%M"),
-            "download_url": full_url,
-        })
+    try:
+        radius = float(request.GET.get("radius", settings.REPORTS_NEARBY_RADIUS))
+        limit = int(request.GET.get("limit", settings.REPORTS_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "Parâmetros 'radius' ou 'limit' inválidos."}, status=400)
+    if radius <= 0:
+        return JsonResponse({"error": "Parâmetro 'radius' deve ser positivo."}, status=400)
+    radius = min(radius, settings.REPORTS_NEARBY_MAX_RADIUS)
+    limit = max(1, min(limit, settings.REPORTS_MAX_PAGE_SIZE))
+
+    # 🔹 Candidatos: prefixos da célula do ponto e das vizinhas (LIKE 'prefixo%')
+    precision = geohash.precision_for(radius, lat)
+    condition = Q()
+    for prefix in geohash.neighbours(lat, lon, precision):
+        condition |= Q(geohash__startswith=prefix)
+
+    # 🔹 Com raio grande a precisão cai e as células ficam enormes: a caixa do
+    # raio e o limite de candidatos mantêm a consulta limitada
+    south, north, west, east = geohash.bounding_box(lat, lon, radius)
+    candidates = [
+        row async for row in WeatherReport.objects.filter(
+            condition,
+            latitude__range=(south, north),
+            longitude__range=(west, east),
+        )
+        .order_by("-generated_at")
+        .values_list("id", "city", "latitude", "longitude", "generated_at")
+        [:settings.REPORTS_NEARBY_MAX_CANDIDATES]
+    ]
+
+    # 🔹 Distância exata só nos candidatos
+    within = (
+        (geohash.distance_km(lat, lon, row[2], row[3]), row) for row in candidates
+    )
+    nearest = heapq.nsmallest(
+        limit,
+        ((distance, row) for distance, row in within if distance <= radius),
+        key=lambda item: (item[0], -item[1][4].timestamp()),
+    )
 
-    return JsonResponse(data, safe=False)
+    tz = pytz.timezone("America/Sao_Paulo")
+    download_prefix = request.build_absolute_uri(reverse("download_report", args=[0]))[:-1]
+
+    return JsonResponse([
+        {
+            "id": report_id,
+            "city": report_city,
+            "latitude": report_lat,
+            "longitude": report_lon,
+            "distance_km": round(distance, 3),
+            "generated_at": generated_at.astimezone(tz).strftime("%d/%m/%Y %H:%M"),
+            "download_url": f"{download_prefix}{report_id}",
+        }
+        for distance, (report_id, report_city, report_lat, report_lon, generated_at) in nearest
+    ], safe=False)
 
 
 @csrf_exempt
-def download_report(request, report_id):
+async def download_report(request, report_id):
+    if request.method not in ("GET", "HEAD"):
+        return JsonResponse({"error": "Use GET"}, status=405)
+
     try:
-        report = WeatherReport.objects.get(id=report_id)
+        report = await WeatherReport.objects.only("file_path", "content_hash").aget(id=report_id)
     except WeatherReport.DoesNotExist:
         return JsonResponse({"error": "Relatório não encontrado."}, status=404)
 
-    filepath = report.file_path
-    if not os.path.isfile(filepath):
+    filepath = report.absolute_path
+    try:
+        # stat() no disco fora do event loop
+        stat = await sync_to_async(os.stat, thread_sensitive=False)(filepath)
+    except OSError:
         return JsonResponse({"error": "Arquivo não encontrado no servidor."}, status=404)
 
-    filename = os.path.basename(filepath)
-    response = FileResponse(open(filepath, "rb"), content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    etag = file_etag(report, stat)
+    last_modified = int(stat.st_mtime)
+
+    # 🔹 If-None-Match / If-Modified-Since: 304 sem reenviar o arquivo
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    if response is None:
+        if settings.REPORT_SENDFILE_HEADER:
+            # 🔹 O proxy da frente envia o arquivo (e trata Range sozinho)
+            response = sendfile_response(filepath)
+        else:
+            byte_range = None
+            if_range = request.headers.get("If-Range")
+            if if_range is None or if_range == etag:
+                byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+            if byte_range is False:
+                return unsatisfiable_response(stat.st_size)
+            response = file_response(filepath, stat.st_size, byte_range)
+
+        filename = os.path.basename(filepath)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
     return response
+
+
+async def prometheus_metrics(request):
+    """Métricas de todos os processos, no formato texto do Prometheus."""
+    if request.method != "GET":
+        return JsonResponse({"error": "Use GET"}, status=405)
+
+    body = await sync_to_async(metrics.render, thread_sensitive=False)()
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
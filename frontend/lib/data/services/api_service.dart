@@ -6,9 +6,6 @@ import '../models/poluicao_model.dart';
 
 class ApiService {
   static String baseUrl = dotenv.env['API_URL']!;
-  static String units = 'metric';
-  static String lang = 'pt_br';
-  static String apiKey = dotenv.env['API_KEY']!;
 
   static Future<ClimaModel> getClima(double lat, double lon) async {
     final url = Uri.parse('$baseUrl/weather?lat=$lat&lon=$lon');
@@ -27,8 +24,11 @@ static Future<PoluicaoModel> getPoluicao(double lat, double lon) async {
 
     final json = jsonDecode(r.body);
     final data = json['data'] ?? json; // suporta {"data":{}} ou direto {}
+    return poluicaoFromJson(data);
+  }
 
-    // Adapta o JSON para o formato aceito pelo model atual
+  /// Adapta o JSON do backend para o formato aceito pelo model atual
+  static PoluicaoModel poluicaoFromJson(Map<String, dynamic> data) {
     return PoluicaoModel.fromOpenWeather({
       "list": [
         {
@@ -53,60 +53,101 @@ static Future<PoluicaoModel> getPoluicao(double lat, double lon) async {
     final startTs = start.millisecondsSinceEpoch ~/ 1000;
     final endTs   = now.millisecondsSinceEpoch ~/ 1000;
 
-    final url = Uri.parse('$baseUrl/air/history?lat=$lat&lon=$lon&start=$startTs&end=$endTs');
+    // O backend já agrega por hora, devolve só o PM2.5 e em ordem cronológica
+    final url = Uri.parse(
+      '$baseUrl/air/history?lat=$lat&lon=$lon&start=$startTs&end=$endTs&resolution=hour&fields=pm2_5',
+    );
 
     final r = await http.get(url);
     if (r.statusCode != 200) throw Exception('Erro histórico: ${r.statusCode}');
     final data = jsonDecode(r.body);
-    final list = (data['list'] as List?) ?? [];
+    return historicoFromList((data['list'] as List?) ?? []);
+  }
+
+  static List<PoluicaoPonto> historicoFromList(List list) {
     return list.map((e) {
       final dt = DateTime.fromMillisecondsSinceEpoch((e['dt'] as int) * 1000, isUtc: true).toLocal();
       final pm2 = ((e['pm2_5']) ?? 0).toDouble();
       return PoluicaoPonto(dt, pm2);
-    }).toList()
-      ..sort((a,b) => a.t.compareTo(b.t));
+    }).toList();
+  }
+
+  /// Clima, poluição e histórico de 24h em uma única chamada ao backend.
+  /// Partes que falharem vêm como null, com o motivo em `errors`.
+  static Future<Map<String, dynamic>> getSnapshot(double lat, double lon) async {
+    final url = Uri.parse('$baseUrl/snapshot?lat=$lat&lon=$lon');
+    final r = await http.get(url);
+    if (r.statusCode != 200) throw Exception('Erro snapshot: ${r.statusCode}');
+    return jsonDecode(r.body);
   }
 
+  /// Resumo da previsão de 24h calculado no backend (chuva acumulada e
+  /// médias de umidade, pressão e nuvens), usado no risco de alagamento.
   static Future<Map<String, double>> getPrecipitacaoProximas24h(double lat, double lon) async {
-  final url = Uri.parse(
-    'https://api.openweathermap.org/data/2.5/forecast?lat=$lat&lon=$lon&appid=$apiKey&units=$units&lang=$lang',
-  );
-  final r = await http.get(url);
-  if (r.statusCode != 200) throw Exception('Erro forecast: ${r.statusCode}');
-  final data = jsonDecode(r.body);
-
-  final list = (data['list'] as List?) ?? [];
-  double totalChuva = 0;
-  double totalUmid = 0;
-  double totalPress = 0;
-  double totalNuvem = 0;
-
-  int count = 0;
-  for (var i = 0; i < list.length && i < 8; i++) {
-    final e = list[i];
-    totalChuva += (e['rain']?['3h'] ?? 0).toDouble();
-    totalUmid += (e['main']?['humidity'] ?? 0).toDouble();
-    totalPress += (e['main']?['pressure'] ?? 0).toDouble();
-    totalNuvem += (e['clouds']?['all'] ?? 0).toDouble();
-    count++;
+    final url = Uri.parse('$baseUrl/forecast?lat=$lat&lon=$lon');
+    final r = await http.get(url);
+    if (r.statusCode != 200) throw Exception('Erro forecast: ${r.statusCode}');
+    final data = jsonDecode(r.body);
+
+    return {
+      'chuva': ((data['chuva']) ?? 0).toDouble(),
+      'umid': ((data['umid']) ?? 0).toDouble(),
+      'press': ((data['press']) ?? 0).toDouble(),
+      'nuvem': ((data['nuvem']) ?? 0).toDouble(),
+    };
+  }
+
+  /// Atualizações ao vivo da célula (Server-Sent Events em /live): primeiro
+  /// um `snapshot` com {weather, air}, depois `update` só com o que mudou.
+  /// Cada item é {'event': nome, 'data': mapa}; o stream termina quando a
+  /// conexão cai.
+  static Stream<Map<String, dynamic>> assinarAoVivo(double lat, double lon) async* {
+    final client = http.Client();
+    try {
+      final request = http.Request('GET', Uri.parse('$baseUrl/live?lat=$lat&lon=$lon'))
+        ..headers['Accept'] = 'text/event-stream';
+      final r = await client.send(request);
+      if (r.statusCode != 200) throw Exception('Erro ao vivo: ${r.statusCode}');
+
+      var evento = 'message';
+      final dados = StringBuffer();
+      await for (final linha in r.stream.transform(utf8.decoder).transform(const LineSplitter())) {
+        if (linha.isEmpty) {
+          if (dados.isNotEmpty) {
+            yield {'event': evento, 'data': jsonDecode(dados.toString())};
+          }
+          evento = 'message';
+          dados.clear();
+        } else if (linha.startsWith('event:')) {
+          evento = linha.substring(6).trim();
+        } else if (linha.startsWith('data:')) {
+          dados.write(linha.substring(5).trim());
+        }
+      }
+    } finally {
+      client.close();
+    }
   }
-  
-  return {
-    'chuva': totalChuva,
-    'umid': count > 0 ? totalUmid / count : 0,
-    'press': count > 0 ? totalPress / count : 0,
-    'nuvem': count > 0 ? totalNuvem / count : 0,
-  };
-}
 
 static Future<String> gerarRelatorio(double lat, double lon) async {
     final url = Uri.parse('$baseUrl/report/weather');
     final r = await http.post(url,
         headers: {'Content-Type': 'application/json'},
         body: jsonEncode({'lat': lat, 'lon': lon}));
-    if (r.statusCode != 200) throw Exception('Erro ao gerar relatório');
-    final data = jsonDecode(r.body);
-    return data['report_url'];
+    if (r.statusCode == 200) return jsonDecode(r.body)['download_url'];
+    if (r.statusCode != 202) throw Exception('Erro ao gerar relatório');
+    final job = jsonDecode(r.body);
+
+    // O backend gera o PDF em segundo plano; consulta o job até concluir
+    for (var tentativa = 0; tentativa < 60; tentativa++) {
+      final s = await http.get(Uri.parse(job['status_url']));
+      if (s.statusCode != 200) throw Exception('Erro ao consultar relatório');
+      final data = jsonDecode(s.body);
+      if (data['status'] == 'done') return data['download_url'];
+      if (data['status'] == 'failed') throw Exception(data['error'] ?? 'Erro ao gerar relatório');
+      await Future.delayed(const Duration(seconds: 2));
+    }
+    throw Exception('Tempo esgotado aguardando o relatório');
   }
 
 }
@@ -249,28 +249,29 @@ Future<void> _baixarRelatorio(ClimaProvider p) async {
       body: jsonEncode({"lat": p.ultimaLat, "lon": p.ultimaLon}),
     );
 
-    if (response.statusCode == 200) {
-      final data = jsonDecode(response.body);
-      if (data["status"] == "ok") {
-        final reportUrl = data["download_url"];
-        if (reportUrl != null){
+    if (response.statusCode == 200 || response.statusCode == 202) {
+      // 200: relatório idêntico já existia; 202: PDF sendo gerado em
+      // segundo plano, consulta o job até ficar pronto
+      final body = jsonDecode(response.body);
+      final data = response.statusCode == 200
+          ? body
+          : await _aguardarRelatorio(body["status_url"]);
+      final reportUrl = data["download_url"];
+      if (reportUrl != null) {
         ScaffoldMessenger.of(context).showSnackBar(
           SnackBar(
-                content: Text("📄 Relatório gerado para ${data["city"]}!"),
-                action: SnackBarAction(
-                  label: "Baixar",
-                  onPressed: () async {
-                    final uri = Uri.parse(reportUrl);
-                    if (!await launchUrl(uri, mode: LaunchMode.externalApplication)) {
-                      throw Exception('Não foi possível abrir o PDF');
-                    }
-                  },
-                ),
-              ),
+            content: Text("📄 Relatório gerado para ${data["city"]}!"),
+            action: SnackBarAction(
+              label: "Baixar",
+              onPressed: () async {
+                final uri = Uri.parse(reportUrl);
+                if (!await launchUrl(uri, mode: LaunchMode.externalApplication)) {
+                  throw Exception('Não foi possível abrir o PDF');
+                }
+              },
+            ),
+          ),
         );
-        } else {
-        throw Exception("Erro HTTP ${response.statusCode}: ${response.body}");
-      }
       } else {
         throw Exception(data["error"] ?? "Erro desconhecido ao gerar relatório.");
       }
@@ -286,6 +287,20 @@ Future<void> _baixarRelatorio(ClimaProvider p) async {
 }
 
 
+Future<Map<String, dynamic>> _aguardarRelatorio(String statusUrl) async {
+  for (var tentativa = 0; tentativa < 60; tentativa++) {
+    final r = await http.get(Uri.parse(statusUrl));
+    if (r.statusCode != 200) {
+      throw Exception("Erro HTTP ${r.statusCode}: ${r.body}");
+    }
+    final data = jsonDecode(r.body);
+    if (data["status"] == "done" || data["status"] == "failed") return data;
+    await Future.delayed(const Duration(seconds: 2));
+  }
+  throw Exception("Tempo esgotado aguardando o relatório.");
+}
+
+
   IconData _mapWeatherIcon(String code) {
     switch (code) {
       case "01d": return WeatherIcons.day_sunny;
@@ -20,6 +20,12 @@ class ClimaProvider extends ChangeNotifier {
   double? chuvaProx24h;
   double? riscoAlagamento;
 
+  // Última leitura completa recebida ao vivo; os deltas são aplicados sobre ela
+  final Map<String, dynamic> _climaJson = {};
+  final Map<String, dynamic> _arJson = {};
+  StreamSubscription<Map<String, dynamic>>? _aoVivo;
+  bool _descartado = false;
+
 Future<void> carregarClima(double lat, double lon) async {
     loading = true;
     ultimaLat = lat;
@@ -27,17 +33,16 @@ Future<void> carregarClima(double lat, double lon) async {
     notifyListeners();
 
     try {
-      final climaF = ApiService.getClima(lat, lon);
-      final poluF  = ApiService.getPoluicao(lat, lon);
-      final histF  = ApiService.getPoluicaoHistorico(lat, lon);
-
-      final results = await Future.wait([climaF, poluF, histF]);
-      clima = results[0] as ClimaModel;
-      poluicao = results[1] as PoluicaoModel;
-      historicoPm25 = results[2] as List<PoluicaoPonto>;
+      final snap = await ApiService.getSnapshot(lat, lon);
+      if (snap['weather'] != null) clima = ClimaModel.fromJsonOpenWeather(snap['weather']);
+      if (snap['air'] != null) poluicao = ApiService.poluicaoFromJson(snap['air']);
+      if (snap['history'] != null) historicoPm25 = ApiService.historicoFromList(snap['history']);
           // ✅ Carrega cidade em paralelo (não trava UI)
     unawaited(carregarCidade(lat, lon));
 
+    // Depois da carga inicial, o backend avisa quando clima ou ar mudarem
+    assinarAoVivo(lat, lon);
+
     unawaited(carregarPrevisaoAlagamento(lat, lon));
     
     } finally {
@@ -46,6 +51,51 @@ Future<void> carregarClima(double lat, double lon) async {
     }
   }
 
+  /// Troca a assinatura ao vivo para a célula de (lat, lon). Se a conexão
+  /// cair, tenta de novo em alguns segundos enquanto o ponto for o mesmo.
+  void assinarAoVivo(double lat, double lon) {
+    _aoVivo?.cancel();
+    _climaJson.clear();
+    _arJson.clear();
+
+    _aoVivo = ApiService.assinarAoVivo(lat, lon).listen(
+      _aplicarEvento,
+      onError: (e) => debugPrint("⚠ Conexão ao vivo: $e"),
+      onDone: () {
+        Future.delayed(const Duration(seconds: 5), () {
+          if (!_descartado && ultimaLat == lat && ultimaLon == lon) assinarAoVivo(lat, lon);
+        });
+      },
+    );
+  }
+
+  void _aplicarEvento(Map<String, dynamic> evento) {
+    final data = evento['data'] as Map<String, dynamic>;
+    if (evento['event'] == 'snapshot') {
+      _climaJson.clear();
+      _arJson.clear();
+    }
+
+    final weather = data['weather'] as Map<String, dynamic>?;
+    final air = data['air'] as Map<String, dynamic>?;
+    if (weather != null) {
+      _climaJson.addAll(weather);
+      clima = ClimaModel.fromJsonOpenWeather(_climaJson);
+    }
+    if (air != null) {
+      _arJson.addAll(air);
+      poluicao = ApiService.poluicaoFromJson(_arJson);
+    }
+    if (weather != null || air != null) notifyListeners();
+  }
+
+  @override
+  void dispose() {
+    _descartado = true;
+    _aoVivo?.cancel();
+    super.dispose();
+  }
+
   Future<void> carregarCidade(double lat, double lon) async {
   try {
     final placemarks = await placemarkFromCoordinates(lat, lon);